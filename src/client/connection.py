@@ -4,6 +4,7 @@ import logging
 import secrets
 import time
 import traceback
+from collections.abc import Awaitable, Callable
 from contextvars import ContextVar
 
 from telethon import TelegramClient
@@ -35,6 +36,59 @@ _failure_lock = asyncio.Lock()
 # Idle session cleanup
 MAX_IDLE_TIME = 1800  # 30 minutes in seconds
 
+# Callbacks releasing per-session state (stores, caches) when a session is dropped
+_session_close_callbacks: list[Callable[[str], None]] = []
+
+# Callbacks invoked after a dropped connection is re-established
+_session_reconnect_callbacks: list[Callable[[str, TelegramClient], None]] = []
+
+# Coroutines loading per-session state (account profile) for a new client
+_session_open_callbacks: list[Callable[[str, TelegramClient], Awaitable[None]]] = []
+
+
+def register_session_close_callback(callback: Callable[[str], None]) -> None:
+    """Register a callback invoked with the token whenever a session is dropped."""
+    if callback not in _session_close_callbacks:
+        _session_close_callbacks.append(callback)
+
+
+def register_session_reconnect_callback(
+    callback: Callable[[str, TelegramClient], None],
+) -> None:
+    """Register a callback invoked with (token, client) after a reconnect."""
+    if callback not in _session_reconnect_callbacks:
+        _session_reconnect_callbacks.append(callback)
+
+
+def register_session_open_callback(
+    callback: Callable[[str, TelegramClient], Awaitable[None]],
+) -> None:
+    """Register a coroutine awaited with (token, client) for each new authorized client."""
+    if callback not in _session_open_callbacks:
+        _session_open_callbacks.append(callback)
+
+
+async def _notify_session_opened(token: str, client: TelegramClient) -> None:
+    """Run session open callbacks; failures are logged and never propagate."""
+    for callback in _session_open_callbacks:
+        try:
+            await callback(token, client)
+        except Exception as e:
+            logger.warning(
+                f"Session open callback failed for token {token[:8]}...: {e}"
+            )
+
+
+def _notify_session_closed(token: str) -> None:
+    """Run session close callbacks; failures are logged and never propagate."""
+    for callback in _session_close_callbacks:
+        try:
+            callback(token)
+        except Exception as e:
+            logger.warning(
+                f"Session close callback failed for token {token[:8]}...: {e}"
+            )
+
 
 async def cleanup_idle_sessions():
     """Disconnect sessions that haven't been used for MAX_IDLE_TIME."""
@@ -62,6 +116,7 @@ async def cleanup_idle_sessions():
                 logger.warning(f"Error disconnecting idle session {token[:8]}...: {e}")
             # Remove from cache
             del _session_cache[token]
+            _notify_session_closed(token)
 
         if idle_tokens:
             logger.info(
@@ -82,8 +137,30 @@ def set_request_token(token: str | None) -> None:
     _current_token.set(token)
 
 
+def get_request_session_key() -> str:
+    """Return the session cache key serving the current request.
+
+    Falls back to the configured session name when no bearer token is set
+    (stdio and legacy single-session mode).
+    """
+    token = _current_token.get(None)
+    if token is None:
+        return get_config().session_name
+    return token
+
+
 async def _get_client_by_token(token: str) -> TelegramClient:
     """Get or create a TelegramClient instance for the given token."""
+    client, created = await _get_or_create_client(token)
+    if created:
+        # Outside _cache_lock: callbacks make requests and must not block
+        # other sessions from getting their clients meanwhile
+        await _notify_session_opened(token, client)
+    return client
+
+
+async def _get_or_create_client(token: str) -> tuple[TelegramClient, bool]:
+    """Return the cached client for the token, or connect a new one (created=True)."""
     async with _cache_lock:
         current_time = time.time()
 
@@ -92,7 +169,7 @@ async def _get_client_by_token(token: str) -> TelegramClient:
             client, _ = _session_cache[token]
             # Update access time
             _session_cache[token] = (client, current_time)
-            return client
+            return client, False
 
         # Create new client for token
         session_path = SESSION_DIR / f"{token}.session"
@@ -145,6 +222,7 @@ async def _get_client_by_token(token: str) -> TelegramClient:
 
                 # Remove from cache
                 del _session_cache[oldest_token]
+                _notify_session_closed(oldest_token)
                 logger.info(
                     f"Evicted LRU session for token {oldest_token[:8]}... Cache now has {len(_session_cache)} sessions"
                 )
@@ -153,7 +231,7 @@ async def _get_client_by_token(token: str) -> TelegramClient:
             _session_cache[token] = (client, current_time)
             logger.info(f"Created new session for token {token[:8]}...")
 
-            return client
+            return client, True
 
         except Exception as e:
             # Auto-delete invalid session files on auth errors
@@ -214,12 +292,8 @@ async def get_connected_client() -> TelegramClient:
     Raises:
         Exception: If connection cannot be established
     """
-    # Check for current token context
-    token = _current_token.get(None)
-
-    if token is None:
-        # Legacy/Default behavior: use configured session name as token
-        token = get_config().session_name
+    # Legacy/Default behavior: use configured session name as token
+    token = get_request_session_key()
 
     # Get client for token (default or specific)
     client = await _get_client_by_token(token)
@@ -273,6 +347,14 @@ async def ensure_connection(client: TelegramClient, token: str) -> bool:
             async with _failure_lock:
                 _connection_failures.pop(token, None)
 
+            for callback in _session_reconnect_callbacks:
+                try:
+                    callback(token, client)
+                except Exception as e:
+                    logger.warning(
+                        f"Session reconnect callback failed for token {token[:8]}...: {e}"
+                    )
+
         return client.is_connected()
     except Exception as e:
         # Check for fatal session errors that shouldn't be retried
@@ -304,6 +386,7 @@ async def ensure_connection(client: TelegramClient, token: str) -> bool:
             # Remove from cache to force re-initialization (which will fail auth check)
             async with _cache_lock:
                 _session_cache.pop(token, None)
+            _notify_session_closed(token)
 
             # Don't record as a connection failure, just fail immediately
             return False
@@ -348,6 +431,7 @@ async def cleanup_session_cache():
                 logger.warning(
                     f"Error disconnecting cached client for token {token[:8]}...: {e}"
                 )
+            _notify_session_closed(token)
 
     _session_cache.clear()
     logger.info("Cleaned up all session cache entries")
@@ -378,6 +462,7 @@ async def cleanup_failed_sessions():
                     logger.warning(
                         f"Error disconnecting failed session {token[:8]}...: {e}"
                     )
+                _notify_session_closed(token)
 
             # Remove session file
             session_path = SESSION_DIR / f"{token}.session"
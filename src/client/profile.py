@@ -0,0 +1,130 @@
+"""
+Per-session account profile.
+
+The self user with its premium and bot flags, and the session's DC, are
+loaded once when a client is created and shared by everything that used to
+call get_me(): "me" resolution, the transcription premium check and bot
+restrictions. A profile is reloaded after Telegram pushes updateUser for the
+account or once it is older than PROFILE_TTL_SECONDS, and is dropped together
+with its session.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from telethon import events
+from telethon.tl.types import UpdateUser
+
+from src.client.connection import (
+    get_connected_client,
+    get_request_session_key,
+    register_session_close_callback,
+    register_session_open_callback,
+)
+
+logger = logging.getLogger(__name__)
+
+# Reload the profile at least this often (premium can lapse without an update)
+PROFILE_TTL_SECONDS = 3600
+
+
+@dataclass(frozen=True, slots=True)
+class AccountProfile:
+    """The account behind a session, as returned by get_me()."""
+
+    me: Any
+    user_id: int | None
+    premium: bool
+    bot: bool
+    dc_id: int | None
+    loaded_at: float
+
+    @classmethod
+    def from_user(cls, me, dc_id: int | None = None) -> "AccountProfile":
+        return cls(
+            me=me,
+            user_id=getattr(me, "id", None),
+            premium=bool(getattr(me, "premium", False)),
+            bot=bool(getattr(me, "bot", False)),
+            dc_id=dc_id,
+            loaded_at=time.time(),
+        )
+
+    def is_fresh(self, ttl: float = PROFILE_TTL_SECONDS) -> bool:
+        return time.time() - self.loaded_at < ttl
+
+
+# Session cache key -> (client, profile)
+_profiles: dict[str, tuple[Any, AccountProfile]] = {}
+
+# Session cache key -> (client, updateUser handler)
+_update_handlers: dict[str, tuple[Any, Any]] = {}
+
+
+def _session_dc_id(client) -> int | None:
+    dc_id = getattr(getattr(client, "session", None), "dc_id", None)
+    return dc_id if isinstance(dc_id, int) else None
+
+
+def _watch_profile_updates(session_key: str, client) -> None:
+    """Drop the cached profile when Telegram reports a change to the account."""
+    registered = _update_handlers.get(session_key)
+    if registered is not None and registered[0] is client:
+        return
+
+    async def on_user_update(update) -> None:
+        cached = _profiles.get(session_key)
+        if (
+            cached is not None
+            and cached[0] is client
+            and update.user_id == cached[1].user_id
+        ):
+            _profiles.pop(session_key, None)
+
+    client.add_event_handler(on_user_update, events.Raw(UpdateUser))
+    _update_handlers[session_key] = (client, on_user_update)
+
+
+async def load_account_profile(session_key: str, client) -> AccountProfile:
+    """Fetch the account with get_me() and cache it for the session."""
+    profile = AccountProfile.from_user(await client.get_me(), _session_dc_id(client))
+    _profiles[session_key] = (client, profile)
+    _watch_profile_updates(session_key, client)
+    return profile
+
+
+async def get_account_profile(client=None) -> AccountProfile:
+    """Return the current session's profile, loading it when missing or stale."""
+    session_key = get_request_session_key()
+    if client is None:
+        client = await get_connected_client()
+    cached = _profiles.get(session_key)
+    if cached is not None and cached[0] is client and cached[1].is_fresh():
+        return cached[1]
+    return await load_account_profile(session_key, client)
+
+
+def drop_account_profile(session_key: str) -> None:
+    """Forget a session's profile and stop watching its updates."""
+    _profiles.pop(session_key, None)
+    registered = _update_handlers.pop(session_key, None)
+    if registered is not None:
+        client, handler = registered
+        try:
+            client.remove_event_handler(handler)
+        except Exception as e:
+            logger.debug(f"Failed to remove profile update handler: {e}")
+
+
+async def _preload_account_profile(session_key: str, client) -> None:
+    try:
+        await load_account_profile(session_key, client)
+    except Exception as e:
+        # Loaded on first use instead
+        logger.warning(f"Failed to load account profile: {e}")
+
+
+register_session_open_callback(_preload_account_profile)
+register_session_close_callback(drop_account_profile)
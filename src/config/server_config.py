@@ -157,6 +157,24 @@ class ServerConfig(BaseSettings):
         description="Maximum number of entities to cache per Telegram client",
     )
 
+    # Local message store (SQLite FTS5, one database per session)
+    local_store_enabled: bool = Field(
+        default=False,
+        description="Index search and read results into the per-session local message store",
+    )
+    sync_interval_seconds: int = Field(
+        default=300,
+        ge=0,
+        description="Interval for incremental updates.getDifference sync of warm sessions into the local store (0 disables)",
+    )
+
+    # Voice transcription
+    max_concurrent_transcriptions: int = Field(
+        default=4,
+        ge=1,
+        description="Maximum concurrent transcribeAudio requests per session",
+    )
+
     # File download security
     allow_http_urls: bool = Field(
         default=False, description="Allow HTTP URLs (insecure, only for development)"
@@ -17,10 +17,12 @@ from src.client.connection import (
 )
 from src.config.logging import setup_logging
 from src.config.server_config import get_config
+from src.server_components.export_api import register_export_routes
 from src.server_components.health import register_health_routes
 from src.server_components.mtproto_api import register_mtproto_api_routes
 from src.server_components.tools_register import register_tools
 from src.server_components.web_setup import register_web_setup_routes
+from src.tools.sync import sync_warm_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,9 @@ config = get_config()
 # Background cleanup task
 _cleanup_task = None
 
+# Background incremental sync task (local message store)
+_sync_task = None
+
 
 async def cleanup_loop():
     """Background task to clean up failed and idle sessions."""
@@ -47,20 +52,37 @@ async def cleanup_loop():
             await asyncio.sleep(60)  # Wait before retrying
 
 
+async def sync_loop(interval: int):
+    """Background task applying Telegram update differences to local stores."""
+    logger.info(f"Starting background sync task (every {interval}s)")
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await sync_warm_sessions()
+        except asyncio.CancelledError:
+            logger.info("Background sync task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Error in sync task: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastMCP):
     """Lifecycle manager for the MCP server."""
     # Startup
-    global _cleanup_task
+    global _cleanup_task, _sync_task
     _cleanup_task = asyncio.create_task(cleanup_loop())
+    if config.local_store_enabled and config.sync_interval_seconds > 0:
+        _sync_task = asyncio.create_task(sync_loop(config.sync_interval_seconds))
 
     yield
 
     # Shutdown
-    if _cleanup_task:
-        _cleanup_task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await _cleanup_task
+    for task in (_sync_task, _cleanup_task):
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
 
     await cleanup_session_cache()
 
@@ -74,6 +96,7 @@ mcp = FastMCP("Telegram MCP Server", lifespan=lifespan)
 register_health_routes(mcp)
 register_web_setup_routes(mcp)
 register_mtproto_api_routes(mcp)
+register_export_routes(mcp)
 register_tools(mcp)
 
 
@@ -0,0 +1,96 @@
+import logging
+
+from starlette.responses import JSONResponse, StreamingResponse
+
+from src.client.connection import get_connected_client, set_request_token
+from src.config.server_config import get_config
+from src.server_components.auth import extract_bearer_token_from_request
+from src.tools.export import iter_history_pages, to_ndjson_line
+from src.utils.entity import get_entity_by_id
+from src.utils.error_handling import log_and_build_error
+
+logger = logging.getLogger(__name__)
+
+
+def register_export_routes(mcp_app) -> None:
+    @mcp_app.custom_route("/export/{chat_id}", methods=["GET"])
+    async def export_chat_history_stream(request):
+        """Stream chat history as NDJSON (newest first) over a chunked response.
+
+        Query parameters: offset_id (resume below this message id), limit,
+        takeout (default true). Clients resume an interrupted download by
+        passing the id of the last line they received as offset_id.
+        """
+        config = get_config()
+        token = None
+        if config.require_auth:
+            token = extract_bearer_token_from_request(request)
+            if not token:
+                error = log_and_build_error(
+                    operation="export_chat_history",
+                    error_message=(
+                        "Missing Bearer token in Authorization header. Use: "
+                        "'Authorization: Bearer <your-token>' header."
+                    ),
+                    params=None,
+                )
+                return JSONResponse(error, status_code=401)
+        set_request_token(token)
+
+        chat_id = request.path_params["chat_id"]
+        try:
+            offset_id = int(request.query_params.get("offset_id", 0))
+            limit_raw = request.query_params.get("limit")
+            limit = int(limit_raw) if limit_raw else None
+        except ValueError as e:
+            error = log_and_build_error(
+                operation="export_chat_history",
+                error_message=f"Invalid query parameter: {e}",
+                params=dict(request.query_params),
+            )
+            return JSONResponse(error, status_code=400)
+        use_takeout = request.query_params.get("takeout", "true").lower() != "false"
+        params = {"chat_id": chat_id, "offset_id": offset_id, "limit": limit}
+
+        try:
+            client = await get_connected_client()
+            entity = await get_entity_by_id(chat_id)
+        except Exception as e:
+            error = log_and_build_error(
+                operation="export_chat_history",
+                error_message=f"Failed to start export: {e!s}",
+                params=params,
+                exception=e,
+            )
+            return JSONResponse(error, status_code=500)
+        if not entity:
+            error = log_and_build_error(
+                operation="export_chat_history",
+                error_message=f"Cannot find chat with ID '{chat_id}'",
+                params=params,
+            )
+            return JSONResponse(error, status_code=404)
+
+        async def body():
+            set_request_token(token)
+            try:
+                async for page in iter_history_pages(
+                    client,
+                    entity,
+                    offset_id=offset_id,
+                    limit=limit,
+                    use_takeout=use_takeout,
+                ):
+                    yield "".join(to_ndjson_line(record) for record in page)
+            except Exception as e:
+                # Headers are already sent: report the failure as the last line
+                yield to_ndjson_line(
+                    log_and_build_error(
+                        operation="export_chat_history",
+                        error_message=f"Export stopped: {e!s}",
+                        params=params,
+                        exception=e,
+                    )
+                )
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -8,8 +8,10 @@ from src.client.connection import (
     _session_cache,
     get_session_health_stats,
 )
+from src.config.server_config import get_config
 from src.config.settings import SESSION_DIR
 from src.server_components.web_setup import _setup_sessions
+from src.tools.sync import get_sync_status
 
 
 def register_health_routes(mcp_app):
@@ -32,16 +34,18 @@ def register_health_routes(mcp_app):
         # Get session health statistics
         health_stats = await get_session_health_stats()
 
-        return JSONResponse(
-            {
-                "status": "healthy",
-                "active_sessions": len(_session_cache),
-                "max_sessions": MAX_ACTIVE_SESSIONS,
-                "session_files": sum(
-                    1 for p in Path(SESSION_DIR).glob("*.session") if p.is_file()
-                ),
-                "setup_sessions": len(_setup_sessions),
-                "sessions": session_info,
-                "health_stats": health_stats,
-            }
-        )
+        payload = {
+            "status": "healthy",
+            "active_sessions": len(_session_cache),
+            "max_sessions": MAX_ACTIVE_SESSIONS,
+            "session_files": sum(
+                1 for p in Path(SESSION_DIR).glob("*.session") if p.is_file()
+            ),
+            "setup_sessions": len(_setup_sessions),
+            "sessions": session_info,
+            "health_stats": health_stats,
+        }
+        if get_config().local_store_enabled:
+            payload["local_store_sync"] = get_sync_status()
+
+        return JSONResponse(payload)
@@ -7,15 +7,60 @@ from src.server_components import auth as server_auth
 from src.server_components import bot_restrictions
 from src.server_components import errors as server_errors
 from src.tools.contacts import find_chats_impl, get_chat_info_impl
+from src.tools.export import export_chat_history_impl
 from src.tools.messages import (
     download_message_media_impl,
     edit_message_impl,
+    get_message_context_impl,
+    get_transcription_impl,
     read_messages_by_ids,
     send_message_impl,
     send_message_to_phone_impl,
 )
 from src.tools.mtproto import invoke_mtproto_impl
-from src.tools.search import search_messages_impl
+from src.tools.search import (
+    get_message_counts_impl,
+    search_messages_impl,
+    search_messages_in_chats_impl,
+)
+from src.tools.subscriptions import (
+    poll_updates_impl,
+    subscribe_updates_impl,
+    unsubscribe_updates_impl,
+)
+from src.tools.sync import sync_chat_impl
+from src.tools.threads import get_thread_replies_impl
+
+# Media filters pushed to Telegram (see src.tools.search.MEDIA_TYPE_FILTERS)
+MediaType = Literal[
+    "photo",
+    "video",
+    "photo_video",
+    "document",
+    "voice",
+    "round_video",
+    "audio",
+    "gif",
+    "link",
+    "location",
+    "contact",
+    "pinned",
+]
+
+# Message result keys selectable with fields= (see src.utils.message_format.MESSAGE_FIELDS)
+MessageField = Literal[
+    "id",
+    "date",
+    "chat",
+    "text",
+    "link",
+    "sender",
+    "reply_to_msg_id",
+    "media",
+    "forwarded_from",
+    "reply_markup",
+    "transcription",
+]
 
 
 def mcp_tool_with_restrictions(operation_name: str):
@@ -58,6 +103,17 @@ def register_tools(mcp: FastMCP) -> None:
         public: bool | None = None,
         auto_expand_batches: int = 2,
         include_total_count: bool = False,
+        source: Literal["telegram", "local"] = "telegram",
+        folder: str | None = None,
+        media_type: MediaType | None = None,
+        fields: list[MessageField] | None = None,
+        max_response_bytes: int | None = None,
+        max_text_chars: int | None = None,
+        snippet_chars: int | None = None,
+        collapse_duplicates: bool = False,
+        rank: Literal["date", "relevance"] = "date",
+        include_reply_parents: bool = False,
+        compact: bool = False,
     ) -> dict:
         """
         Search messages across all Telegram chats (global search).
@@ -67,6 +123,17 @@ def register_tools(mcp: FastMCP) -> None:
         - Date filtering: ISO format (min_date="2024-01-01")
         - Chat type filter: "private", "group", "channel" (comma-separated for multiple)
         - Public filter: True=with username, False=without username (never applies to private chats)
+        - Local mode: source="local" answers from the synced local store (BM25 ranking, no network)
+        - Folder scope: folder="archive" or a custom folder title ("Work") searches only those chats;
+          custom folders return per-chat "total_counts" with include_total_count=True and do not
+          support rank="relevance" (an error is returned)
+        - Media filter: media_type="document", "photo", "voice", "link"... applied by Telegram
+        - Compact output: compact=True lists each chat/sender once in "entities"
+        - Field projection: fields=["id", "date", "text", "link"] skips sender/forward lookups
+        - Snippets: snippet_chars=200 returns only the text around the match (full text via read_messages)
+        - Repost collapsing: collapse_duplicates=True shows the same news reposted in many channels once
+        - Relevance ranking: rank="relevance" returns the best multi-term matches first (BM25, "relevance_score")
+        - Reply context: include_reply_parents=True adds a "reply_to" preview of each replied-to message
 
         EXAMPLES:
         search_messages_globally(query="deadline", limit=20)  # Global search
@@ -75,6 +142,11 @@ def register_tools(mcp: FastMCP) -> None:
         search_messages_globally(query="news", chat_type="channel,group")  # Channels and groups
         search_messages_globally(query="team", chat_type="group", public=False)  # Private groups
         search_messages_globally(query="urgent", chat_type="private, group")  # Private chats and groups
+        search_messages_globally(query='"release notes" OR changelog*', source="local")  # FTS5 syntax, offline
+        search_messages_globally(query="invoice", folder="Work")  # Only chats in the "Work" folder
+        search_messages_globally(query="", media_type="link", min_date="2024-06-01")  # All shared links
+        search_messages_globally(query="launch", chat_type="channel", collapse_duplicates=True)  # Each story once
+        search_messages_globally(query="postgres, replication, lag", rank="relevance")  # Best matches first
 
         Args:
             query: Search terms (comma-separated). Required for global search.
@@ -84,7 +156,19 @@ def register_tools(mcp: FastMCP) -> None:
             min_date: Min date filter (ISO format: "2024-01-01")
             max_date: Max date filter (ISO format: "2024-12-31")
             auto_expand_batches: Extra result batches for filtered searches
-            include_total_count: Include total matching messages count (ignored in global mode)
+            include_total_count: Include total matching messages count (ignored in global mode;
+                per-chat "total_counts" for custom folders)
+            source: "telegram" (live search) or "local" (local store filled by sync_chat and past results)
+            folder: "archive" or a custom folder title/id (included chats and category rules)
+            media_type: Only messages with this media/content type (query may be empty)
+            fields: Message keys to return (id and chat always included); others are not computed
+            max_response_bytes: Byte budget for the returned messages; the rest is left for the next page
+            max_text_chars: Cut message texts longer than this (marked text_truncated)
+            snippet_chars: Return a "snippet" of this many chars around the hit (with "match_offsets") instead of "text"
+            collapse_duplicates: Fold reposted near-identical texts into one result ("duplicates", "duplicate_links")
+            rank: "date" (Telegram order) or "relevance" (rerank 4x over-fetched candidates, max 200)
+            include_reply_parents: Attach "reply_to" previews of replied-to messages (one request per chat)
+            compact: Reference chats/senders by chat_ref/sender_ref from a top-level "entities" map
         """
         return await search_messages_impl(
             query=query,
@@ -96,6 +180,17 @@ def register_tools(mcp: FastMCP) -> None:
             public=public,
             auto_expand_batches=auto_expand_batches,
             include_total_count=include_total_count,
+            source=source,
+            folder=folder,
+            media_type=media_type,
+            fields=fields,
+            max_response_bytes=max_response_bytes,
+            max_text_chars=max_text_chars,
+            snippet_chars=snippet_chars,
+            collapse_duplicates=collapse_duplicates,
+            rank=rank,
+            include_reply_parents=include_reply_parents,
+            compact=compact,
         )
 
     @mcp.tool(
@@ -112,6 +207,17 @@ def register_tools(mcp: FastMCP) -> None:
         max_date: str | None = None,
         auto_expand_batches: int = 2,
         include_total_count: bool = False,
+        source: Literal["telegram", "local"] = "telegram",
+        media_type: MediaType | None = None,
+        from_user: str | None = None,
+        fields: list[MessageField] | None = None,
+        max_response_bytes: int | None = None,
+        max_text_chars: int | None = None,
+        snippet_chars: int | None = None,
+        rank: Literal["date", "relevance"] = "date",
+        wait_for_transcription: bool = True,
+        include_reply_parents: bool = False,
+        compact: bool = False,
     ) -> dict:
         """
         Search messages within a specific Telegram chat.
@@ -121,11 +227,21 @@ def register_tools(mcp: FastMCP) -> None:
         - Date filtering: ISO format (min_date="2024-01-01")
         - Total count support for per-chat searches
         - No query = returns latest messages from the chat
+        - media_type and from_user are applied by Telegram: no scanning of unrelated history
+        - Local mode: source="local" answers from the synced local store (BM25 ranking, no network)
+        - Compact output: compact=True lists the chat and each sender once in "entities"
+        - Field projection: fields=["id", "date", "text", "link"] skips sender/forward lookups
+        - Snippets: snippet_chars=200 returns only the text around the match (full text via read_messages)
+        - Relevance ranking: rank="relevance" returns the best multi-term matches first instead of the newest
+        - Reply context: include_reply_parents=True adds a "reply_to" preview of each replied-to message
 
         EXAMPLES:
         search_messages_in_chat(chat_id="me", limit=10)      # Saved Messages
         search_messages_in_chat(chat_id="-1001234567890", query="launch")  # Specific chat
         search_messages_in_chat(chat_id="telegram", query="update, news")  # Multi-term search
+        search_messages_in_chat(chat_id="telegram", query="launch*", source="local")  # Prefix query, offline
+        search_messages_in_chat(chat_id="-1001234567890", media_type="document", from_user="@alice")  # Alice's files
+        search_messages_in_chat(chat_id="@team", limit=30, include_reply_parents=True)  # Conversation with context
 
         Args:
             chat_id: Target chat ID ('me' for Saved Messages) or specific chat
@@ -135,6 +251,17 @@ def register_tools(mcp: FastMCP) -> None:
             max_date: Max date filter (ISO format: "2024-12-31")
             auto_expand_batches: Extra result batches for filtered searches
             include_total_count: Include total matching messages count (per-chat only)
+            source: "telegram" (live search) or "local" (local store filled by sync_chat and past results)
+            media_type: Only messages with this media/content type
+            from_user: Only messages sent by this user (ID or username)
+            fields: Message keys to return (id and chat always included); others are not computed
+            max_response_bytes: Byte budget for the returned messages; the rest is left for the next page
+            max_text_chars: Cut message texts longer than this (marked text_truncated)
+            snippet_chars: Return a "snippet" of this many chars around the hit (with "match_offsets") instead of "text"
+            rank: "date" (newest first) or "relevance" (rerank 4x over-fetched candidates, max 200)
+            wait_for_transcription: False = don't wait for voice transcriptions ("transcription_pending", poll with get_transcription)
+            include_reply_parents: Attach "reply_to" previews of replied-to messages (one extra request)
+            compact: Reference chats/senders by chat_ref/sender_ref from a top-level "entities" map
         """
         return await search_messages_impl(
             query=query,
@@ -145,7 +272,271 @@ def register_tools(mcp: FastMCP) -> None:
             chat_type=None,
             auto_expand_batches=auto_expand_batches,
             include_total_count=include_total_count,
+            source=source,
+            media_type=media_type,
+            from_user=from_user,
+            fields=fields,
+            max_response_bytes=max_response_bytes,
+            max_text_chars=max_text_chars,
+            snippet_chars=snippet_chars,
+            rank=rank,
+            wait_for_transcription=wait_for_transcription,
+            include_reply_parents=include_reply_parents,
+            compact=compact,
+        )
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=True
+        )
+    )
+    @mcp_tool_with_restrictions("search_messages_in_chats")
+    async def search_messages_in_chats(
+        chat_ids: str | list[str],
+        query: str = "",
+        limit: int = 50,
+        min_date: str | None = None,
+        max_date: str | None = None,
+        cursor: str | None = None,
+        media_type: MediaType | None = None,
+        from_user: str | None = None,
+        include_total_count: bool = False,
+        fields: list[MessageField] | None = None,
+        max_response_bytes: int | None = None,
+        max_text_chars: int | None = None,
+        snippet_chars: int | None = None,
+        collapse_duplicates: bool = False,
+        wait_for_transcription: bool = True,
+        include_reply_parents: bool = False,
+        compact: bool = False,
+    ) -> dict:
+        """
+        Search several specific chats in one call, results merged newest first.
+
+        FEATURES:
+        - All chats searched concurrently; one call instead of one per chat
+        - Empty query returns the latest messages across the chats
+        - Pass the returned cursor for the next page (only chats with more results are queried)
+        - Size budget: max_response_bytes=20000 stops formatting at ~20 KB; the cursor resumes there
+        - Repost collapsing: collapse_duplicates=True folds near-identical texts into one result
+        - Reply context: include_reply_parents=True adds "reply_to" previews (one request per chat)
+
+        EXAMPLES:
+        search_messages_in_chats(chat_ids=["-1001234567890", "@team", "me"], query="deadline")
+        search_messages_in_chats(chat_ids="-100111, -100222", query="")  # Latest from both
+        search_messages_in_chats(chat_ids=[...], query="deadline", cursor="eyIx...")  # Next page
+        search_messages_in_chats(chat_ids=[...], query="", max_response_bytes=20000, max_text_chars=500)
+
+        Args:
+            chat_ids: Chats to search (list or comma-separated string)
+            query: Search terms (comma-separated); empty = latest messages
+            limit: Max merged results per page (default: 50)
+            min_date: Min date filter (ISO format: "2024-01-01")
+            max_date: Max date filter (ISO format: "2024-12-31")
+            cursor: Cursor from the previous page
+            media_type: Only messages with this media/content type
+            from_user: Only messages sent by this user (ID or username)
+            include_total_count: Add total message count per chat ("total_counts")
+            fields: Message keys to return (id and chat always included); others are not computed
+            max_response_bytes: Byte budget for the returned messages; the rest is left for the next page
+            max_text_chars: Cut message texts longer than this (marked text_truncated)
+            snippet_chars: Return a "snippet" of this many chars around the hit (with "match_offsets") instead of "text"
+            collapse_duplicates: Fold reposted near-identical texts into one result ("duplicates", "duplicate_links")
+            wait_for_transcription: False = don't wait for voice transcriptions ("transcription_pending", poll with get_transcription)
+            include_reply_parents: Attach "reply_to" previews of replied-to messages (one request per chat)
+            compact: Reference chats/senders by chat_ref/sender_ref from a top-level "entities" map
+        """
+        if isinstance(chat_ids, str):
+            chat_ids = [c.strip() for c in chat_ids.split(",") if c.strip()]
+        return await search_messages_in_chats_impl(
+            chat_ids=chat_ids,
+            query=query,
+            limit=limit,
+            min_date=min_date,
+            max_date=max_date,
+            cursor=cursor,
+            media_type=media_type,
+            from_user=from_user,
+            include_total_count=include_total_count,
+            fields=fields,
+            max_response_bytes=max_response_bytes,
+            max_text_chars=max_text_chars,
+            snippet_chars=snippet_chars,
+            collapse_duplicates=collapse_duplicates,
+            wait_for_transcription=wait_for_transcription,
+            include_reply_parents=include_reply_parents,
+            compact=compact,
+        )
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=True
+        )
+    )
+    @mcp_tool_with_restrictions("get_message_counts")
+    async def get_message_counts(
+        chat_ids: str | list[str],
+        filters: list[
+            Literal[
+                "all",
+                "media",
+                "photos",
+                "videos",
+                "documents",
+                "voice",
+                "links",
+                "music",
+            ]
+        ]
+        | None = None,
+    ) -> dict:
+        """
+        Count messages in several chats by type without fetching any messages.
+
+        FEATURES:
+        - One request per chat for all filters, chats counted concurrently
+        - Counts are cached for 30 seconds
+
+        EXAMPLES:
+        get_message_counts(chat_ids=["-1001234567890", "me"])  # Total messages
+        get_message_counts(chat_ids="@team", filters=["all", "media", "voice", "links"])
+
+        Args:
+            chat_ids: Chats to count (list or comma-separated string)
+            filters: Counter types (default: ["all"])
+        """
+        if isinstance(chat_ids, str):
+            chat_ids = [c.strip() for c in chat_ids.split(",") if c.strip()]
+        return await get_message_counts_impl(chat_ids=chat_ids, filters=filters)
+
+    @mcp.tool(annotations=ToolAnnotations(idempotentHint=True, openWorldHint=True))
+    @mcp_tool_with_restrictions("sync_chat")
+    async def sync_chat(chat_id: str, limit: int = 1000, full: bool = False) -> dict:
+        """
+        Download chat history into the local message store for offline search.
+
+        FEATURES:
+        - Incremental: new messages first, then holes left by earlier calls, then older history
+        - Repeat until history_complete is true to archive the whole chat
+        - Indexed with SQLite FTS5 for search_messages_*(source="local")
+        - Local search supports phrases ("exact words"), prefixes (launch*) and AND/OR/NOT
+
+        EXAMPLES:
+        sync_chat(chat_id="me")  # Sync latest Saved Messages
+        sync_chat(chat_id="-1001234567890", limit=5000)  # Sync a large channel (repeat to backfill)
+        sync_chat(chat_id="telegram", full=True)  # Forget sync progress and start over
+
+        Args:
+            chat_id: Target chat ID ('me' for Saved Messages, numeric ID, or username)
+            limit: Max messages to fetch in this call (default: 1000)
+            full: Forget sync progress and re-fetch from the newest message (default: False)
+        """
+        return await sync_chat_impl(chat_id=chat_id, limit=limit, full=full)
+
+    @mcp.tool(annotations=ToolAnnotations(destructiveHint=True, openWorldHint=True))
+    @mcp_tool_with_restrictions("export_chat_history")
+    async def export_chat_history(
+        chat_id: str,
+        output_path: str | None = None,
+        limit: int | None = None,
+        resume: bool = True,
+        use_takeout: bool = True,
+    ) -> dict:
+        """
+        Archive a chat's full history to an NDJSON file (one message per line).
+
+        FEATURES:
+        - Uses a Telegram takeout session: far fewer flood waits than paging search
+        - Streams page by page to disk; memory use does not grow with chat size
+        - Resumable: an interrupted export continues from its checkpointed offset_id
+        - Reports progress notifications when the client requests them
+        - Files stay in this session's export directory; re-exporting a name overwrites it
+
+        EXAMPLES:
+        export_chat_history(chat_id="-1001234567890")  # Whole channel to <chat>.ndjson
+        export_chat_history(chat_id="me", output_path="saved.ndjson", limit=10000)
+
+        Args:
+            chat_id: Target chat ID ('me' for Saved Messages, numeric ID, or username)
+            output_path: File name inside the session's export directory (default: <chat>.ndjson)
+            limit: Max messages to export in this call; call again to continue
+            resume: Continue from the checkpoint of a previous unfinished export (default: True)
+            use_takeout: Read through a takeout session (may need confirmation in another app)
+        """
+        return await export_chat_history_impl(
+            chat_id=chat_id,
+            output_path=output_path,
+            limit=limit,
+            resume=resume,
+            use_takeout=use_takeout,
+        )
+
+    @mcp.tool(annotations=ToolAnnotations(openWorldHint=True))
+    @mcp_tool_with_restrictions("subscribe_updates")
+    async def subscribe_updates(
+        chat_ids: str | list[str] | None = None,
+        query: str | None = None,
+        chat_type: str | None = None,
+    ) -> dict:
+        """
+        Watch chats for new messages in real time instead of polling search.
+
+        FEATURES:
+        - New messages are pushed by Telegram and buffered per session (last 1000 kept)
+        - Read them with poll_updates(since_cursor=...) using the returned cursor
+        - Clients with a live MCP connection also get a logging notification per message
+
+        EXAMPLES:
+        subscribe_updates(chat_ids=["-1001234567890", "me"])  # Watch specific chats
+        subscribe_updates(query="deploy, outage")  # Any chat, messages containing a term
+        subscribe_updates(chat_type="private")  # All new private messages
+
+        Args:
+            chat_ids: Chats to watch (single ID or list; any chat when omitted)
+            query: Comma-separated terms, case-insensitive substring match
+            chat_type: Filter by chat type ("private"/"group"/"channel", comma-separated)
+        """
+        if isinstance(chat_ids, str):
+            chat_ids = [c.strip() for c in chat_ids.split(",") if c.strip()]
+        return await subscribe_updates_impl(
+            chat_ids=chat_ids, query=query, chat_type=chat_type
+        )
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=False
         )
+    )
+    @mcp_tool_with_restrictions("poll_updates")
+    async def poll_updates(since_cursor: int | None = None, limit: int = 100) -> dict:
+        """
+        Get new messages buffered by subscribe_updates since the given cursor.
+
+        FEATURES:
+        - No Telegram requests: reads the session's in-memory buffer
+        - Pass the returned cursor to the next call to receive only newer messages
+        - "dropped" reports messages that left the buffer before being polled
+
+        EXAMPLES:
+        poll_updates()  # Everything currently buffered
+        poll_updates(since_cursor=42)  # Only messages after cursor 42
+
+        Args:
+            since_cursor: Cursor from the previous poll_updates/subscribe_updates result
+            limit: Max messages per call (default: 100)
+        """
+        return await poll_updates_impl(since_cursor=since_cursor, limit=limit)
+
+    @mcp.tool(annotations=ToolAnnotations(idempotentHint=True, openWorldHint=False))
+    @mcp_tool_with_restrictions("unsubscribe_updates")
+    async def unsubscribe_updates(subscription_id: str) -> dict:
+        """
+        Stop a subscription created by subscribe_updates.
+
+        Args:
+            subscription_id: ID returned by subscribe_updates
+        """
+        return await unsubscribe_updates_impl(subscription_id=subscription_id)
 
     @mcp.tool(annotations=ToolAnnotations(destructiveHint=True, openWorldHint=True))
     @mcp_tool_with_restrictions("send_message")
@@ -227,7 +618,14 @@ def register_tools(mcp: FastMCP) -> None:
         )
     )
     @mcp_tool_with_restrictions("read_messages")
-    async def read_messages(chat_id: str, message_ids: list[int]) -> list[dict]:
+    async def read_messages(
+        chat_id: str,
+        message_ids: list[int],
+        fields: list[MessageField] | None = None,
+        compact: bool = False,
+        wait_for_transcription: bool = True,
+        include_reply_parents: bool = False,
+    ) -> list[dict] | dict:
         """
         Read specific messages by their IDs from a Telegram chat.
 
@@ -241,16 +639,158 @@ def register_tools(mcp: FastMCP) -> None:
         - First use search_messages_globally() or search_messages_in_chat() to find message IDs
         - Then read specific messages using those IDs
         - Returns full message content with metadata
+        - compact=True returns {"messages", "entities"} with chats/senders listed once
+        - Voice messages are transcribed on Premium accounts; wait_for_transcription=False
+          returns at once, marking unfinished ones "transcription_pending" with a
+          "transcription_id" to poll with get_transcription
+        - include_reply_parents=True adds a "reply_to" preview of each replied-to message
+          (all fetched with one extra request instead of a read_messages call per reply)
 
         EXAMPLES:
         read_messages(chat_id="me", message_ids=[680204, 680205])  # Saved Messages
         read_messages(chat_id="-1001234567890", message_ids=[123, 124])  # Channel
+        read_messages(chat_id="@alice", message_ids=[77], wait_for_transcription=False)  # Don't block on voice
 
         Args:
             chat_id: Target chat identifier (use 'me' for Saved Messages)
             message_ids: List of message IDs to retrieve (from search results)
+            fields: Message keys to return (id and chat always included); others are not computed
+            compact: Reference chats/senders by chat_ref/sender_ref from an "entities" map
+            wait_for_transcription: Wait (up to 30s) for voice transcriptions Telegram is still producing
+            include_reply_parents: Attach "reply_to" previews of replied-to messages
+        """
+        return await read_messages_by_ids(
+            chat_id,
+            message_ids,
+            fields=fields,
+            compact=compact,
+            wait_for_transcription=wait_for_transcription,
+            include_reply_parents=include_reply_parents,
+        )
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=True
+        )
+    )
+    @mcp_tool_with_restrictions("get_message_context")
+    async def get_message_context(
+        chat_id: str,
+        message_id: int,
+        before: int = 10,
+        after: int = 10,
+        fields: list[MessageField] | None = None,
+        compact: bool = False,
+    ) -> dict:
         """
-        return await read_messages_by_ids(chat_id, message_ids)
+        Read the conversation around a message (e.g. a search hit) in one request.
+
+        FEATURES:
+        - Returns up to `before` older and `after` newer messages plus the message itself, oldest first
+        - One history request instead of guessing ID ranges for read_messages
+        - "anchor_found" is false when the message itself was deleted
+        - has_more_before / has_more_after hint that the conversation continues
+
+        EXAMPLES:
+        get_message_context(chat_id="-1001234567890", message_id=4521)  # 10 before, 10 after
+        get_message_context(chat_id="@team", message_id=88, before=30, after=0)  # What led up to it
+        get_message_context(chat_id="me", message_id=680204, fields=["id", "date", "text", "sender"])
+
+        Args:
+            chat_id: Target chat identifier (use 'me' for Saved Messages)
+            message_id: Message to center the window on
+            before: Older messages to include (before + after ≤ 99)
+            after: Newer messages to include
+            fields: Message keys to return (id and chat always included); others are not computed
+            compact: Reference chats/senders by chat_ref/sender_ref from an "entities" map
+        """
+        return await get_message_context_impl(
+            chat_id,
+            message_id,
+            before=before,
+            after=after,
+            fields=fields,
+            compact=compact,
+        )
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=False
+        )
+    )
+    @mcp_tool_with_restrictions("get_transcription")
+    async def get_transcription(
+        transcription_id: int,
+        wait_seconds: float = 0,
+    ) -> dict:
+        """
+        Poll a voice transcription that was returned as "transcription_pending".
+
+        FEATURES:
+        - Takes the "transcription_id" of a message marked "transcription_pending"
+        - status "done" with "transcription" once Telegram has finished it, else "pending"
+        - No request to Telegram: the result arrives as a push and is cached
+        - An unknown id (expired or from another session) asks to read the message again
+
+        EXAMPLES:
+        get_transcription(transcription_id=6113370286842830848)  # Check once
+        get_transcription(transcription_id=6113370286842830848, wait_seconds=10)  # Wait a little
+
+        Args:
+            transcription_id: "transcription_id" of a pending voice message
+            wait_seconds: Wait up to this long (max 30s) for an unfinished transcription
+        """
+        return await get_transcription_impl(transcription_id, wait_seconds=wait_seconds)
+
+    @mcp.tool(
+        annotations=ToolAnnotations(
+            readOnlyHint=True, idempotentHint=True, openWorldHint=True
+        )
+    )
+    @mcp_tool_with_restrictions("get_thread_replies")
+    async def get_thread_replies(
+        chat_id: str,
+        message_id: int,
+        limit: int = 100,
+        after_id: int = 0,
+        tree: bool = False,
+        fields: list[MessageField] | None = None,
+        compact: bool = False,
+    ) -> dict:
+        """
+        Read the comments of a channel post, a forum topic or a group reply thread.
+
+        FEATURES:
+        - Channel posts: comments are read from the linked discussion group
+        - Replies oldest first, fetched in pages of 100; commenters come with each page
+        - tree=True nests replies under the replies they answer ("replies" lists)
+        - Pass next_after_id back as after_id to continue a long thread
+        - Links open the reply in its thread: <channel>/<post>?comment=<id> for post comments,
+          <group>/<topic>/<id> in forum topics, <group>/<id>?thread=<root> otherwise
+
+        EXAMPLES:
+        get_thread_replies(chat_id="@channel", message_id=1234)  # Comments of a post
+        get_thread_replies(chat_id="-1001234567890", message_id=5, limit=500, tree=True)  # Forum topic as a tree
+        get_thread_replies(chat_id="@channel", message_id=1234, after_id=98765)  # Next page
+
+        Args:
+            chat_id: Chat of the message (the channel for post comments)
+            message_id: Channel post ID, forum topic ID or group message with replies
+            limit: Max replies to return (≤1000)
+            after_id: Only replies newer than this ID (next_after_id from the previous call)
+            tree: Return a reply tree ("tree") instead of a flat list ("messages")
+            fields: Message keys to return (id and chat always included); others are not computed
+            compact: Reference chats/senders by chat_ref/sender_ref from an "entities" map
+        """
+        return await get_thread_replies_impl(
+            chat_id,
+            message_id,
+            limit=limit,
+            after_id=after_id,
+            tree=tree,
+            fields=fields,
+            compact=compact,
+        )
 
     @mcp.tool(
         annotations=ToolAnnotations(
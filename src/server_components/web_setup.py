@@ -13,11 +13,17 @@ from telethon import TelegramClient
 from telethon.errors import PasswordHashInvalidError, SessionPasswordNeededError
 from telethon.errors.rpcerrorlist import PhoneNumberFloodError
 
-from src.client.connection import _cache_lock, _session_cache, generate_bearer_token
+from src.client.connection import (
+    _cache_lock,
+    _notify_session_closed,
+    _session_cache,
+    generate_bearer_token,
+)
 from src.config.server_config import ServerMode, get_config
 from src.config.settings import API_HASH, API_ID
 from src.server_components.auth import RESERVED_SESSION_NAMES
 from src.utils.mcp_config import generate_mcp_config_json
+from src.utils.message_store import get_store_path
 
 # Constants
 SETUP_SESSION_PREFIX = "setup-"
@@ -556,9 +562,11 @@ def register_web_setup_routes(mcp_app):
                         )
                     # Remove from cache
                     del _session_cache[token]
+            _notify_session_closed(token)
 
-            # Delete the session file
+            # Delete the session file and its local message store
             session_path.unlink()
+            get_store_path(token).unlink(missing_ok=True)
 
             return templates.TemplateResponse(
                 request,
@@ -0,0 +1,296 @@
+"""
+Bulk chat history export.
+
+Walks a chat's history inside a takeout session (account.initTakeoutSession),
+which Telegram rate-limits far less than regular history requests, and streams
+formatted messages as NDJSON to a file or an HTTP response. Nothing beyond the
+current page is held in memory, and file exports checkpoint the last exported
+message id so an interrupted export resumes where it stopped.
+"""
+
+import hashlib
+import json
+import logging
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any
+
+from fastmcp.server.dependencies import get_context
+from telethon.errors import TakeoutInitDelayError
+
+from src.client.connection import (
+    SessionNotAuthorizedError,
+    get_connected_client,
+    get_request_session_key,
+)
+from src.config.server_config import get_config
+from src.tools.links import message_link, message_link_prefix
+from src.utils.entity import (
+    _get_chat_message_count,
+    build_entity_dict,
+    compute_entity_identifier,
+    get_entity_by_id,
+)
+from src.utils.error_handling import log_and_build_error
+from src.utils.logging_utils import log_operation_start, log_operation_success
+from src.utils.message_format import build_message_result, prefetch_forward_origins
+
+logger = logging.getLogger(__name__)
+
+# messages.getHistory returns at most 100 messages per call, takeout or not
+EXPORT_PAGE_SIZE = 100
+
+# Exports live next to the session files, on the same (mounted) volume
+EXPORT_DIR_NAME = "exports"
+
+
+def get_export_dir(session_key: str) -> Path:
+    """Return the directory a session's exports are confined to.
+
+    Placed under the configured session directory, like the local message
+    store, and named by a digest of the session key so bearer tokens never
+    appear in paths or logs.
+    """
+    digest = hashlib.sha256(session_key.encode()).hexdigest()[:16]
+    return get_config().session_directory / EXPORT_DIR_NAME / digest
+
+
+def resolve_export_path(session_key: str, output_path: str | None, entity) -> Path:
+    """Resolve the export file inside the session's export directory.
+
+    Raises:
+        ValueError: If output_path points outside the export directory
+    """
+    root = get_export_dir(session_key).resolve()
+    name = output_path or f"{compute_entity_identifier(entity).lstrip('@')}.ndjson"
+    path = (root / name).resolve()
+    if path == root or not path.is_relative_to(root):
+        raise ValueError(
+            f"output_path must be a file name inside the export directory, got '{output_path}'"
+        )
+    return path
+
+
+def to_ndjson_line(record: dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+async def _format_page(client, entity, messages: list) -> list[dict[str, Any]]:
+    link_prefix = message_link_prefix(entity)
+    forward_origins = await prefetch_forward_origins(messages)
+    return [
+        await build_message_result(
+            client,
+            message,
+            entity,
+            message_link(link_prefix, message.id),
+            forward_origins=forward_origins,
+        )
+        for message in messages
+    ]
+
+
+async def iter_history_pages(
+    client,
+    entity,
+    offset_id: int = 0,
+    limit: int | None = None,
+    use_takeout: bool = True,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield formatted history pages, newest first, starting below offset_id.
+
+    The last record of each page carries the id to resume from.
+    """
+    if use_takeout:
+        async with client.takeout(
+            finalize=True, users=True, chats=True, megagroups=True, channels=True
+        ) as takeout:
+            async for page in _iter_pages(takeout, client, entity, offset_id, limit):
+                yield page
+    else:
+        async for page in _iter_pages(client, client, entity, offset_id, limit):
+            yield page
+
+
+async def _iter_pages(source, client, entity, offset_id: int, limit: int | None):
+    page: list = []
+    # wait_time=0: takeout requests are not throttled like regular history calls
+    async for message in source.iter_messages(
+        entity, limit=limit, offset_id=offset_id, wait_time=0
+    ):
+        if not message:
+            continue
+        page.append(message)
+        if len(page) >= EXPORT_PAGE_SIZE:
+            yield await _format_page(client, entity, page)
+            page = []
+    if page:
+        yield await _format_page(client, entity, page)
+
+
+def _checkpoint_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".checkpoint.json")
+
+
+def _read_checkpoint(path: Path, chat_id: int) -> dict[str, Any] | None:
+    try:
+        checkpoint = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    return checkpoint if checkpoint.get("chat_id") == chat_id else None
+
+
+async def _report_progress(progress: int, total: int | None) -> None:
+    """Send an MCP progress notification when the caller asked for progress."""
+    try:
+        context = get_context()
+    except RuntimeError:
+        logger.debug("No MCP request context, export progress not reported")
+        return
+    await context.report_progress(progress=progress, total=total)
+
+
+async def export_chat_history_impl(
+    chat_id: str,
+    output_path: str | None = None,
+    limit: int | None = None,
+    resume: bool = True,
+    use_takeout: bool = True,
+) -> dict[str, Any]:
+    """
+    Export chat history to an NDJSON file, one formatted message per line.
+
+    Args:
+        chat_id: Target chat identifier ('me', numeric ID, username, or -100... form)
+        output_path: File name inside the session's export directory
+            (default: <chat>.ndjson); paths leading outside it are rejected
+        limit: Maximum messages to export in this call (whole history when omitted)
+        resume: Continue from the checkpoint left by an interrupted export
+        use_takeout: Read history through a takeout session
+
+    Returns:
+        Dictionary with the output path, exported count, resume offset and completion flag
+    """
+    params = {
+        "chat_id": chat_id,
+        "output_path": output_path,
+        "limit": limit,
+        "resume": resume,
+        "use_takeout": use_takeout,
+    }
+    log_operation_start("Exporting chat history", params)
+
+    offset_id = 0
+    exported = 0
+    try:
+        client = await get_connected_client()
+        entity = await get_entity_by_id(chat_id)
+        if not entity:
+            return log_and_build_error(
+                operation="export_chat_history",
+                error_message=f"Cannot find chat with ID '{chat_id}'",
+                params=params,
+                exception=ValueError(f"Cannot find chat with ID '{chat_id}'"),
+            )
+
+        try:
+            path = resolve_export_path(get_request_session_key(), output_path, entity)
+        except ValueError as e:
+            return log_and_build_error(
+                operation="export_chat_history",
+                error_message=str(e),
+                params=params,
+                exception=e,
+            )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        checkpoint_path = _checkpoint_path(path)
+
+        checkpoint = _read_checkpoint(checkpoint_path, entity.id) if resume else None
+        if checkpoint and path.exists():
+            offset_id = checkpoint["offset_id"]
+            exported = checkpoint["exported"]
+            mode = "a"
+        else:
+            mode = "w"
+
+        total = await _get_chat_message_count(chat_id, entity)
+        exported_now = 0
+        complete = True
+        # One message beyond the limit tells whether history continues
+        pages = iter_history_pages(
+            client,
+            entity,
+            offset_id=offset_id,
+            limit=limit + 1 if limit is not None else None,
+            use_takeout=use_takeout,
+        )
+        async with aclosing(pages):
+            with path.open(mode, encoding="utf-8") as out:
+                async for page in pages:
+                    if limit is not None and exported_now + len(page) > limit:
+                        page = page[: limit - exported_now]
+                        complete = False
+                    if page:
+                        out.writelines(to_ndjson_line(record) for record in page)
+                        out.flush()
+                        offset_id = page[-1]["id"]
+                        exported += len(page)
+                        exported_now += len(page)
+                        checkpoint_path.write_text(
+                            json.dumps(
+                                {
+                                    "chat_id": entity.id,
+                                    "offset_id": offset_id,
+                                    "exported": exported,
+                                }
+                            )
+                        )
+                        await _report_progress(exported, total)
+                        logger.debug(f"Exported {exported} messages from {chat_id}")
+                    if not complete:
+                        break
+
+        if complete:
+            checkpoint_path.unlink(missing_ok=True)
+
+        log_operation_success(f"Exported {exported_now} messages to {path}", chat_id)
+        return {
+            "chat": build_entity_dict(entity),
+            "output_path": str(path),
+            "exported": exported,
+            "exported_this_call": exported_now,
+            "total_messages": total,
+            "offset_id": offset_id,
+            "complete": complete,
+        }
+
+    except TakeoutInitDelayError as e:
+        return log_and_build_error(
+            operation="export_chat_history",
+            error_message=(
+                "Telegram requires confirming the data export in another logged-in app; "
+                f"retry in {e.seconds} seconds or pass use_takeout=false"
+            ),
+            params=params,
+            exception=e,
+            action="confirm_takeout",
+        )
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="export_chat_history",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        error = log_and_build_error(
+            operation="export_chat_history",
+            error_message=f"Export of '{chat_id}' stopped after {exported} messages: {e!s}",
+            params=params,
+            exception=e,
+        )
+        error["offset_id"] = offset_id
+        error["exported"] = exported
+        return error
@@ -32,6 +32,69 @@ def _build_query_string(
     return "?" + query_string if query_string else ""
 
 
+def message_link_prefix(entity) -> str | None:
+    """Return the chat part of message links for an already resolved entity.
+
+    Public chats link by username (https://t.me/<username>), everything else
+    by the normalized id (https://t.me/c/<id>). Returns None without an entity.
+    """
+    if entity is None:
+        return None
+    username = getattr(entity, "username", None)
+    if username:
+        return f"https://t.me/{username.lstrip('@')}"
+    entity_id = getattr(entity, "id", None)
+    if entity_id is None:
+        return None
+    return f"https://t.me/c/{_normalize_channel_id(str(entity_id))}"
+
+
+def message_link(
+    prefix: str | None,
+    message_id: int,
+    topic_id: int | None = None,
+    thread_id: int | None = None,
+    comment_id: int | None = None,
+) -> str | None:
+    """Format a message link from a prefix built by message_link_prefix.
+
+    topic_id links a message inside a forum topic (<prefix>/<topic>/<id>).
+    thread_id (?thread=) opens a message in its group reply thread, and
+    comment_id (?comment=) a comment under channel post message_id.
+    """
+    if not prefix:
+        return None
+    link = f"{prefix}/{topic_id}/{message_id}" if topic_id else f"{prefix}/{message_id}"
+    if thread_id or comment_id:
+        link += _build_query_string(thread_id, comment_id)
+    return link
+
+
+class MessageLinkBuilder:
+    """Per-request message link formatter that computes each chat prefix once.
+
+    Search loops format links for many messages of a few chats; this keeps the
+    per-message cost to a dict lookup and a string concatenation instead of an
+    awaited generate_telegram_links call.
+    """
+
+    __slots__ = ("_prefixes",)
+
+    def __init__(self):
+        self._prefixes: dict[tuple[str, Any], str | None] = {}
+
+    def prefix(self, entity) -> str | None:
+        key = (type(entity).__name__, getattr(entity, "id", None))
+        try:
+            return self._prefixes[key]
+        except KeyError:
+            prefix = self._prefixes[key] = message_link_prefix(entity)
+            return prefix
+
+    def link(self, entity, message_id: int) -> str | None:
+        return message_link(self.prefix(entity), message_id)
+
+
 async def _resolve_entity_for_links(
     chat_id: str,
     username: str | None = None,
@@ -1,4 +1,5 @@
 import ipaddress
+import itertools
 import logging
 from io import BytesIO
 from pathlib import Path
@@ -6,23 +7,36 @@ from typing import Any
 from urllib.parse import urlparse
 
 import aiohttp
+from telethon import utils as telethon_utils
 from telethon.tl.functions.contacts import DeleteContactsRequest, ImportContactsRequest
-from telethon.tl.types import InputPhoneContact
+from telethon.tl.functions.messages import GetHistoryRequest
+from telethon.tl.types import InputPhoneContact, MessageEmpty
 
 from src.client.connection import get_connected_client
 from src.config.server_config import ServerMode, get_config
-from src.tools.links import generate_telegram_links
+from src.tools.links import generate_telegram_links, message_link, message_link_prefix
 from src.utils.entity import build_entity_dict, get_entity_by_id
 from src.utils.error_handling import handle_telegram_errors, log_and_build_error
 from src.utils.logging_utils import log_operation_start, log_operation_success
 from src.utils.message_format import (
+    attach_reply_parents,
     build_message_result,
     build_send_edit_result,
+    compact_messages,
+    compact_response,
+    normalize_fields,
+    prefetch_forward_origins,
+    project_message,
     transcribe_voice_messages,
 )
+from src.utils.message_store import index_results
+from src.utils.transcription import TRANSCRIPTION_TIMEOUT, get_session_transcriptions
 
 logger = logging.getLogger(__name__)
 
+# messages.getHistory returns at most 100 messages per call
+MAX_CONTEXT_MESSAGES = 100
+
 
 def detect_message_formatting(message: str) -> str | None:
     """
@@ -576,9 +590,13 @@ async def _build_message_results(
     entity,
     id_to_link: dict,
     chat_dict: dict,
+    fields: frozenset[str] | None = None,
 ) -> list[dict[str, Any]]:
     """Build result dictionaries for all requested messages."""
     results: list[dict[str, Any]] = []
+    forward_origins = await prefetch_forward_origins(
+        [msg for msg in messages if msg], fields
+    )
 
     for idx, requested_id in enumerate(message_ids):
         msg = _find_message_by_id(messages, requested_id, idx)
@@ -594,29 +612,48 @@ async def _build_message_results(
             continue
 
         link = id_to_link.get(getattr(msg, "id", requested_id))
-        built = await build_message_result(client, msg, entity, link)
+        built = await build_message_result(
+            client, msg, entity, link, fields=fields, forward_origins=forward_origins
+        )
         results.append(built)
 
     return results
 
 
 async def read_messages_by_ids(
-    chat_id: str, message_ids: list[int]
-) -> list[dict[str, Any]]:
+    chat_id: str,
+    message_ids: list[int],
+    fields: list[str] | str | None = None,
+    compact: bool = False,
+    wait_for_transcription: bool = True,
+    include_reply_parents: bool = False,
+) -> list[dict[str, Any]] | dict[str, Any]:
     """
     Read specific messages by their IDs from a given chat.
 
     Args:
         chat_id: Target chat identifier (username like '@channel', numeric ID, or '-100...' form)
         message_ids: List of message IDs to fetch
+        fields: Optional projection of message keys; others are not computed
+        compact: Return {"messages", "entities"} with chats and senders referenced by id
+        wait_for_transcription: When False, voice messages still being transcribed
+            are returned at once with transcription_pending and a
+            transcription_id for get_transcription_impl
+        include_reply_parents: Attach a reply_to preview of each replied-to
+            message, all fetched with one extra request
 
     Returns:
         List of message dictionaries consistent with search results format
+        (a {"messages", "entities"} dictionary when compact=True)
     """
     params = {
         "chat_id": chat_id,
         "message_ids": message_ids,
         "message_count": len(message_ids) if message_ids else 0,
+        "fields": fields,
+        "compact": compact,
+        "wait_for_transcription": wait_for_transcription,
+        "include_reply_parents": include_reply_parents,
     }
     log_operation_start("Reading messages by IDs", params)
 
@@ -632,6 +669,18 @@ async def read_messages_by_ids(
             )
         ]
 
+    try:
+        projection = normalize_fields(fields)
+    except ValueError as e:
+        return [
+            log_and_build_error(
+                operation="read_messages",
+                error_message=str(e),
+                params=params,
+                exception=e,
+            )
+        ]
+
     client = await get_connected_client()
     try:
         entity = await get_entity_by_id(chat_id)
@@ -658,20 +707,47 @@ async def read_messages_by_ids(
         )
         chat_dict = build_entity_dict(entity)
 
-        # Build results for all messages
+        # Build results for all messages; parents are found through reply_to_msg_id
+        build_projection = (
+            projection | {"reply_to_msg_id"}
+            if include_reply_parents and projection is not None
+            else projection
+        )
         results = await _build_message_results(
-            client, messages, message_ids, entity, id_to_link, chat_dict
+            client,
+            messages,
+            message_ids,
+            entity,
+            id_to_link,
+            chat_dict,
+            build_projection,
         )
 
         # Transcribe voice messages for premium accounts
         successful_results = [r for r in results if "error" not in r]
         if successful_results:
-            await transcribe_voice_messages(successful_results, entity)
+            if projection is None or "transcription" in projection:
+                await transcribe_voice_messages(
+                    successful_results, entity, wait=wait_for_transcription
+                )
+            if projection is None:
+                # Projected results are partial; keep them out of the store
+                index_results(successful_results, entity)
+            if include_reply_parents:
+                await attach_reply_parents(
+                    client, successful_results, {entity.id: entity}
+                )
+                if build_projection is not projection:
+                    keep = projection | {"reply_to"}
+                    results = [project_message(r, keep) for r in results]
 
         successful_count = len([r for r in results if "error" not in r])
         log_operation_success(
             f"Retrieved {successful_count} messages out of {len(message_ids)} requested",
         )
+        if compact:
+            messages, entities = compact_messages(results)
+            return {"messages": messages, "entities": entities}
         return results
 
     except Exception as e:
@@ -684,6 +760,200 @@ async def read_messages_by_ids(
         return [error_response]
 
 
+async def get_message_context_impl(
+    chat_id: str,
+    message_id: int,
+    before: int = 10,
+    after: int = 10,
+    fields: list[str] | str | None = None,
+    compact: bool = False,
+) -> dict[str, Any]:
+    """
+    Read the conversation around one message with a single history request.
+
+    messages.getHistory with offset_id=message_id returns messages older than
+    the anchor; a negative add_offset of -(after + 1) shifts that window up to
+    include the anchor and the after newer messages, so before + after + 1
+    messages arrive in one round trip together with their senders.
+
+    Args:
+        chat_id: Target chat identifier (username, numeric ID, '-100...' form or 'me')
+        message_id: Anchor message ID (e.g. a search hit)
+        before: Number of older messages to include
+        after: Number of newer messages to include
+        fields: Optional projection of message keys; others are not computed
+        compact: Reference chats and senders by id from a top-level 'entities' map
+
+    Returns:
+        Dictionary with messages oldest first, anchor_id, anchor_found and
+        has_more_before / has_more_after
+    """
+    params = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "before": before,
+        "after": after,
+        "fields": fields,
+        "compact": compact,
+    }
+    log_operation_start("Reading message context", params)
+
+    try:
+        if before < 0 or after < 0:
+            raise ValueError("before and after must not be negative")
+        if before + after + 1 > MAX_CONTEXT_MESSAGES:
+            raise ValueError(
+                f"before + after must be at most {MAX_CONTEXT_MESSAGES - 1} "
+                "(one history request)"
+            )
+        projection = normalize_fields(fields)
+    except ValueError as e:
+        return log_and_build_error(
+            operation="get_message_context",
+            error_message=str(e),
+            params=params,
+            exception=e,
+        )
+
+    client = await get_connected_client()
+    try:
+        entity = await get_entity_by_id(chat_id)
+        if not entity:
+            raise ValueError(f"Cannot find any entity corresponding to '{chat_id}'")
+
+        history = await client(
+            GetHistoryRequest(
+                peer=entity,
+                offset_id=message_id,
+                offset_date=None,
+                add_offset=-(after + 1),
+                limit=before + after + 1,
+                max_id=0,
+                min_id=0,
+                hash=0,
+            )
+        )
+        # Senders and forward sources arrive with the page: attach them the
+        # way Telethon's iterators do instead of looking each one up
+        entities = {
+            telethon_utils.get_peer_id(x): x
+            for x in itertools.chain(history.users, history.chats)
+        }
+        messages = []
+        for message in history.messages:
+            if isinstance(message, MessageEmpty):
+                continue
+            message._finish_init(client, entities, entity)
+            messages.append(message)
+        messages.sort(key=lambda m: m.id)
+
+        link_prefix = message_link_prefix(entity)
+        forward_origins = await prefetch_forward_origins(messages, projection)
+        results = [
+            await build_message_result(
+                client,
+                message,
+                entity,
+                message_link(link_prefix, message.id),
+                fields=projection,
+                forward_origins=forward_origins,
+            )
+            for message in messages
+        ]
+
+        if results:
+            if projection is None or "transcription" in projection:
+                await transcribe_voice_messages(results, entity)
+            if projection is None:
+                index_results(results, entity)
+
+        older = sum(1 for m in messages if m.id < message_id)
+        newer = sum(1 for m in messages if m.id > message_id)
+        response: dict[str, Any] = {
+            "messages": results,
+            "anchor_id": message_id,
+            "anchor_found": any(m.id == message_id for m in messages),
+            # Full sides suggest more history beyond the window
+            "has_more_before": before > 0 and older >= before,
+            "has_more_after": after > 0 and newer >= after,
+        }
+        log_operation_success(
+            f"Retrieved {len(results)} messages around {message_id}", chat_id
+        )
+        return compact_response(response) if compact else response
+
+    except Exception as e:
+        return log_and_build_error(
+            operation="get_message_context",
+            error_message=f"Failed to read message context: {e!s}",
+            params=params,
+            exception=e,
+        )
+
+
+async def get_transcription_impl(
+    transcription_id: int, wait_seconds: float = 0
+) -> dict[str, Any]:
+    """
+    Poll a voice transcription returned as transcription_pending.
+
+    The handle maps to the voice message it belongs to; the text is taken from
+    the session's transcription cache, which updateTranscribedAudio fills, so
+    polling sends no request to Telegram.
+
+    Args:
+        transcription_id: transcription_id of a message marked transcription_pending
+        wait_seconds: Wait up to this long for an unfinished transcription
+
+    Returns:
+        Dictionary with status "done" and the text, or status "pending"
+    """
+    params = {"transcription_id": transcription_id, "wait_seconds": wait_seconds}
+    log_operation_start("Polling voice transcription", params)
+
+    if not 0 <= wait_seconds <= TRANSCRIPTION_TIMEOUT:
+        error = ValueError(
+            f"wait_seconds must be between 0 and {TRANSCRIPTION_TIMEOUT:g}"
+        )
+        return log_and_build_error(
+            operation="get_transcription",
+            error_message=str(error),
+            params=params,
+            exception=error,
+        )
+
+    client = await get_connected_client()
+    state = get_session_transcriptions(client)
+    target = state.lookup(transcription_id)
+    if target is None:
+        return log_and_build_error(
+            operation="get_transcription",
+            error_message=f"Unknown transcription {transcription_id}",
+            params=params,
+            action="Read the voice message again to get a current transcription_id",
+        )
+
+    peer_id, message_id = target
+    text = state.cached(peer_id, [message_id]).get(message_id)
+    if text is None and wait_seconds > 0:
+        text = await state.wait(
+            transcription_id, peer_id, message_id, timeout=wait_seconds
+        )
+
+    response: dict[str, Any] = {
+        "transcription_id": transcription_id,
+        "chat_id": peer_id,
+        "message_id": message_id,
+        "status": "pending" if text is None else "done",
+    }
+    if text:
+        response["transcription"] = text
+    log_operation_success(
+        f"Transcription {transcription_id} is {response['status']}", str(peer_id)
+    )
+    return response
+
+
 async def download_message_media_impl(
     chat_id: str,
     message_id: int,
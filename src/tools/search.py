@@ -1,80 +1,288 @@
+import asyncio
 import logging
-from datetime import datetime
+import time
+from datetime import UTC, datetime
 from typing import Any
 
-from telethon.tl.functions.messages import SearchGlobalRequest
-from telethon.tl.types import InputMessagesFilterEmpty, InputPeerEmpty
+from telethon import utils as telethon_utils
+from telethon.tl.functions.messages import GetDialogFiltersRequest, SearchGlobalRequest
+from telethon.tl.types import (
+    Channel,
+    DialogFilter,
+    DialogFilterChatlist,
+    InputMessagesFilterContacts,
+    InputMessagesFilterDocument,
+    InputMessagesFilterEmpty,
+    InputMessagesFilterGeo,
+    InputMessagesFilterGif,
+    InputMessagesFilterMusic,
+    InputMessagesFilterPhotos,
+    InputMessagesFilterPhotoVideo,
+    InputMessagesFilterPinned,
+    InputMessagesFilterRoundVideo,
+    InputMessagesFilterUrl,
+    InputMessagesFilterVideo,
+    InputMessagesFilterVoice,
+    InputPeerEmpty,
+    InputPeerSelf,
+    User,
+)
 
-from src.client.connection import SessionNotAuthorizedError, get_connected_client
-from src.tools.links import generate_telegram_links
+from src.client.connection import (
+    SessionNotAuthorizedError,
+    get_connected_client,
+    get_request_session_key,
+    register_session_close_callback,
+)
+from src.tools.links import MessageLinkBuilder, message_link, message_link_prefix
 from src.utils.entity import (
+    ChatFilter,
     _get_chat_message_count,
-    _matches_chat_type,
-    _matches_public_filter,
-    compute_entity_identifier,
+    build_entity_dict,
+    get_entities_by_ids,
     get_entity_by_id,
+    get_search_counters,
 )
 from src.utils.error_handling import (
     add_logging_metadata,
     log_and_build_error,
     sanitize_params_for_logging,
 )
-from src.utils.helpers import _append_dedup_until_limit
+from src.utils.helpers import _append_dedup_until_limit, decode_cursor, encode_cursor
 from src.utils.message_format import (
+    ResponseBudget,
+    SnippetMatcher,
     _has_any_media,
+    attach_reply_parents,
     build_message_result,
+    compact_response,
+    fill_cached_transcriptions,
+    normalize_fields,
+    prefetch_forward_origins,
+    project_message,
     transcribe_voice_messages,
 )
+from src.utils.message_store import get_message_store, index_results
+from src.utils.near_duplicates import NearDuplicateIndex, attach_duplicate
+from src.utils.relevance import rank_by_relevance
 
 logger = logging.getLogger(__name__)
 
+# Concurrent per-chat messages.search calls in multi-chat search
+MAX_PARALLEL_CHAT_SEARCHES = 5
 
-async def _process_message_for_results(
-    client,
-    message,
-    chat_entity,
-    chat_type: str,
-    public: bool | None,
-    results: list[dict[str, Any]],
-) -> bool:
-    """Process a single message and add it to results if it matches criteria.
+# rank="relevance": candidates fetched per requested result, and the hard cap
+RELEVANCE_OVERFETCH_FACTOR = 4
+MAX_RELEVANCE_CANDIDATES = 200
+RANK_MODES = ("date", "relevance")
 
-    Returns True if the message was added, False otherwise.
+# media_type values pushed to Telegram as messages.search / searchGlobal filters
+MEDIA_TYPE_FILTERS = {
+    "photo": InputMessagesFilterPhotos,
+    "video": InputMessagesFilterVideo,
+    "photo_video": InputMessagesFilterPhotoVideo,
+    "document": InputMessagesFilterDocument,
+    "voice": InputMessagesFilterVoice,
+    "round_video": InputMessagesFilterRoundVideo,
+    "audio": InputMessagesFilterMusic,
+    "gif": InputMessagesFilterGif,
+    "link": InputMessagesFilterUrl,
+    "location": InputMessagesFilterGeo,
+    "contact": InputMessagesFilterContacts,
+    "pinned": InputMessagesFilterPinned,
+}
+
+
+def build_message_filter(media_type: str | None):
+    """Map a media_type name to a Telegram InputMessagesFilter (None for no filter).
+
+    Raises:
+        ValueError: If media_type is not a known name
     """
-    if not message:
-        return False
+    if not media_type:
+        return None
+    filter_cls = MEDIA_TYPE_FILTERS.get(media_type.strip().lower())
+    if filter_cls is None:
+        raise ValueError(
+            f"Unknown media_type '{media_type}'. Use one of: {', '.join(MEDIA_TYPE_FILTERS)}"
+        )
+    return filter_cls()
 
-    # Check if message has content (text or any type of media)
-    has_content = (hasattr(message, "text") and message.text) or _has_any_media(message)
 
-    if not has_content:
-        return False
+# Telegram's fixed id for the Archive folder in messages.searchGlobal
+ARCHIVE_FOLDER_ID = 1
+
+# Dialog filters (custom folders) change rarely; cache them per session
+DIALOG_FILTERS_TTL_SECONDS = 300
+_dialog_filters_cache: dict[str, tuple[float, list]] = {}
+
+
+async def _get_dialog_filters(client) -> list:
+    """Return the session's custom folders, cached for DIALOG_FILTERS_TTL_SECONDS."""
+    key = get_request_session_key()
+    cached = _dialog_filters_cache.get(key)
+    if cached and time.time() - cached[0] < DIALOG_FILTERS_TTL_SECONDS:
+        return cached[1]
+    result = await client(GetDialogFiltersRequest())
+    filters = [
+        f
+        for f in getattr(result, "filters", result)
+        if isinstance(f, DialogFilter | DialogFilterChatlist)
+    ]
+    _dialog_filters_cache[key] = (time.time(), filters)
+    return filters
+
+
+def _folder_title(dialog_filter) -> str:
+    title = dialog_filter.title
+    return getattr(title, "text", title) or ""
 
-    if not _matches_chat_type(chat_entity, chat_type):
-        return False
 
-    if not _matches_public_filter(chat_entity, public):
+# Category flags of a folder; chats matching any of them belong to it
+_FOLDER_CATEGORIES = ("contacts", "non_contacts", "groups", "broadcasts", "bots")
+
+
+def _folder_peer_id(peer) -> str:
+    if isinstance(peer, InputPeerSelf):
+        return "me"
+    return str(telethon_utils.get_peer_id(peer))
+
+
+def _dialog_category(entity) -> str:
+    if isinstance(entity, User):
+        if entity.bot:
+            return "bots"
+        return "contacts" if entity.contact or entity.is_self else "non_contacts"
+    if isinstance(entity, Channel) and entity.broadcast:
+        return "broadcasts"
+    return "groups"
+
+
+def _dialog_in_folder_categories(dialog_filter, dialog) -> bool:
+    """Apply a folder's category and exclude_muted/read/archived flags to a dialog."""
+    if not getattr(dialog_filter, _dialog_category(dialog.entity), False):
         return False
+    if dialog_filter.exclude_archived and dialog.archived:
+        return False
+    if (
+        dialog_filter.exclude_read
+        and not dialog.unread_count
+        and not getattr(dialog.dialog, "unread_mark", False)
+    ):
+        return False
+    if dialog_filter.exclude_muted:
+        mute_until = getattr(dialog.dialog.notify_settings, "mute_until", None)
+        if mute_until and mute_until > datetime.now(UTC):
+            return False
+    return True
+
 
+async def _resolve_input_peers(client, peers: list) -> list:
+    """Entities of a folder's InputPeers, None for peers that cannot be read.
+
+    The peers carry their access hash, so they resolve through one batched
+    users/chats/channels lookup per kind without the session's entity cache.
+    """
     try:
-        identifier = compute_entity_identifier(chat_entity)
-        links = await generate_telegram_links(
-            identifier, [message.id], resolved_entity=chat_entity
-        )
-        link = links.get("message_links", [None])[0]
-        results.append(await build_message_result(client, message, chat_entity, link))
-        return True
+        return await client.get_entity(peers)
     except Exception as e:
-        logger.warning(f"Error processing message: {e}")
-        return False
+        logger.debug(f"Batch folder peer lookup failed, resolving one by one: {e}")
+
+    async def resolve(peer):
+        try:
+            return await client.get_entity(peer)
+        except Exception as e:
+            logger.warning(f"Could not resolve folder peer {peer}: {e}")
+            return None
+
+    return await asyncio.gather(*(resolve(peer) for peer in peers))
+
+
+async def _folder_chats(client, dialog_filter) -> dict[str, Any]:
+    """Chats of a folder keyed by chat ID, evaluated the way Telegram apps do.
+
+    Pinned and included chats always belong to the folder, excluded chats
+    never do, and folders defined by category (contacts, groups, broadcasts...)
+    add every dialog matching those flags, which requires listing the dialogs.
+    Entities come from the folder's own peers and dialogs, so they are never
+    looked up again by ID. Peers that cannot be read map to None.
+    """
+    excluded = {
+        _folder_peer_id(peer) for peer in getattr(dialog_filter, "exclude_peers", [])
+    }
+    peers: dict[str, Any] = {}
+    for peer in [*dialog_filter.pinned_peers, *dialog_filter.include_peers]:
+        chat_id = _folder_peer_id(peer)
+        if chat_id not in excluded:
+            peers.setdefault(chat_id, peer)
+    chats: dict[str, Any] = {}
+    if peers:
+        entities = await _resolve_input_peers(client, list(peers.values()))
+        chats.update(zip(peers, entities, strict=True))
+    if any(getattr(dialog_filter, flag, False) for flag in _FOLDER_CATEGORIES):
+        async for dialog in client.iter_dialogs():
+            if _dialog_in_folder_categories(dialog_filter, dialog):
+                is_self = isinstance(dialog.entity, User) and dialog.entity.is_self
+                chat_id = "me" if is_self else str(dialog.id)
+                if chat_id not in excluded:
+                    chats.setdefault(chat_id, dialog.entity)
+    return chats
+
+
+async def _resolve_folder(
+    client, folder: str
+) -> tuple[dict[str, Any], dict[str, Any] | None]:
+    """Map a folder name or id to the archive folder or a custom folder's chats.
+
+    Folder definitions are cached; their chats are evaluated on every call
+    since category folders depend on dialog state (unread, muted, archived).
+
+    Returns:
+        (folder description, entities of a custom folder's chats by chat ID;
+        None for the archive)
+
+    Raises:
+        ValueError: If no folder matches
+    """
+    if folder.strip().lower() in ("archive", "archived", str(ARCHIVE_FOLDER_ID)):
+        return {"folder_id": ARCHIVE_FOLDER_ID, "title": "Archive"}, None
+
+    wanted = folder.strip().lower()
+    filters = await _get_dialog_filters(client)
+    for dialog_filter in filters:
+        if wanted in (str(dialog_filter.id), _folder_title(dialog_filter).lower()):
+            chats = await _folder_chats(client, dialog_filter)
+            scope = {
+                "filter_id": dialog_filter.id,
+                "title": _folder_title(dialog_filter),
+                "chat_ids": list(chats),
+            }
+            return scope, chats
+    available = ", ".join(
+        ["Archive", *(_folder_title(f) for f in filters if _folder_title(f))]
+    )
+    raise ValueError(f"Folder '{folder}' not found. Available folders: {available}")
+
+
+def _forget_dialog_filters(token: str) -> None:
+    _dialog_filters_cache.pop(token, None)
+
+
+register_session_close_callback(_forget_dialog_filters)
 
 
 async def _execute_parallel_searches_generators(
-    generators: list, collected: list[dict[str, Any]], seen_keys: set, limit: int
+    generators: list,
+    collected: list[dict[str, Any]],
+    seen_keys: set,
+    limit: int,
+    duplicates: NearDuplicateIndex | None = None,
 ) -> None:
     """Execute multiple search generators in parallel for memory efficiency.
 
     Round-robin through generators to balance results and collect one extra message to determine has_more.
+    With a duplicates index, near-duplicates of collected results are folded
+    into them and do not take a result slot.
     """
     active_gens = list(enumerate(generators))
     # Collect one extra message to determine if there are more results
@@ -86,6 +294,15 @@ async def _execute_parallel_searches_generators(
         for i, gen in active_gens:
             try:
                 result = await gen.__anext__()
+                if duplicates is not None:
+                    key = (result.get("chat", {}).get("id"), result.get("id"))
+                    if key not in seen_keys:
+                        original = duplicates.match_or_add(result.get("text"), result)
+                        if original is not None:
+                            seen_keys.add(key)
+                            attach_duplicate(original, result.get("link"))
+                            next_active.append((i, gen))
+                            continue
                 _append_dedup_until_limit(collected, seen_keys, [result], target_limit)
                 if len(collected) >= target_limit:
                     break
@@ -99,6 +316,97 @@ async def _execute_parallel_searches_generators(
         active_gens = next_active
 
 
+def _apply_response_budget(
+    response: dict[str, Any],
+    max_response_bytes: int | None,
+    max_text_chars: int | None,
+) -> dict[str, Any]:
+    """Trim response["messages"] to the byte budget, flagging what was left out."""
+    if max_response_bytes is None and max_text_chars is None:
+        return response
+    messages = response["messages"]
+    kept = ResponseBudget(max_response_bytes, max_text_chars).fit(messages)
+    if len(kept) < len(messages):
+        response["messages"] = kept
+        response["has_more"] = True
+        response["omitted_by_budget"] = len(messages) - len(kept)
+    return response
+
+
+def _validate_output_limits(
+    max_response_bytes: int | None,
+    max_text_chars: int | None,
+    snippet_chars: int | None = None,
+) -> None:
+    if max_response_bytes is not None and max_response_bytes <= 0:
+        raise ValueError("max_response_bytes must be a positive number of bytes")
+    if max_text_chars is not None and max_text_chars <= 0:
+        raise ValueError("max_text_chars must be a positive number of characters")
+    if snippet_chars is not None and snippet_chars <= 0:
+        raise ValueError("snippet_chars must be a positive number of characters")
+
+
+def _search_local_messages(
+    queries: list[str],
+    chat_id: str | None,
+    limit: int,
+    min_date: str | None,
+    max_date: str | None,
+    chat_type: str | None,
+    public: bool | None,
+    include_total_count: bool,
+    params: dict[str, Any],
+) -> dict[str, Any]:
+    """Answer a search from the local FTS5 message store without network calls."""
+    store = get_message_store()
+
+    local_chat_id = None
+    if chat_id:
+        local_chat_id = store.resolve_chat_id(chat_id)
+        if local_chat_id is None:
+            return log_and_build_error(
+                operation="search_messages",
+                error_message=f"Chat '{chat_id}' is not in the local message store. Run sync_chat first.",
+                params=params,
+                exception=ValueError(f"Unknown local chat '{chat_id}'"),
+            )
+
+    chat_types = (
+        [ct.strip().lower() for ct in chat_type.split(",") if ct.strip()]
+        if chat_type
+        else None
+    )
+    # Fetch one extra row to determine has_more
+    rows = store.search(
+        queries,
+        chat_id=local_chat_id,
+        limit=limit + 1,
+        min_date=min_date,
+        max_date=max_date,
+        chat_types=chat_types,
+        public=public,
+    )
+    window = rows[:limit]
+    logger.info(f"Found {len(window)} local messages matching query: {queries}")
+
+    if not window:
+        return log_and_build_error(
+            operation="search_messages",
+            error_message=f"No local messages found matching query '{', '.join(queries)}'",
+            params=params,
+            exception=ValueError("No local messages found"),
+        )
+
+    response: dict[str, Any] = {
+        "messages": window,
+        "has_more": len(rows) > limit,
+        "source": "local",
+    }
+    if include_total_count and local_chat_id is not None and not queries:
+        response["total_count"] = store.count_messages(local_chat_id)
+    return response
+
+
 async def search_messages_impl(
     query: str,
     chat_id: str | None = None,
@@ -110,6 +418,20 @@ async def search_messages_impl(
     | None = None,  # True=with username, False=without username, None=no filter
     auto_expand_batches: int = 1,  # Fewer extra batches to reduce RAM
     include_total_count: bool = False,  # Whether to include total count in response
+    source: str = "telegram",  # 'telegram' (live RPC) or 'local' (FTS5 store)
+    folder: str | None = None,  # 'archive' or a custom folder title/id (global only)
+    media_type: str
+    | None = None,  # Telegram-side media filter (see MEDIA_TYPE_FILTERS)
+    from_user: str | None = None,  # Sender filter (per-chat only)
+    fields: list[str] | str | None = None,  # Message keys to build (None = all)
+    max_response_bytes: int | None = None,  # Byte budget for returned messages
+    max_text_chars: int | None = None,  # Cut longer message texts
+    snippet_chars: int | None = None,  # Text window around the match instead of text
+    collapse_duplicates: bool = False,  # Fold near-identical texts into one result
+    rank: str = "date",  # 'date' (Telegram order) or 'relevance' (BM25 rerank)
+    wait_for_transcription: bool = True,  # False: mark pending voice transcriptions
+    include_reply_parents: bool = False,  # Attach previews of replied-to messages
+    compact: bool = False,  # Shared entity table instead of per-message dicts
 ) -> dict[str, Any]:
     """
     Search for messages in Telegram chats using Telegram's global or per-chat search functionality with optional chat type and public filtering and auto-expansion for filtered results.
@@ -124,6 +446,31 @@ async def search_messages_impl(
         public: Optional filter for public discoverability (True=with username, False=without username, None=no filter). Never applies to private chats.
         auto_expand_batches: Maximum additional batches to fetch if not enough filtered results (default 2)
         include_total_count: Whether to include total count of matching messages in response (default False)
+        source: 'telegram' for live search, 'local' to answer from the per-session FTS5 store
+            (BM25 ranking, FTS5 phrase/prefix/boolean syntax, no network calls)
+        folder: Optional folder scope for global search: 'archive' uses searchGlobal's
+            folder_id, a custom folder title or id searches only that folder's chats
+            (per-chat 'total_counts' with include_total_count; rank='relevance'
+            is rejected since results are merged newest first across chats)
+        media_type: Optional media filter applied by Telegram ('photo', 'document', 'voice', 'link', ...)
+        from_user: Optional sender (ID or username) applied by Telegram; per-chat search only
+        fields: Optional projection of message keys (see MESSAGE_FIELDS); keys not
+            requested are not computed, e.g. no sender or forward lookups
+        max_response_bytes: Optional budget for the serialized messages; results
+            that do not fit are left out and has_more is set
+        max_text_chars: Optional maximum length of each message text
+        snippet_chars: Optional window size; replaces 'text' with a 'snippet' around the
+            first hit and 'match_offsets' ([start, end] pairs within the snippet)
+        collapse_duplicates: Fold near-duplicate texts (reposts) into the first result,
+            which gets a 'duplicates' count and 'duplicate_links'
+        rank: 'date' keeps Telegram's order; 'relevance' over-fetches up to
+            RELEVANCE_OVERFETCH_FACTOR * limit candidates and returns the best BM25 matches
+        wait_for_transcription: When False, voice messages Telegram is still
+            transcribing are returned at once with 'transcription_pending'
+        include_reply_parents: Attach a 'reply_to' preview of each replied-to
+            message, fetched with one request per chat for the whole page
+        compact: Return chats and senders once in a top-level 'entities' map and
+            reference them from messages by chat_ref / sender_ref
 
     Returns:
         Dictionary containing:
@@ -146,6 +493,19 @@ async def search_messages_impl(
         "public": public,
         "auto_expand_batches": auto_expand_batches,
         "include_total_count": include_total_count,
+        "source": source,
+        "folder": folder,
+        "media_type": media_type,
+        "from_user": from_user,
+        "fields": fields,
+        "max_response_bytes": max_response_bytes,
+        "max_text_chars": max_text_chars,
+        "snippet_chars": snippet_chars,
+        "collapse_duplicates": collapse_duplicates,
+        "rank": rank,
+        "wait_for_transcription": wait_for_transcription,
+        "include_reply_parents": include_reply_parents,
+        "compact": compact,
         "is_global_search": chat_id is None,
         "has_query": bool(query and query.strip()),
         "has_date_filter": bool(min_date or max_date),
@@ -156,26 +516,111 @@ async def search_messages_impl(
         [q.strip() for q in query.split(",") if q.strip()] if query else []
     )
 
-    if not chat_id and not queries:
+    try:
+        message_filter = build_message_filter(media_type)
+        projection = normalize_fields(fields)
+        _validate_output_limits(max_response_bytes, max_text_chars, snippet_chars)
+        if rank not in RANK_MODES:
+            raise ValueError(f"rank must be one of: {', '.join(RANK_MODES)}")
+    except ValueError as e:
+        return log_and_build_error(
+            operation="search_messages",
+            error_message=str(e),
+            params=params,
+            exception=e,
+        )
+    if from_user and not chat_id:
+        return log_and_build_error(
+            operation="search_messages",
+            error_message="from_user requires chat_id (Telegram's global search has no sender filter); use search_messages_in_chats for several chats",
+            params=params,
+            exception=ValueError("from_user is not supported for global search"),
+        )
+    if source == "local" and (media_type or from_user or include_reply_parents):
+        return log_and_build_error(
+            operation="search_messages",
+            error_message="media_type, from_user and include_reply_parents are only available with source='telegram'",
+            params=params,
+            exception=ValueError("Unsupported filters for local search"),
+        )
+
+    if not chat_id and not queries and not message_filter:
         return log_and_build_error(
             operation="search_messages",
             error_message="Search query must not be empty for global search",
             params=params,
             exception=ValueError("Search query must not be empty for global search"),
         )
+    if folder and source == "local":
+        return log_and_build_error(
+            operation="search_messages",
+            error_message="Folder-scoped search is only available with source='telegram'",
+            params=params,
+            exception=ValueError("folder is not supported for local search"),
+        )
+    if source == "local":
+        try:
+            response = _search_local_messages(
+                queries,
+                chat_id,
+                limit,
+                min_date,
+                max_date,
+                chat_type,
+                public,
+                include_total_count,
+                params,
+            )
+            if "messages" not in response:
+                return response
+            if projection is not None:
+                response["messages"] = [
+                    project_message(m, projection) for m in response["messages"]
+                ]
+            if snippet_chars is not None:
+                matcher = SnippetMatcher(queries, snippet_chars)
+                response["messages"] = [matcher.apply(m) for m in response["messages"]]
+            _apply_response_budget(response, max_response_bytes, max_text_chars)
+            return compact_response(response) if compact else response
+        except Exception as e:
+            return log_and_build_error(
+                operation="search_messages",
+                error_message=f"Local search failed: {e!s}",
+                params=params,
+                exception=e,
+            )
+
     min_datetime = datetime.fromisoformat(min_date) if min_date else None
     max_datetime = datetime.fromisoformat(max_date) if max_date else None
+    chat_filter = ChatFilter.compile(chat_type, public)
     safe_params = sanitize_params_for_logging(params)
     enhanced_params = add_logging_metadata(safe_params)
     logger.debug(
         "Starting Telegram search",
         extra={"params": enhanced_params},
     )
+    # Relevance ranking needs a query and the text of every candidate
+    ranked = rank == "relevance" and bool(queries)
+    fetch_limit = (
+        max(limit, min(limit * RELEVANCE_OVERFETCH_FACTOR, MAX_RELEVANCE_CANDIDATES))
+        if ranked
+        else limit
+    )
+    build_projection = (
+        projection | {"text"} if ranked and projection is not None else projection
+    )
+    if include_reply_parents and build_projection is not None:
+        # Parents are found through reply_to_msg_id
+        build_projection = build_projection | {"reply_to_msg_id"}
+
     client = await get_connected_client()
     try:
         total_count = None
+        # Entities already resolved, by chat dict id, for reply parent lookups
+        chat_entities: dict[Any, Any] = {}
         collected: list[dict[str, Any]] = []
         seen_keys = set()
+        duplicates = NearDuplicateIndex() if collapse_duplicates else None
 
         if chat_id:
             # Per-chat search; allow empty queries meaning "all messages"
@@ -183,6 +628,12 @@ async def search_messages_impl(
                 entity = await get_entity_by_id(chat_id)
                 if not entity:
                     raise ValueError(f"Could not find chat with ID '{chat_id}'")
+                chat_entities[entity.id] = entity
+                sender = None
+                if from_user:
+                    sender = await get_entity_by_id(from_user)
+                    if not sender:
+                        raise ValueError(f"Could not find user with ID '{from_user}'")
 
                 per_chat_queries = queries if queries else [""]
                 generators = [
@@ -190,21 +641,39 @@ async def search_messages_impl(
                         client,
                         entity,
                         (q or ""),
-                        limit,
-                        chat_type,
-                        public,
+                        fetch_limit,
+                        chat_filter,
                         auto_expand_batches,
+                        message_filter=message_filter,
+                        from_user=sender,
+                        fields=build_projection,
                     )
                     for q in per_chat_queries
                 ]
                 await _execute_parallel_searches_generators(
-                    generators, collected, seen_keys, limit
+                    generators, collected, seen_keys, fetch_limit, duplicates
                 )
+                transcribe = projection is None or "transcription" in projection
+                if ranked:
+                    if transcribe:
+                        # Known transcriptions count toward the score
+                        await fill_cached_transcriptions(collected, entity)
+                    collected = rank_by_relevance(collected, queries)
 
-                await transcribe_voice_messages(collected, entity)
+                if transcribe:
+                    # Only the returned page (plus the has_more probe) is transcribed
+                    await transcribe_voice_messages(
+                        collected[: limit + 1], entity, wait=wait_for_transcription
+                    )
+                    if ranked:
+                        # Rescore with the spoken content of newly transcribed messages
+                        collected = rank_by_relevance(collected, queries)
+                if projection is None:
+                    # Projected results are partial; keep them out of the store
+                    index_results(collected, entity)
 
                 if include_total_count:
-                    total_count = await _get_chat_message_count(chat_id)
+                    total_count = await _get_chat_message_count(chat_id, entity)
 
             except Exception as e:
                 return log_and_build_error(
@@ -216,23 +685,64 @@ async def search_messages_impl(
         else:
             # Global search across queries (skip empty)
             try:
+                folder_id = None
+                if folder:
+                    scope, folder_chats = await _resolve_folder(client, folder)
+                    if folder_chats is not None:
+                        if ranked:
+                            raise ValueError(
+                                "rank='relevance' is not available for custom folders"
+                            )
+                        # Custom folder: search only its chats via the multi-chat path
+                        response = await search_messages_in_chats_impl(
+                            chat_ids=scope["chat_ids"],
+                            resolved_entities=folder_chats,
+                            query=query,
+                            limit=limit,
+                            min_date=min_date,
+                            max_date=max_date,
+                            chat_type=chat_type,
+                            public=public,
+                            media_type=media_type,
+                            include_total_count=include_total_count,
+                            fields=fields,
+                            max_response_bytes=max_response_bytes,
+                            max_text_chars=max_text_chars,
+                            snippet_chars=snippet_chars,
+                            collapse_duplicates=collapse_duplicates,
+                            wait_for_transcription=wait_for_transcription,
+                            include_reply_parents=include_reply_parents,
+                            compact=compact,
+                        )
+                        if response.get("ok") is not False:
+                            response["folder"] = scope
+                        return response
+                    folder_id = scope["folder_id"]
+
                 generators = [
                     _search_global_messages_generator(
                         client,
                         q,
-                        limit,
+                        fetch_limit,
                         min_datetime,
                         max_datetime,
-                        chat_type,
-                        public,
+                        chat_filter,
                         auto_expand_batches,
+                        folder_id=folder_id,
+                        message_filter=message_filter,
+                        fields=build_projection,
+                        always_expand=ranked,
                     )
-                    for q in queries
-                    if q and str(q).strip()
+                    # A media filter alone is a valid global query
+                    for q in (queries or [""])
                 ]
                 await _execute_parallel_searches_generators(
-                    generators, collected, seen_keys, limit
+                    generators, collected, seen_keys, fetch_limit, duplicates
                 )
+                if ranked:
+                    collected = rank_by_relevance(collected, queries)
+                if projection is None:
+                    index_results(collected)
             except Exception as e:
                 return log_and_build_error(
                     operation="search_messages",
@@ -243,6 +753,12 @@ async def search_messages_impl(
 
         # Return results up to limit
         window = collected[:limit] if limit is not None else collected
+        if include_reply_parents:
+            await attach_reply_parents(client, window, chat_entities)
+        if build_projection is not projection:
+            # Text was only built for scoring, reply_to_msg_id to find parents
+            keep = projection | {"relevance_score", "reply_to"}
+            window = [project_message(m, keep) for m in window]
 
         logger.info(f"Found {len(window)} messages matching query: {query}")
 
@@ -262,11 +778,17 @@ async def search_messages_impl(
             )
 
         response = {"messages": window, "has_more": has_more}
+        if ranked:
+            response["rank"] = "relevance"
 
         if total_count is not None:
             response["total_count"] = total_count
 
-        return response
+        if snippet_chars is not None:
+            matcher = SnippetMatcher(queries, snippet_chars)
+            response["messages"] = [matcher.apply(m) for m in window]
+        _apply_response_budget(response, max_response_bytes, max_text_chars)
+        return compact_response(response) if compact else response
     except SessionNotAuthorizedError as e:
         return log_and_build_error(
             operation="search_messages",
@@ -285,33 +807,46 @@ async def search_messages_impl(
 
 
 async def _search_chat_messages_generator(
-    client, entity, query, limit, chat_type, public, auto_expand_batches
+    client,
+    entity,
+    query,
+    limit,
+    chat_filter: ChatFilter,
+    auto_expand_batches,
+    message_filter=None,
+    from_user=None,
+    fields: frozenset[str] | None = None,
 ):
     """Async generator version of chat message search for memory efficiency."""
+    # Chat-level filters are constant for the whole chat: decide before fetching
+    if not chat_filter.matches(entity):
+        return
+    link_prefix = message_link_prefix(entity)
+
     batch_count = 0
     # Allow more batches to ensure we can detect has_more properly
-    max_batches = 1 + auto_expand_batches if chat_type else 1
+    max_batches = 1 + auto_expand_batches if chat_filter.chat_types else 1
     next_offset_id = 0
     yielded_count = 0
+    # Messages stream in one by one: forward sources accumulate here so each
+    # is resolved once per search
+    forward_origins: dict = {}
 
     while batch_count < max_batches:
         last_id = None
         processed_in_batch = 0
         async for message in client.iter_messages(
-            entity, search=query, offset_id=next_offset_id
+            entity,
+            search=query,
+            offset_id=next_offset_id,
+            filter=message_filter,
+            from_user=from_user,
         ):
             if not message:
                 continue
             last_id = getattr(message, "id", None) or last_id
             processed_in_batch += 1
 
-            # Check if message should be yielded
-            if not _matches_chat_type(entity, chat_type):
-                continue
-
-            if not _matches_public_filter(entity, public):
-                continue
-
             has_content = (hasattr(message, "text") and message.text) or _has_any_media(
                 message
             )
@@ -319,12 +854,15 @@ async def _search_chat_messages_generator(
                 continue
 
             try:
-                identifier = compute_entity_identifier(entity)
-                links = await generate_telegram_links(
-                    identifier, [message.id], resolved_entity=entity
+                link = message_link(link_prefix, message.id)
+                result = await build_message_result(
+                    client,
+                    message,
+                    entity,
+                    link,
+                    fields=fields,
+                    forward_origins=forward_origins,
                 )
-                link = links.get("message_links", [None])[0]
-                result = await build_message_result(client, message, entity, link)
                 yield result
                 yielded_count += 1
             except Exception as e:
@@ -346,7 +884,12 @@ async def _search_chat_messages(
     """Backward compatibility wrapper - collects generator results into list."""
     results = []
     async for result in _search_chat_messages_generator(
-        client, entity, query, limit, chat_type, public, auto_expand_batches
+        client,
+        entity,
+        query,
+        limit,
+        ChatFilter.compile(chat_type, public),
+        auto_expand_batches,
     ):
         results.append(result)
         if len(results) >= limit:
@@ -360,13 +903,25 @@ async def _search_global_messages_generator(
     limit,
     min_datetime,
     max_datetime,
-    chat_type,
-    public,
+    chat_filter: ChatFilter,
     auto_expand_batches,
+    folder_id: int | None = None,
+    message_filter=None,
+    fields: frozenset[str] | None = None,
+    always_expand: bool = False,
 ):
-    """Async generator version of global message search for memory efficiency."""
+    """Async generator version of global message search for memory efficiency.
+
+    Extra batches are fetched for filtered searches, or always with always_expand.
+    """
     batch_count = 0
-    max_batches = 1 + auto_expand_batches if chat_type else 1
+    max_batches = (
+        1 + auto_expand_batches if chat_filter.chat_types or always_expand else 1
+    )
+    # Marked peer id -> chat entity, or None when it fails the chat filter;
+    # each chat is resolved and checked once however many messages it has
+    chats: dict[int, Any] = {}
+    link_builder = MessageLinkBuilder()
     next_offset_id = 0
     yielded_count = 0
 
@@ -375,32 +930,35 @@ async def _search_global_messages_generator(
         result = await client(
             SearchGlobalRequest(
                 q=query,
-                filter=InputMessagesFilterEmpty(),
+                filter=message_filter or InputMessagesFilterEmpty(),
                 min_date=min_datetime,
                 max_date=max_datetime,
                 offset_rate=0,
                 offset_peer=InputPeerEmpty(),
                 offset_id=offset_id,
                 limit=min(limit * 2, 50),
+                folder_id=folder_id,
             )
         )
 
         if not hasattr(result, "messages") or not result.messages:
             break
 
+        forward_origins = await prefetch_forward_origins(result.messages, fields)
         for message in result.messages:
             try:
-                chat = await get_entity_by_id(message.peer_id)
-                if not chat:
-                    logger.warning(
-                        f"Could not get entity for peer_id: {message.peer_id}"
+                peer_key = telethon_utils.get_peer_id(message.peer_id)
+                if peer_key not in chats:
+                    chat = await get_entity_by_id(message.peer_id)
+                    if not chat:
+                        logger.warning(
+                            f"Could not get entity for peer_id: {message.peer_id}"
+                        )
+                    chats[peer_key] = (
+                        chat if chat and chat_filter.matches(chat) else None
                     )
-                    continue
-
-                if not _matches_chat_type(chat, chat_type):
-                    continue
-
-                if not _matches_public_filter(chat, public):
+                chat = chats[peer_key]
+                if chat is None:
                     continue
 
                 has_content = (
@@ -409,12 +967,15 @@ async def _search_global_messages_generator(
                 if not has_content:
                     continue
 
-                identifier = compute_entity_identifier(chat)
-                links = await generate_telegram_links(
-                    identifier, [message.id], resolved_entity=chat
+                link = link_builder.link(chat, message.id)
+                msg_result = await build_message_result(
+                    client,
+                    message,
+                    chat,
+                    link,
+                    fields=fields,
+                    forward_origins=forward_origins,
                 )
-                link = links.get("message_links", [None])[0]
-                msg_result = await build_message_result(client, message, chat, link)
                 yield msg_result
                 yielded_count += 1
             except Exception as e:
@@ -444,11 +1005,443 @@ async def _search_global_messages(
         limit,
         min_datetime,
         max_datetime,
-        chat_type,
-        public,
+        ChatFilter.compile(chat_type, public),
         auto_expand_batches,
     ):
         results.append(result)
         if len(results) >= limit:
             break
     return results[:limit]
+
+
+async def _fetch_chat_search_page(
+    client,
+    semaphore: asyncio.Semaphore,
+    entity,
+    query: str,
+    offset_id: int,
+    limit: int,
+    min_datetime: datetime | None,
+    max_datetime: datetime | None,
+    message_filter=None,
+    from_user=None,
+) -> tuple[list, int | None, bool]:
+    """Fetch one page of search results (newest first) from a single chat.
+
+    Returns the messages with content, the id of the oldest message scanned
+    and whether the chat has no further results.
+    """
+    async with semaphore:
+        messages = await client.get_messages(
+            entity,
+            search=query,
+            limit=limit,
+            offset_id=offset_id,
+            offset_date=max_datetime,
+            filter=message_filter,
+            from_user=from_user,
+        )
+    page = []
+    oldest_id = None
+    for message in messages:
+        if not message:
+            continue
+        if min_datetime and message.date and message.date < min_datetime:
+            return page, oldest_id, True
+        oldest_id = message.id
+        if getattr(message, "text", None) or _has_any_media(message):
+            page.append(message)
+    return page, oldest_id, len(messages) < limit
+
+
+def _as_aware(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
+async def search_messages_in_chats_impl(
+    chat_ids: list[str],
+    query: str = "",
+    limit: int = 50,
+    min_date: str | None = None,
+    max_date: str | None = None,
+    cursor: str | None = None,
+    chat_type: str | None = None,
+    public: bool | None = None,
+    media_type: str | None = None,
+    from_user: str | None = None,
+    include_total_count: bool = False,
+    fields: list[str] | str | None = None,
+    max_response_bytes: int | None = None,
+    max_text_chars: int | None = None,
+    snippet_chars: int | None = None,
+    collapse_duplicates: bool = False,
+    wait_for_transcription: bool = True,
+    include_reply_parents: bool = False,
+    compact: bool = False,
+    resolved_entities: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    Search several chats at once and merge the results newest first.
+
+    Entities are resolved in one batch, per-chat messages.search calls run
+    concurrently (bounded by MAX_PARALLEL_CHAT_SEARCHES) and only the merged
+    page is formatted. The returned cursor holds a per-chat offset for chats
+    that may still have results, so later pages skip exhausted chats.
+
+    Args:
+        chat_ids: Chats to search
+        query: Search terms (comma-separated); empty lists the latest messages
+        limit: Maximum number of merged results to return
+        min_date: Optional minimum date (ISO format)
+        max_date: Optional maximum date (ISO format)
+        cursor: Cursor from a previous call to fetch the next page
+        chat_type: Optional chat type filter; other chats are never searched
+        public: Optional public filter; other chats are never searched
+        media_type: Optional media filter applied by Telegram (see MEDIA_TYPE_FILTERS)
+        from_user: Optional sender (ID or username) applied by Telegram
+        include_total_count: Add per-chat message totals (one counters request per chat)
+        fields: Optional projection of message keys; others are not computed
+        max_response_bytes: Optional budget for the serialized messages; formatting
+            stops once it is reached and the cursor resumes at the first left-out message
+        max_text_chars: Optional maximum length of each message text
+        snippet_chars: Optional window size; 'text' becomes a 'snippet' around the
+            first hit with 'match_offsets'
+        collapse_duplicates: Fold near-duplicate texts into the first result
+            ('duplicates' count and 'duplicate_links'); they take no result slot
+        wait_for_transcription: When False, pending voice transcriptions are
+            marked 'transcription_pending' instead of awaited
+        include_reply_parents: Attach a 'reply_to' preview of each replied-to
+            message, fetched with one request per chat
+        compact: Return chats and senders once in a top-level 'entities' map
+        resolved_entities: Entities already known for chat_ids (a folder's
+            peers), used instead of looking the chats up by ID
+
+    Returns:
+        Dictionary with messages, has_more, cursor and unresolved chat ids
+    """
+    params = {
+        "chat_ids": chat_ids,
+        "query": query,
+        "limit": limit,
+        "min_date": min_date,
+        "max_date": max_date,
+        "has_cursor": bool(cursor),
+        "chat_type": chat_type,
+        "public": public,
+        "media_type": media_type,
+        "from_user": from_user,
+        "include_total_count": include_total_count,
+        "fields": fields,
+        "max_response_bytes": max_response_bytes,
+        "max_text_chars": max_text_chars,
+        "snippet_chars": snippet_chars,
+        "collapse_duplicates": collapse_duplicates,
+        "wait_for_transcription": wait_for_transcription,
+        "include_reply_parents": include_reply_parents,
+        "compact": compact,
+    }
+
+    if not chat_ids:
+        return log_and_build_error(
+            operation="search_messages_in_chats",
+            error_message="chat_ids must contain at least one chat",
+            params=params,
+            exception=ValueError("chat_ids must contain at least one chat"),
+        )
+
+    queries = [q.strip() for q in query.split(",") if q.strip()] if query else []
+    queries = queries or [""]
+
+    try:
+        offsets: dict[str, int] | None = decode_cursor(cursor) if cursor else None
+        message_filter = build_message_filter(media_type)
+        projection = normalize_fields(fields)
+        _validate_output_limits(max_response_bytes, max_text_chars, snippet_chars)
+        chat_filter = ChatFilter.compile(chat_type, public)
+        min_datetime = _as_aware(datetime.fromisoformat(min_date)) if min_date else None
+        max_datetime = _as_aware(datetime.fromisoformat(max_date)) if max_date else None
+
+        client = await get_connected_client()
+        entities = (
+            resolved_entities
+            if resolved_entities is not None
+            else await get_entities_by_ids(chat_ids)
+        )
+        sender = None
+        if from_user:
+            sender = await get_entity_by_id(from_user)
+            if not sender:
+                raise ValueError(f"Could not find user with ID '{from_user}'")
+        unresolved = [chat_id for chat_id, entity in entities.items() if not entity]
+        resolved = {
+            chat_id: entity
+            for chat_id, entity in entities.items()
+            if entity and chat_filter.matches(entity)
+        }
+        if not resolved:
+            return log_and_build_error(
+                operation="search_messages_in_chats",
+                error_message=f"None of the chats could be resolved or matched the filters: {', '.join(map(str, chat_ids))}",
+                params=params,
+                exception=ValueError("No chats to search"),
+            )
+
+        # One task per (chat, query); the cursor key identifies both
+        tasks: dict[str, tuple[Any, str, int]] = {}
+        for entity in resolved.values():
+            for q_index, q in enumerate(queries):
+                key = f"{entity.id}:{q_index}"
+                if offsets is None:
+                    tasks[key] = (entity, q, 0)
+                elif key in offsets:
+                    tasks[key] = (entity, q, int(offsets[key]))
+
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_CHAT_SEARCHES)
+        pages = await asyncio.gather(
+            *(
+                _fetch_chat_search_page(
+                    client,
+                    semaphore,
+                    entity,
+                    q,
+                    offset_id,
+                    limit,
+                    min_datetime,
+                    max_datetime,
+                    message_filter,
+                    sender,
+                )
+                for entity, q, offset_id in tasks.values()
+            ),
+            return_exceptions=True,
+        )
+
+        candidates = []
+        scanned: dict[str, tuple[int | None, bool]] = {}
+        for key, outcome in zip(tasks, pages, strict=True):
+            entity = tasks[key][0]
+            if isinstance(outcome, Exception):
+                logger.warning(f"Search in chat {entity.id} failed: {outcome}")
+                continue
+            page, oldest_id, exhausted = outcome
+            scanned[key] = (oldest_id, exhausted)
+            candidates.extend((message.date, key, entity, message) for message in page)
+
+        # Merge newest first, drop the same message found by several queries
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        merged = []
+        seen = set()
+        last_taken: dict[str, int] = {}
+        left_over: set[str] = set()
+        # Near-duplicates folded into the merged message at a position
+        duplicates = NearDuplicateIndex() if collapse_duplicates else None
+        folded: dict[int, list[tuple[str, Any, Any]]] = {}
+        for _, key, entity, message in candidates:
+            if len(merged) >= limit:
+                left_over.add(key)
+                continue
+            last_taken[key] = message.id
+            dedup_key = (entity.id, message.id)
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
+            if duplicates is not None:
+                position = duplicates.match_or_add(
+                    getattr(message, "message", None), len(merged)
+                )
+                if position is not None:
+                    folded.setdefault(position, []).append((key, entity, message))
+                    continue
+            merged.append((key, entity, message))
+
+        # Format only the returned page, one link prefix per chat, stopping
+        # once the byte budget is spent
+        budget = ResponseBudget(max_response_bytes, max_text_chars)
+        matcher = (
+            SnippetMatcher(queries, snippet_chars)
+            if snippet_chars is not None
+            else None
+        )
+        link_builder = MessageLinkBuilder()
+        forward_origins = await prefetch_forward_origins(
+            [message for _, _, message in merged], projection
+        )
+        build_projection = (
+            projection | {"reply_to_msg_id"}
+            if include_reply_parents and projection is not None
+            else projection
+        )
+        results = []
+        for _, entity, message in merged:
+            result = await build_message_result(
+                client,
+                message,
+                entity,
+                link_builder.link(entity, message.id),
+                fields=build_projection,
+                forward_origins=forward_origins,
+            )
+            for _, duplicate_entity, duplicate in folded.get(len(results), ()):
+                attach_duplicate(
+                    result, link_builder.link(duplicate_entity, duplicate.id)
+                )
+            if matcher is not None:
+                matcher.apply(result)
+            if not budget.admit(result):
+                break
+            results.append(result)
+        if len(results) < len(merged):
+            # Messages left out by the budget, and the duplicates folded into
+            # them, are served again on the next page: each of their chats
+            # resumes after the oldest message it returned before the cut
+            served: dict[str, list[int]] = {}
+            newest_cut: dict[str, int] = {}
+            for position, (key, _, message) in enumerate(merged):
+                group = [
+                    (key, message),
+                    *((k, m) for k, _, m in folded.get(position, ())),
+                ]
+                for group_key, group_message in group:
+                    if position < len(results):
+                        served.setdefault(group_key, []).append(group_message.id)
+                    else:
+                        newest_cut[group_key] = max(
+                            newest_cut.get(group_key, 0), group_message.id
+                        )
+            for key, cut_id in newest_cut.items():
+                left_over.add(key)
+                newer = [i for i in served.get(key, ()) if i > cut_id]
+                last_taken[key] = min(newer) if newer else tasks[key][2]
+            merged = merged[: len(results)]
+
+        # Chats resume after the oldest message they contributed; chats whose
+        # whole page was returned resume after the oldest message scanned
+        next_offsets: dict[str, int] = {}
+        for key, (oldest_id, exhausted) in scanned.items():
+            if key in left_over:
+                next_offsets[key] = last_taken.get(key, tasks[key][2])
+            elif not exhausted and oldest_id is not None:
+                next_offsets[key] = oldest_id
+
+        by_chat: dict[int, tuple[Any, list]] = {}
+        for _, entity, message in merged:
+            by_chat.setdefault(entity.id, (entity, []))[1].append(message)
+
+        for entity_id, (entity, _) in by_chat.items():
+            chat_results = [r for r in results if r["chat"].get("id") == entity_id]
+            if projection is None or "transcription" in projection:
+                await transcribe_voice_messages(
+                    chat_results, entity, wait=wait_for_transcription
+                )
+            if projection is None:
+                index_results(chat_results, entity)
+
+        if include_reply_parents:
+            await attach_reply_parents(
+                client,
+                results,
+                {entity_id: entity for entity_id, (entity, _) in by_chat.items()},
+            )
+            if build_projection is not projection:
+                keep = projection | {"reply_to"}
+                results = [project_message(r, keep) for r in results]
+
+        logger.info(
+            f"Found {len(results)} messages in {len(by_chat)} of {len(resolved)} chats"
+        )
+        response: dict[str, Any] = {
+            "messages": results,
+            "has_more": bool(next_offsets),
+            "cursor": encode_cursor(next_offsets) if next_offsets else None,
+        }
+        if unresolved:
+            response["unresolved_chats"] = unresolved
+        if include_total_count:
+            counts = await get_search_counters(list(resolved.values()), ("all",))
+            response["total_counts"] = {
+                str(entity_id): chat_counts["all"]
+                for entity_id, chat_counts in counts.items()
+                if chat_counts is not None
+            }
+        if not results and not next_offsets:
+            return log_and_build_error(
+                operation="search_messages_in_chats",
+                error_message=f"No messages found matching query '{query}' in {len(resolved)} chats",
+                params=params,
+                exception=ValueError("No messages found"),
+            )
+        return compact_response(response) if compact else response
+
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="search_messages_in_chats",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        return log_and_build_error(
+            operation="search_messages_in_chats",
+            error_message=f"Multi-chat search failed: {e!s}",
+            params=params,
+            exception=e,
+        )
+
+
+async def get_message_counts_impl(
+    chat_ids: list[str], filters: list[str] | None = None
+) -> dict[str, Any]:
+    """
+    Count messages in several chats for several filters at once.
+
+    Args:
+        chat_ids: Chats to count
+        filters: Counter names ('all', 'media', 'photos', 'videos', 'documents',
+            'voice', 'links', 'music'); defaults to ['all']
+
+    Returns:
+        Dictionary with per-chat counts and unresolved chat ids
+    """
+    filters = filters or ["all"]
+    params = {"chat_ids": chat_ids, "filters": filters}
+
+    if not chat_ids:
+        return log_and_build_error(
+            operation="get_message_counts",
+            error_message="chat_ids must contain at least one chat",
+            params=params,
+            exception=ValueError("chat_ids must contain at least one chat"),
+        )
+
+    try:
+        entities = await get_entities_by_ids(chat_ids)
+        resolved = [entity for entity in entities.values() if entity]
+        counts = await get_search_counters(resolved, filters)
+        response: dict[str, Any] = {
+            "chats": [
+                {"chat": build_entity_dict(entity), "counts": counts[entity.id]}
+                for entity in resolved
+            ]
+        }
+        unresolved = [chat_id for chat_id, entity in entities.items() if not entity]
+        if unresolved:
+            response["unresolved_chats"] = unresolved
+        return response
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="get_message_counts",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        return log_and_build_error(
+            operation="get_message_counts",
+            error_message=f"Failed to count messages: {e!s}",
+            params=params,
+            exception=e,
+        )
@@ -0,0 +1,315 @@
+"""
+Real-time new-message subscriptions.
+
+Registers a Telethon NewMessage handler on the session's client, buffers
+matching messages in a bounded per-session ring buffer and lets agents drain
+it with poll_updates(since_cursor) instead of re-running searches. Sessions
+that keep an MCP connection open are also pushed a logging notification for
+every buffered message.
+"""
+
+import logging
+import secrets
+from collections import deque
+from typing import Any
+
+from telethon import events
+from telethon import utils as telethon_utils
+
+from src.client.connection import (
+    SessionNotAuthorizedError,
+    _current_token,
+    get_connected_client,
+    get_request_session_key,
+    register_session_close_callback,
+    set_request_token,
+)
+from src.tools.links import message_link, message_link_prefix
+from src.utils.entity import (
+    ChatFilter,
+    build_entity_dict,
+    get_entity_by_id,
+)
+from src.utils.error_handling import log_and_build_error
+from src.utils.logging_utils import log_operation_start, log_operation_success
+from src.utils.message_format import build_message_result
+
+logger = logging.getLogger(__name__)
+
+# Buffered messages kept per session; the oldest are dropped first
+MAX_BUFFERED_UPDATES = 1000
+
+# Logger name used for MCP logging notifications about new messages
+NOTIFICATION_LOGGER = "telegram.updates"
+
+
+class SessionSubscriptions:
+    """Subscriptions, ring buffer and event handler of one session."""
+
+    def __init__(self, client, token: str | None, maxlen: int = MAX_BUFFERED_UPDATES):
+        self.client = client
+        self.token = token
+        self.subscriptions: dict[str, dict[str, Any]] = {}
+        self.buffer: deque[tuple[int, dict[str, Any]]] = deque(maxlen=maxlen)
+        self.last_cursor = 0
+        self.notify_sessions: set = set()
+        self._handler_registered = False
+
+    def matching_subscriptions(self, chat_id: int, chat, text: str) -> list[str]:
+        lowered = text.lower()
+        return [
+            sub_id
+            for sub_id, sub in self.subscriptions.items()
+            if (sub["chat_ids"] is None or chat_id in sub["chat_ids"])
+            and sub["chat_filter"].matches(chat)
+            and (not sub["terms"] or any(term in lowered for term in sub["terms"]))
+        ]
+
+    def append(self, result: dict[str, Any]) -> int:
+        self.last_cursor += 1
+        self.buffer.append((self.last_cursor, result))
+        return self.last_cursor
+
+    def drain(self, since_cursor: int, limit: int) -> tuple[list[dict[str, Any]], int]:
+        """Return up to `limit` messages after since_cursor, oldest first.
+
+        Walks the buffer from the newest end so the cost is proportional to
+        the number of new messages, not the buffer size.
+        """
+        newer: list[tuple[int, dict[str, Any]]] = []
+        for cursor, result in reversed(self.buffer):
+            if cursor <= since_cursor:
+                break
+            newer.append((cursor, result))
+        newer.reverse()
+        page = newer[:limit]
+        next_cursor = page[-1][0] if page else max(since_cursor, 0)
+        return [result for _, result in page], next_cursor
+
+    def oldest_cursor(self) -> int | None:
+        return self.buffer[0][0] if self.buffer else None
+
+    def ensure_handler(self) -> None:
+        if not self._handler_registered:
+            self.client.add_event_handler(self.on_new_message, events.NewMessage())
+            self._handler_registered = True
+
+    def remove_handler(self) -> None:
+        if self._handler_registered:
+            self.client.remove_event_handler(self.on_new_message, events.NewMessage)
+            self._handler_registered = False
+
+    async def on_new_message(self, event) -> None:
+        try:
+            chat = await event.get_chat()
+            chat_id = event.chat_id
+            if chat is None or chat_id is None:
+                return
+            sub_ids = self.matching_subscriptions(
+                chat_id, chat, event.message.message or ""
+            )
+            if not sub_ids:
+                return
+
+            # Handlers run outside any tool request: bind this session for lookups
+            set_request_token(self.token)
+            result = await build_message_result(
+                self.client,
+                event.message,
+                chat,
+                message_link(message_link_prefix(chat), event.message.id),
+            )
+            result["subscription_ids"] = sub_ids
+            cursor = self.append(result)
+            await self._notify(cursor, result)
+        except Exception as e:
+            logger.warning(f"Failed to buffer new message update: {e}")
+
+    async def _notify(self, cursor: int, result: dict[str, Any]) -> None:
+        for session in list(self.notify_sessions):
+            try:
+                await session.send_log_message(
+                    level="info",
+                    data={
+                        "event": "new_message",
+                        "cursor": cursor,
+                        "chat_id": (result.get("chat") or {}).get("id"),
+                        "message_id": result.get("id"),
+                        "subscription_ids": result.get("subscription_ids"),
+                    },
+                    logger=NOTIFICATION_LOGGER,
+                )
+            except Exception:
+                # Transport closed or does not support server-initiated messages
+                self.notify_sessions.discard(session)
+
+
+# Session cache key -> subscription state
+_session_subscriptions: dict[str, SessionSubscriptions] = {}
+
+
+def _get_mcp_session():
+    """Return the MCP session of the current request, if the transport has one."""
+    try:
+        from fastmcp.server.dependencies import get_context
+
+        return get_context().session
+    except Exception:
+        return None
+
+
+async def _get_session_state() -> SessionSubscriptions:
+    client = await get_connected_client()
+    key = get_request_session_key()
+    state = _session_subscriptions.get(key)
+    if state is None or state.client is not client:
+        if state is not None:
+            state.remove_handler()
+        state = SessionSubscriptions(client, _current_token.get(None))
+        _session_subscriptions[key] = state
+    return state
+
+
+async def subscribe_updates_impl(
+    chat_ids: list[str] | None = None,
+    query: str | None = None,
+    chat_type: str | None = None,
+) -> dict[str, Any]:
+    """
+    Start buffering new messages that match the given chats and filters.
+
+    Args:
+        chat_ids: Chats to watch (any chat when omitted)
+        query: Comma-separated terms; a message matches if it contains any of them
+        chat_type: Optional chat type filter ("private", "group", "channel")
+
+    Returns:
+        Dictionary with the subscription id, resolved chats and the current cursor
+    """
+    params = {"chat_ids": chat_ids, "query": query, "chat_type": chat_type}
+    log_operation_start("Subscribing to new messages", params)
+
+    try:
+        state = await _get_session_state()
+
+        resolved_ids = None
+        chats = []
+        if chat_ids:
+            resolved_ids = set()
+            for chat_id in chat_ids:
+                entity = await get_entity_by_id(chat_id)
+                if not entity:
+                    return log_and_build_error(
+                        operation="subscribe_updates",
+                        error_message=f"Cannot find chat with ID '{chat_id}'",
+                        params=params,
+                        exception=ValueError(f"Cannot find chat with ID '{chat_id}'"),
+                    )
+                resolved_ids.add(telethon_utils.get_peer_id(entity))
+                chats.append(build_entity_dict(entity))
+
+        terms = [t.strip().lower() for t in (query or "").split(",") if t.strip()]
+        subscription_id = secrets.token_hex(4)
+        state.subscriptions[subscription_id] = {
+            "chat_ids": resolved_ids,
+            "terms": terms,
+            "chat_filter": ChatFilter.compile(chat_type),
+        }
+        state.ensure_handler()
+
+        mcp_session = _get_mcp_session()
+        if mcp_session is not None:
+            state.notify_sessions.add(mcp_session)
+
+        log_operation_success(
+            f"Subscription {subscription_id} created",
+            ", ".join(chat_ids) if chat_ids else "all chats",
+        )
+        return {
+            "subscription_id": subscription_id,
+            "chats": chats,
+            "query": terms,
+            "chat_type": chat_type,
+            "cursor": state.last_cursor,
+            "active_subscriptions": len(state.subscriptions),
+        }
+
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="subscribe_updates",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        return log_and_build_error(
+            operation="subscribe_updates",
+            error_message=f"Failed to subscribe to updates: {e!s}",
+            params=params,
+            exception=e,
+        )
+
+
+async def unsubscribe_updates_impl(subscription_id: str) -> dict[str, Any]:
+    """Stop a subscription; the event handler is removed with the last one."""
+    params = {"subscription_id": subscription_id}
+    state = _session_subscriptions.get(get_request_session_key())
+    if state is None or subscription_id not in state.subscriptions:
+        return log_and_build_error(
+            operation="unsubscribe_updates",
+            error_message=f"Subscription '{subscription_id}' not found",
+            params=params,
+            exception=ValueError(f"Subscription '{subscription_id}' not found"),
+        )
+
+    del state.subscriptions[subscription_id]
+    if not state.subscriptions:
+        state.remove_handler()
+    return {
+        "subscription_id": subscription_id,
+        "unsubscribed": True,
+        "active_subscriptions": len(state.subscriptions),
+    }
+
+
+async def poll_updates_impl(
+    since_cursor: int | None = None, limit: int = 100
+) -> dict[str, Any]:
+    """
+    Drain buffered messages newer than since_cursor.
+
+    Args:
+        since_cursor: Cursor returned by the previous poll (all buffered when omitted)
+        limit: Maximum messages to return; pass the returned cursor to continue
+
+    Returns:
+        Dictionary with messages, next cursor, has_more and a count of
+        messages that fell out of the buffer since since_cursor
+    """
+    state = _session_subscriptions.get(get_request_session_key())
+    if state is None:
+        return {"messages": [], "cursor": since_cursor or 0, "has_more": False}
+
+    since = since_cursor or 0
+    messages, cursor = state.drain(since, limit)
+
+    response: dict[str, Any] = {
+        "messages": messages,
+        "cursor": cursor,
+        "has_more": cursor < state.last_cursor,
+        "active_subscriptions": len(state.subscriptions),
+    }
+    oldest = state.oldest_cursor()
+    if since_cursor is not None and oldest is not None and oldest > since + 1:
+        response["dropped"] = oldest - since - 1
+    return response
+
+
+def _drop_session_subscriptions(token: str) -> None:
+    state = _session_subscriptions.pop(token, None)
+    if state is not None:
+        state.remove_handler()
+
+
+register_session_close_callback(_drop_session_subscriptions)
@@ -0,0 +1,512 @@
+"""
+Local message store synchronization tools.
+
+Fills the per-session SQLite FTS5 store (see src.utils.message_store) from
+chat history so `source="local"` searches can be answered offline, and keeps
+it fresh incrementally with updates.getDifference / updates.getChannelDifference.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from telethon import utils as telethon_utils
+from telethon.tl import types
+from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.functions.updates import (
+    GetChannelDifferenceRequest,
+    GetDifferenceRequest,
+    GetStateRequest,
+)
+
+from src.client.connection import (
+    SessionNotAuthorizedError,
+    _session_cache,
+    get_connected_client,
+    register_session_close_callback,
+    register_session_reconnect_callback,
+    set_request_token,
+)
+from src.config.server_config import get_config
+from src.tools.links import message_link, message_link_prefix
+from src.utils.entity import (
+    build_entity_dict,
+    get_entity_by_id,
+)
+from src.utils.error_handling import log_and_build_error
+from src.utils.logging_utils import log_operation_start, log_operation_success
+from src.utils.message_format import (
+    _has_any_media,
+    build_message_result,
+    prefetch_forward_origins,
+)
+from src.utils.message_store import find_message_store, get_message_store
+
+logger = logging.getLogger(__name__)
+
+# Messages formatted and written per store transaction
+SYNC_BATCH_SIZE = 100
+
+# Upper bounds per sync run so one busy session cannot monopolize the loop
+MAX_DIFFERENCE_SLICES = 20
+MAX_CHANNEL_DIFFERENCE_PAGES = 10
+CHANNEL_DIFFERENCE_LIMIT = 100
+
+
+async def _index_batch(client, store, entity, messages: list) -> int:
+    """Format a batch of Telethon messages and write them to the store."""
+    if not messages:
+        return 0
+    link_prefix = message_link_prefix(entity)
+    forward_origins = await prefetch_forward_origins(messages)
+    results = [
+        await build_message_result(
+            client,
+            message,
+            entity,
+            message_link(link_prefix, message.id),
+            forward_origins=forward_origins,
+        )
+        for message in messages
+    ]
+    return store.index_messages(results, entity)
+
+
+async def _sync_gap(
+    client, store, entity, min_id: int, max_id: int | None, limit: int
+) -> tuple[int, int]:
+    """Fetch one unsynced id window newest first and record what it covered.
+
+    Returns:
+        (messages fetched from Telegram, messages written to the store)
+    """
+    fetched = 0
+    synced = 0
+    newest_id = None
+    oldest_id = None
+    batch: list = []
+    async for message in client.iter_messages(
+        entity, limit=limit, min_id=min_id, max_id=max_id or 0
+    ):
+        fetched += 1
+        if not message:
+            continue
+        newest_id = newest_id or message.id
+        oldest_id = message.id
+        has_content = getattr(message, "text", None) or _has_any_media(message)
+        if not has_content:
+            continue
+        batch.append(message)
+        if len(batch) >= SYNC_BATCH_SIZE:
+            synced += await _index_batch(client, store, entity, batch)
+            batch = []
+    synced += await _index_batch(client, store, entity, batch)
+
+    # A window read to its end is covered down to min_id; a window cut short by
+    # the limit only down to the oldest message fetched, leaving a smaller gap
+    exhausted = fetched < limit
+    low = min_id + 1 if exhausted else oldest_id
+    high = max_id - 1 if max_id else newest_id
+    if low is not None and high is not None and low <= high:
+        store.add_synced_range(entity.id, low, high)
+    return fetched, synced
+
+
+async def sync_chat_impl(
+    chat_id: str, limit: int = 1000, full: bool = False
+) -> dict[str, Any]:
+    """
+    Download chat history into the local message store.
+
+    The store records which id ranges of the chat were synced. Each call first
+    fetches messages newer than the newest synced range, then fills the holes
+    left by earlier calls that hit their limit, then continues backfilling older
+    history, so repeated calls converge on the full history without gaps.
+    Messages indexed passively from tool results do not count as synced.
+
+    Args:
+        chat_id: Target chat identifier ('me', numeric ID, username, or -100... form)
+        limit: Maximum number of messages to fetch in this call
+        full: Forget the synced ranges and re-fetch history from the newest message
+
+    Returns:
+        Dictionary with the chat, number of messages synced, the oldest synced
+        message id (backfill cursor), whether the history is complete and
+        store totals
+    """
+    params = {"chat_id": chat_id, "limit": limit, "full": full}
+    log_operation_start("Syncing chat into local store", params)
+
+    try:
+        client = await get_connected_client()
+        entity = await get_entity_by_id(chat_id)
+        if not entity:
+            return log_and_build_error(
+                operation="sync_chat",
+                error_message=f"Cannot find chat with ID '{chat_id}'",
+                params=params,
+                exception=ValueError(f"Cannot find chat with ID '{chat_id}'"),
+            )
+
+        store = get_message_store()
+        if chat_id == "me":
+            store.set_meta("self_id", entity.id)
+        await _track_chat_for_updates(client, store, entity)
+        if full:
+            store.clear_synced_ranges(entity.id)
+
+        synced = 0
+        left = limit
+        for min_id, max_id in store.get_sync_gaps(entity.id):
+            if left <= 0:
+                break
+            fetched, written = await _sync_gap(
+                client, store, entity, min_id, max_id, left
+            )
+            left -= fetched
+            synced += written
+
+        ranges = store.get_synced_ranges(entity.id)
+        log_operation_success(f"Synced {synced} messages into local store", chat_id)
+        return {
+            "chat": build_entity_dict(entity),
+            "synced": synced,
+            "newest_message_id": ranges[0][1] if ranges else None,
+            "oldest_synced_id": ranges[-1][0] if ranges else None,
+            "gaps": max(len(ranges) - 1, 0),
+            "history_complete": len(ranges) == 1 and ranges[0][0] <= 1,
+            "stored_messages": store.count_messages(entity.id),
+        }
+
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="sync_chat",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        return log_and_build_error(
+            operation="sync_chat",
+            error_message=f"Failed to sync chat '{chat_id}': {e!s}",
+            params=params,
+            exception=e,
+        )
+
+
+# ============================================================================
+# INCREMENTAL UPDATE SYNC
+# ============================================================================
+
+# Per-session sync bookkeeping: token -> stats of the last run
+_sync_stats: dict[str, dict[str, Any]] = {}
+_sync_locks: dict[str, asyncio.Lock] = {}
+
+
+async def _track_chat_for_updates(client, store, entity) -> None:
+    """Register a synced chat for incremental updates (channels need their pts)."""
+    peer_kind = (
+        "channel"
+        if isinstance(entity, types.Channel)
+        else "user"
+        if isinstance(entity, types.User)
+        else "chat"
+    )
+    pts = None
+    if peer_kind == "channel":
+        try:
+            full = await client(GetFullChannelRequest(channel=entity))
+            pts = getattr(full.full_chat, "pts", None)
+        except Exception as e:
+            logger.debug(f"Could not read pts for channel {entity.id}: {e}")
+    store.track_chat(entity.id, peer_kind, pts)
+
+
+async def _apply_messages(client, store, messages: list, entities: dict) -> int:
+    """Format raw difference messages per chat and upsert them into the store."""
+    by_peer: dict[int, list] = {}
+    for message in messages:
+        if not isinstance(message, types.Message):
+            continue  # MessageEmpty / MessageService carry nothing searchable
+        message._finish_init(client, entities, None)
+        if not (message.message or _has_any_media(message)):
+            continue
+        by_peer.setdefault(telethon_utils.get_peer_id(message.peer_id), []).append(
+            message
+        )
+
+    applied = 0
+    for peer_id, peer_messages in by_peer.items():
+        entity = entities.get(peer_id)
+        if entity is None:
+            continue
+        applied += await _index_batch(client, store, entity, peer_messages)
+    return applied
+
+
+async def _apply_other_updates(client, store, updates: list, entities: dict) -> dict:
+    """Apply edits and deletions carried in a difference's other_updates."""
+    changed: list = []
+    deleted = 0
+    for update in updates:
+        if isinstance(
+            update,
+            types.UpdateNewMessage
+            | types.UpdateNewChannelMessage
+            | types.UpdateEditMessage
+            | types.UpdateEditChannelMessage,
+        ):
+            changed.append(update.message)
+        elif isinstance(update, types.UpdateDeleteMessages):
+            deleted += store.delete_common_box_messages(update.messages)
+        elif isinstance(update, types.UpdateDeleteChannelMessages):
+            deleted += store.delete_messages(update.channel_id, update.messages)
+    applied = await _apply_messages(client, store, changed, entities)
+    return {"applied": applied, "deleted": deleted}
+
+
+def _entity_map(result) -> dict:
+    """Map marked peer ids to the users/chats included in a difference."""
+    return {
+        telethon_utils.get_peer_id(entity): entity
+        for entity in [*getattr(result, "users", []), *getattr(result, "chats", [])]
+    }
+
+
+async def _sync_common_box(client, store) -> dict[str, int]:
+    """Apply updates.getDifference for private chats and basic groups."""
+    totals = {"applied": 0, "deleted": 0, "backlog": 0}
+    state = store.get_meta("update_state")
+    if state is None:
+        # First run: start tracking from now; history comes from sync_chat
+        current = await client(GetStateRequest())
+        store.set_meta(
+            "update_state",
+            {"pts": current.pts, "qts": current.qts, "date": current.date.timestamp()},
+        )
+        return totals
+
+    for _ in range(MAX_DIFFERENCE_SLICES):
+        difference = await client(
+            GetDifferenceRequest(
+                pts=state["pts"],
+                date=int(state["date"]),
+                qts=state["qts"],
+            )
+        )
+
+        if isinstance(difference, types.updates.DifferenceEmpty):
+            state["date"] = difference.date.timestamp()
+            break
+
+        if isinstance(difference, types.updates.DifferenceTooLong):
+            # Gap too large to replay: jump ahead and report the skipped events
+            totals["backlog"] = max(difference.pts - state["pts"], 0)
+            state["pts"] = difference.pts
+            logger.warning(
+                f"updates.getDifference too long, skipped {totals['backlog']} events; re-run sync_chat to backfill"
+            )
+            break
+
+        entities = _entity_map(difference)
+        store.index_entities(list(entities.values()))
+        totals["applied"] += await _apply_messages(
+            client, store, difference.new_messages, entities
+        )
+        other = await _apply_other_updates(
+            client, store, difference.other_updates, entities
+        )
+        totals["applied"] += other["applied"]
+        totals["deleted"] += other["deleted"]
+
+        new_state = (
+            difference.intermediate_state
+            if isinstance(difference, types.updates.DifferenceSlice)
+            else difference.state
+        )
+        state = {
+            "pts": new_state.pts,
+            "qts": new_state.qts,
+            "date": new_state.date.timestamp(),
+        }
+        if isinstance(difference, types.updates.Difference):
+            break
+    else:
+        # Slices remain after the per-run bound; the next pass continues from
+        # state, so report the events still pending on the server
+        current = await client(GetStateRequest())
+        totals["backlog"] = max(current.pts - state["pts"], 0)
+
+    store.set_meta("update_state", state)
+    store.mark_common_box_synced(totals["backlog"])
+    return totals
+
+
+async def _sync_channel(client, store, chat: dict[str, Any]) -> dict[str, int]:
+    """Apply updates.getChannelDifference for one tracked channel."""
+    totals = {"applied": 0, "deleted": 0, "backlog": 0}
+    pts = chat["pts"]
+    input_channel = await client.get_input_entity(types.PeerChannel(chat["chat_id"]))
+
+    for _ in range(MAX_CHANNEL_DIFFERENCE_PAGES):
+        difference = await client(
+            GetChannelDifferenceRequest(
+                channel=input_channel,
+                filter=types.ChannelMessagesFilterEmpty(),
+                pts=pts,
+                limit=CHANNEL_DIFFERENCE_LIMIT,
+            )
+        )
+
+        if isinstance(difference, types.updates.ChannelDifferenceEmpty):
+            pts = difference.pts
+            break
+
+        entities = _entity_map(difference)
+        store.index_entities(list(entities.values()))
+
+        if isinstance(difference, types.updates.ChannelDifferenceTooLong):
+            # Server returns only the latest messages; older gap needs sync_chat
+            dialog_pts = getattr(difference.dialog, "pts", None) or pts
+            totals["backlog"] = max(dialog_pts - pts, 0)
+            totals["applied"] += await _apply_messages(
+                client, store, difference.messages, entities
+            )
+            pts = dialog_pts
+            break
+
+        totals["applied"] += await _apply_messages(
+            client, store, difference.new_messages, entities
+        )
+        other = await _apply_other_updates(
+            client, store, difference.other_updates, entities
+        )
+        totals["applied"] += other["applied"]
+        totals["deleted"] += other["deleted"]
+        pts = difference.pts
+        if difference.final:
+            break
+    else:
+        # Pages remain after the per-run bound; report the events still pending
+        full = await client(GetFullChannelRequest(channel=input_channel))
+        channel_pts = getattr(full.full_chat, "pts", None) or pts
+        totals["backlog"] = max(channel_pts - pts, 0)
+
+    store.update_tracked_chat(chat["chat_id"], pts=pts, backlog=totals["backlog"])
+    return totals
+
+
+async def sync_session_updates(token: str, client) -> dict[str, Any]:
+    """Run one incremental sync pass for a warm session.
+
+    Applies new, edited and deleted messages since the persisted pts/qts/date
+    state to the session's local store. Concurrent passes for the same session
+    are skipped rather than queued, and sessions without a store are left
+    alone (no store file is created and no request is made).
+    """
+    store = find_message_store(token)
+    if store is None:
+        return {}
+    lock = _sync_locks.setdefault(token, asyncio.Lock())
+    if lock.locked():
+        return _sync_stats.get(token, {})
+
+    async with lock:
+        # Formatting resolves senders through get_connected_client(); bind the session
+        set_request_token(token)
+        started = time.time()
+        stats: dict[str, Any] = {
+            "last_run_at": started,
+            "applied": 0,
+            "deleted": 0,
+            "errors": [],
+        }
+        try:
+            totals = await _sync_common_box(client, store)
+            stats["applied"] += totals["applied"]
+            stats["deleted"] += totals["deleted"]
+        except Exception as e:
+            logger.warning(f"updates.getDifference failed for {token[:8]}...: {e}")
+            stats["errors"].append(f"getDifference: {e}")
+
+        for chat in store.get_tracked_chats():
+            if chat["peer_kind"] != "channel" or chat["pts"] is None:
+                continue
+            try:
+                totals = await _sync_channel(client, store, chat)
+                stats["applied"] += totals["applied"]
+                stats["deleted"] += totals["deleted"]
+            except Exception as e:
+                logger.warning(
+                    f"updates.getChannelDifference failed for {chat['chat_id']}: {e}"
+                )
+                stats["errors"].append(f"channel {chat['chat_id']}: {e}")
+
+        stats["duration_seconds"] = round(time.time() - started, 3)
+        _sync_stats[token] = stats
+        if stats["applied"] or stats["deleted"]:
+            logger.info(
+                f"Incremental sync for {token[:8]}...: {stats['applied']} applied, {stats['deleted']} deleted"
+            )
+        return stats
+
+
+async def sync_warm_sessions() -> None:
+    """Run an incremental sync pass for every cached (warm) session."""
+    for token, (client, _) in list(_session_cache.items()):
+        if not client.is_connected():
+            continue
+        await sync_session_updates(token, client)
+
+
+def get_sync_status() -> dict[str, Any]:
+    """Freshness report per warm session: last run, lag and backlog per tracked chat."""
+    now = time.time()
+    report: dict[str, Any] = {}
+    for token in list(_session_cache):
+        try:
+            store = find_message_store(token)
+            if store is None:
+                continue  # Session never used the local store
+            tracked = store.get_tracked_chats()
+        except Exception as e:
+            report[token[:8] + "..."] = {"error": str(e)}
+            continue
+        last_run = _sync_stats.get(token, {})
+        report[token[:8] + "..."] = {
+            "last_run_at": last_run.get("last_run_at"),
+            "last_applied": last_run.get("applied"),
+            "last_errors": last_run.get("errors"),
+            "chats": [
+                {
+                    "chat_id": chat["chat_id"],
+                    "title": chat["title"],
+                    "lag_seconds": round(now - chat["last_synced_at"], 1)
+                    if chat["last_synced_at"]
+                    else None,
+                    "newest_message_age_seconds": round(now - chat["newest_date"], 1)
+                    if chat["newest_date"]
+                    else None,
+                    "backlog": chat["backlog"],
+                }
+                for chat in tracked
+            ],
+        }
+    return report
+
+
+def _sync_on_reconnect(token: str, client) -> None:
+    """Catch up on updates missed while the connection was down."""
+    if get_config().local_store_enabled:
+        asyncio.get_running_loop().create_task(sync_session_updates(token, client))
+
+
+def _forget_sync_state(token: str) -> None:
+    _sync_stats.pop(token, None)
+    _sync_locks.pop(token, None)
+
+
+register_session_reconnect_callback(_sync_on_reconnect)
+register_session_close_callback(_forget_sync_state)
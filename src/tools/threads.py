@@ -0,0 +1,344 @@
+"""
+Comment thread and forum topic retrieval.
+
+A channel post's comments live in the linked discussion group under a copy of
+the post; messages.getDiscussionMessage finds that root, and messages.getReplies
+pages through the replies below it (forum topics and reply threads of groups
+work the same way, with the topic or message id as the root). Replies are read
+oldest first in pages of up to 100, each page formatted as soon as it arrives:
+commenters come with the page, forward sources are resolved once per page and
+links are built without awaits, so a long thread never sits in memory as raw
+Telethon messages.
+"""
+
+import logging
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+from typing import Any
+
+from telethon import utils as telethon_utils
+from telethon.errors import RPCError
+from telethon.tl.functions.messages import (
+    GetDiscussionMessageRequest,
+    GetRepliesRequest,
+)
+from telethon.tl.types import MessageEmpty
+
+from src.client.connection import SessionNotAuthorizedError, get_connected_client
+from src.tools.links import message_link, message_link_prefix
+from src.utils.entity import build_entity_dict, get_entity_by_id
+from src.utils.error_handling import log_and_build_error
+from src.utils.logging_utils import log_operation_start, log_operation_success
+from src.utils.message_format import (
+    build_message_result,
+    compact_messages,
+    normalize_fields,
+    prefetch_forward_origins,
+    project_message,
+    transcribe_voice_messages,
+)
+from src.utils.message_store import index_results
+
+logger = logging.getLogger(__name__)
+
+# messages.getReplies returns at most 100 messages per call
+REPLIES_PAGE_SIZE = 100
+
+# Most replies returned by one tool call; continue with after_id
+MAX_THREAD_REPLIES = 1000
+
+
+def _response_entities(result) -> dict[int, Any]:
+    return {telethon_utils.get_peer_id(x): x for x in [*result.users, *result.chats]}
+
+
+async def resolve_thread(client, entity, message_id: int):
+    """
+    Find the chat and root message holding the replies to a message.
+
+    Returns:
+        (chat entity, root message id, root message or None). For channel
+        posts the chat is the linked discussion group; forum topics and group
+        threads stay in their own chat.
+    """
+    try:
+        discussion = await client(
+            GetDiscussionMessageRequest(peer=entity, msg_id=message_id)
+        )
+    except RPCError as e:
+        # Forum topics are addressed by their id directly
+        logger.debug(f"No discussion message for {message_id}: {e}")
+        return entity, message_id, None
+
+    roots = [m for m in discussion.messages if not isinstance(m, MessageEmpty)]
+    if not roots:
+        return entity, message_id, None
+    # Albums are copied as several messages; the thread hangs on the first
+    root = min(roots, key=lambda m: m.id)
+    entities = _response_entities(discussion)
+    chat = entities.get(telethon_utils.get_peer_id(root.peer_id), entity)
+    root._finish_init(client, entities, chat)
+    return chat, root.id, root
+
+
+async def iter_reply_pages(
+    client, chat, root_id: int, after_id: int = 0, limit: int | None = None
+) -> AsyncIterator[tuple[list, int | None]]:
+    """
+    Yield (messages, total replies) pages of a thread, oldest first.
+
+    Each messages.getReplies call asks for the page_size replies newer than
+    after_id (offset_id = after_id + 1 with add_offset = -page_size, the way
+    Telethon walks history in reverse).
+    """
+    offset_id = after_id + 1
+    left = limit
+    while left is None or left > 0:
+        page_size = REPLIES_PAGE_SIZE if left is None else min(left, REPLIES_PAGE_SIZE)
+        result = await client(
+            GetRepliesRequest(
+                peer=chat,
+                msg_id=root_id,
+                offset_id=offset_id,
+                offset_date=None,
+                add_offset=-page_size,
+                limit=page_size,
+                max_id=0,
+                min_id=0,
+                hash=0,
+            )
+        )
+        entities = _response_entities(result)
+        page = []
+        for message in reversed(result.messages):
+            if isinstance(message, MessageEmpty) or message.id < offset_id:
+                continue
+            message._finish_init(client, entities, chat)
+            page.append(message)
+        if not page:
+            return
+        yield page, getattr(result, "count", None)
+        offset_id = page[-1].id + 1
+        if left is not None:
+            left -= len(page)
+        if len(result.messages) < page_size:
+            return
+
+
+def thread_reply_links(
+    entity, chat, message_id: int, root_id: int, root
+) -> Callable[[int], str | None]:
+    """
+    Return the link formatter for replies of a thread, in t.me's documented forms.
+
+    Channel post comments open under the post (<channel>/<post>?comment=<id>),
+    forum topic messages inside the topic (<group>/<topic>/<id>) and other
+    group replies in their thread (<group>/<id>?thread=<root>).
+    """
+    if root is not None and getattr(chat, "id", None) != getattr(entity, "id", None):
+        post_prefix = message_link_prefix(entity)
+        return lambda reply_id: message_link(
+            post_prefix, message_id, comment_id=reply_id
+        )
+    prefix = message_link_prefix(chat)
+    if getattr(chat, "forum", False):
+        return lambda reply_id: message_link(prefix, reply_id, topic_id=root_id)
+    return lambda reply_id: message_link(prefix, reply_id, thread_id=root_id)
+
+
+async def _format_reply_page(
+    client,
+    chat,
+    page: list,
+    reply_link: Callable[[int], str | None],
+    projection: frozenset[str] | None,
+    build_projection: frozenset[str] | None,
+    parent_ids: dict[int, int | None],
+) -> list[dict[str, Any]]:
+    """Build, transcribe and index one page of replies, noting their parents."""
+    forward_origins = await prefetch_forward_origins(page, build_projection)
+    page_results = [
+        await build_message_result(
+            client,
+            message,
+            chat,
+            reply_link(message.id),
+            fields=build_projection,
+            forward_origins=forward_origins,
+        )
+        for message in page
+    ]
+    if projection is None or "transcription" in projection:
+        await transcribe_voice_messages(page_results, chat)
+    if projection is None:
+        index_results(page_results, chat)
+    for result in page_results:
+        parent_ids[result["id"]] = result.get("reply_to_msg_id")
+    if build_projection is not projection:
+        page_results = [project_message(r, projection) for r in page_results]
+    return page_results
+
+
+def build_reply_tree(
+    results: list[dict[str, Any]], parent_ids: dict[int, int | None]
+) -> list[dict[str, Any]]:
+    """
+    Nest replies under the replies they answer, in a 'replies' list.
+
+    parent_ids maps result ids to reply_to_msg_id. Replies to the thread root,
+    or to messages outside the results, stay at the top level.
+    """
+    nodes = {result["id"]: result for result in results}
+    tree = []
+    for result in results:
+        parent = nodes.get(parent_ids.get(result["id"]))
+        if parent is not None and parent is not result:
+            parent.setdefault("replies", []).append(result)
+        else:
+            tree.append(result)
+    return tree
+
+
+async def get_thread_replies_impl(
+    chat_id: str,
+    message_id: int,
+    limit: int = 100,
+    after_id: int = 0,
+    tree: bool = False,
+    fields: list[str] | str | None = None,
+    compact: bool = False,
+) -> dict[str, Any]:
+    """
+    Read the replies to a channel post, forum topic or group message.
+
+    Args:
+        chat_id: Chat of the message (the channel for post comments)
+        message_id: Channel post, forum topic id or message with replies
+        limit: Maximum number of replies to return (up to MAX_THREAD_REPLIES)
+        after_id: Return replies newer than this id (next_after_id of a previous call)
+        tree: Nest replies under the replies they answer instead of a flat list
+        fields: Optional projection of message keys; others are not computed
+        compact: Reference chats and senders by id from a top-level 'entities' map
+
+    Returns:
+        Dictionary with the discussion chat, the root message, replies oldest
+        first ('messages', or 'tree' when tree=True), total_count, has_more and
+        next_after_id
+    """
+    params = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "limit": limit,
+        "after_id": after_id,
+        "tree": tree,
+        "fields": fields,
+        "compact": compact,
+    }
+    log_operation_start("Reading thread replies", params)
+
+    try:
+        if not 1 <= limit <= MAX_THREAD_REPLIES:
+            raise ValueError(f"limit must be between 1 and {MAX_THREAD_REPLIES}")
+        projection = normalize_fields(fields)
+    except ValueError as e:
+        return log_and_build_error(
+            operation="get_thread_replies",
+            error_message=str(e),
+            params=params,
+            exception=e,
+        )
+    # The tree is built from reply_to_msg_id
+    build_projection = (
+        projection | {"reply_to_msg_id"}
+        if tree and projection is not None
+        else projection
+    )
+
+    try:
+        client = await get_connected_client()
+        entity = await get_entity_by_id(chat_id)
+        if not entity:
+            raise ValueError(f"Cannot find any entity corresponding to '{chat_id}'")
+
+        chat, root_id, root = await resolve_thread(client, entity, message_id)
+        reply_link = thread_reply_links(entity, chat, message_id, root_id, root)
+
+        root_result = None
+        if root is not None:
+            root_result = await build_message_result(
+                client,
+                root,
+                chat,
+                message_link(message_link_prefix(chat), root.id),
+                fields=projection,
+            )
+
+        results: list[dict[str, Any]] = []
+        parent_ids: dict[int, int | None] = {}
+        total_count = None
+        has_more = False
+        # One reply past the limit tells whether the thread goes on; total_count
+        # cannot, since it also counts the replies before after_id
+        pages = iter_reply_pages(
+            client, chat, root_id, after_id=after_id, limit=limit + 1
+        )
+        async with aclosing(pages):
+            async for page, count in pages:
+                total_count = count
+                if len(results) + len(page) > limit:
+                    page = page[: limit - len(results)]
+                    has_more = True
+                if page:
+                    results.extend(
+                        await _format_reply_page(
+                            client,
+                            chat,
+                            page,
+                            reply_link,
+                            projection,
+                            build_projection,
+                            parent_ids,
+                        )
+                    )
+                if has_more:
+                    break
+
+        response: dict[str, Any] = {
+            "chat": build_entity_dict(chat),
+            "root_id": root_id,
+            "root": root_result,
+            "total_count": total_count,
+            "has_more": has_more,
+            "next_after_id": results[-1]["id"] if results else after_id,
+        }
+        if compact:
+            head = [root_result] if root_result is not None else []
+            compacted, response["entities"] = compact_messages(head + results)
+            if root_result is not None:
+                response["root"], compacted = compacted[0], compacted[1:]
+            results = compacted
+        if tree:
+            response["tree"] = build_reply_tree(results, parent_ids)
+        else:
+            response["messages"] = results
+
+        log_operation_success(
+            f"Retrieved {len(results)} replies to {message_id}", chat_id
+        )
+        return response
+
+    except SessionNotAuthorizedError as e:
+        return log_and_build_error(
+            operation="get_thread_replies",
+            error_message="Session not authorized. Please authenticate your Telegram session first.",
+            params=params,
+            exception=e,
+            action="authenticate_session",
+        )
+    except Exception as e:
+        return log_and_build_error(
+            operation="get_thread_replies",
+            error_message=f"Failed to read thread replies: {e!s}",
+            params=params,
+            exception=e,
+        )
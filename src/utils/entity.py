@@ -1,11 +1,32 @@
+import asyncio
 import logging
+import time
+from dataclasses import dataclass
 
+from telethon import utils as telethon_utils
 from telethon.tl.functions.channels import GetFullChannelRequest
 from telethon.tl.functions.messages import GetFullChatRequest, GetSearchCountersRequest
 from telethon.tl.functions.users import GetFullUserRequest
-from telethon.tl.types import InputMessagesFilterEmpty, PeerChannel, PeerChat, PeerUser
-
-from ..client.connection import get_connected_client
+from telethon.tl.types import (
+    InputMessagesFilterDocument,
+    InputMessagesFilterEmpty,
+    InputMessagesFilterMusic,
+    InputMessagesFilterPhotos,
+    InputMessagesFilterPhotoVideo,
+    InputMessagesFilterUrl,
+    InputMessagesFilterVideo,
+    InputMessagesFilterVoice,
+    PeerChannel,
+    PeerChat,
+    PeerUser,
+)
+
+from ..client.connection import (
+    get_connected_client,
+    get_request_session_key,
+    register_session_close_callback,
+)
+from ..client.profile import get_account_profile
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +68,7 @@ async def get_entity_by_id(entity_id):
     try:
         # Special handling for 'me' identifier (Saved Messages)
         if entity_id == "me":
-            return await client.get_me()
+            return (await get_account_profile(client)).me
 
         # Try to convert entity_id to an integer if it's a numeric string
         try:
@@ -93,6 +114,47 @@ async def get_entity_by_id(entity_id):
         return None
 
 
+async def get_entities_by_ids(entity_ids: list) -> dict:
+    """
+    Resolve many identifiers at once.
+
+    Telethon batches list lookups into one users.getUsers / channels.getChannels /
+    messages.getChats call per peer kind. If the batch fails (one unknown id
+    fails the whole call), identifiers are resolved one by one with the
+    get_entity_by_id fallbacks.
+
+    Returns:
+        Mapping of each original identifier to its entity (None when unresolved)
+    """
+    client = await get_connected_client()
+    resolved: dict = {}
+    pending = []
+    for entity_id in dict.fromkeys(entity_ids):
+        if entity_id == "me":
+            resolved[entity_id] = await get_entity_by_id("me")
+            continue
+        try:
+            pending.append((entity_id, int(entity_id)))
+        except (ValueError, TypeError):
+            pending.append((entity_id, entity_id))
+
+    if pending:
+        try:
+            entities = await client.get_entity([peer for _, peer in pending])
+            resolved.update(
+                zip((entity_id for entity_id, _ in pending), entities, strict=True)
+            )
+        except Exception as e:
+            logger.debug(f"Batch entity lookup failed, resolving one by one: {e}")
+            results = await asyncio.gather(
+                *(get_entity_by_id(entity_id) for entity_id, _ in pending)
+            )
+            resolved.update(
+                zip((entity_id for entity_id, _ in pending), results, strict=True)
+            )
+    return resolved
+
+
 def get_normalized_chat_type(entity) -> str | None:
     """Return normalized chat type: 'private', 'group', or 'channel'."""
     if not entity:
@@ -195,12 +257,95 @@ def build_entity_dict(entity) -> dict:
     return compact
 
 
-async def _extract_forward_info(message) -> dict:
+_PEER_ID_ATTRIBUTES = (
+    ("user_id", "User"),
+    ("channel_id", "Channel"),
+    ("chat_id", "Chat"),
+)
+
+
+def _forward_peer(peer) -> tuple[int | None, int | str | None, str]:
+    """Return (marked id, bare id, kind) of a forward origin peer."""
+    for attribute, kind in _PEER_ID_ATTRIBUTES:
+        bare_id = getattr(peer, attribute, None)
+        if bare_id is not None:
+            try:
+                return telethon_utils.get_peer_id(peer), bare_id, kind
+            except Exception:
+                return None, bare_id, kind
+    return None, str(peer), "Unknown"
+
+
+def _forward_fallback(entity_id: int | str | None, kind: str, title: str | None = None):
+    """Basic origin record for peers that could not be resolved (or are hidden)."""
+    return {
+        "id": entity_id,
+        "title": title,
+        "type": kind,
+        "username": None,
+        "first_name": None,
+        "last_name": None,
+    }
+
+
+def _forward_origin_peers(message) -> list:
+    forward = getattr(message, "forward", None)
+    if not forward:
+        return []
+    return [
+        peer
+        for peer in (
+            getattr(forward, "from_id", None),
+            getattr(forward, "saved_from_peer", None),
+        )
+        if peer
+    ]
+
+
+async def resolve_forward_origins(messages, origins: dict | None = None) -> dict:
+    """
+    Resolve the forward origins of many messages with one batched lookup.
+
+    A page forwarded from one source resolves that source once. Origins already
+    present in origins are not looked up again, so one dict can be threaded
+    through a stream of messages.
+
+    Returns:
+        origins, updated with marked peer id -> entity (None when unresolved)
+    """
+    if origins is None:
+        origins = {}
+    pending: dict[int, None] = {}
+    for message in messages:
+        for peer in _forward_origin_peers(message):
+            peer_id, _, _ = _forward_peer(peer)
+            if peer_id is not None and peer_id not in origins:
+                pending[peer_id] = None
+    if pending:
+        try:
+            origins.update(await get_entities_by_ids(list(pending)))
+        except Exception as e:
+            logger.warning(f"Failed to resolve forward origins: {e}")
+            origins.update(dict.fromkeys(pending))
+    return origins
+
+
+def _forward_origin(peer, origins: dict) -> dict:
+    peer_id, bare_id, kind = _forward_peer(peer)
+    entity = origins.get(peer_id) if peer_id is not None else None
+    if entity:
+        return build_entity_dict(entity)
+    return _forward_fallback(bare_id, kind)
+
+
+async def _extract_forward_info(message, origins: dict | None = None) -> dict:
     """
     Extract forward information from a Telegram message in minimal format.
 
     Args:
         message: Telegram message object
+        origins: Entities from resolve_forward_origins; origins missing from it
+            are resolved (and added) here
 
     Returns:
         dict: Forward information dictionary containing:
@@ -225,119 +370,22 @@ async def _extract_forward_info(message) -> dict:
         except Exception:
             original_date = str(forward_date)
 
-    # Extract original sender information with full entity resolution
+    origins = await resolve_forward_origins([message], origins)
+
     sender = None
     from_id = getattr(forward, "from_id", None)
     if from_id:
-        # Extract user ID from PeerUser or other peer types
-        sender_id = None
-        if hasattr(from_id, "user_id"):
-            sender_id = from_id.user_id
-        elif hasattr(from_id, "channel_id"):
-            sender_id = from_id.channel_id
-        elif hasattr(from_id, "chat_id"):
-            sender_id = from_id.chat_id
-        else:
-            sender_id = str(from_id)
-
-        # Try to resolve the full entity information
-        if sender_id:
-            try:
-                sender_entity = await get_entity_by_id(sender_id)
-                if sender_entity:
-                    sender = build_entity_dict(sender_entity)
-                else:
-                    # Fallback to basic info if entity resolution fails
-                    sender = {
-                        "id": sender_id,
-                        "title": None,
-                        "type": "User"
-                        if hasattr(from_id, "user_id")
-                        else "Channel"
-                        if hasattr(from_id, "channel_id")
-                        else "Chat"
-                        if hasattr(from_id, "chat_id")
-                        else "Unknown",
-                        "username": None,
-                        "first_name": None,
-                        "last_name": None,
-                    }
-            except Exception as e:
-                logger.warning(
-                    f"Failed to resolve forwarded sender entity {sender_id}: {e}"
-                )
-                # Fallback to basic info
-                sender = {
-                    "id": sender_id,
-                    "title": None,
-                    "type": "User"
-                    if hasattr(from_id, "user_id")
-                    else "Channel"
-                    if hasattr(from_id, "channel_id")
-                    else "Chat"
-                    if hasattr(from_id, "chat_id")
-                    else "Unknown",
-                    "username": None,
-                    "first_name": None,
-                    "last_name": None,
-                }
-
-    # Extract source chat information with full entity resolution
+        sender = _forward_origin(from_id, origins)
+    else:
+        # Sender hid their account: Telegram sends only the display name
+        from_name = getattr(forward, "from_name", None)
+        if from_name:
+            sender = _forward_fallback(None, "User", from_name)
+
     chat = None
     saved_from_peer = getattr(forward, "saved_from_peer", None)
     if saved_from_peer:
-        # Extract chat ID from peer types
-        chat_id = None
-        if hasattr(saved_from_peer, "user_id"):
-            chat_id = saved_from_peer.user_id
-        elif hasattr(saved_from_peer, "channel_id"):
-            chat_id = saved_from_peer.channel_id
-        elif hasattr(saved_from_peer, "chat_id"):
-            chat_id = saved_from_peer.chat_id
-        else:
-            chat_id = str(saved_from_peer)
-
-        # Try to resolve the full entity information
-        if chat_id:
-            try:
-                chat_entity = await get_entity_by_id(chat_id)
-                if chat_entity:
-                    chat = build_entity_dict(chat_entity)
-                else:
-                    # Fallback to basic info if entity resolution fails
-                    chat = {
-                        "id": chat_id,
-                        "title": None,
-                        "type": "User"
-                        if hasattr(saved_from_peer, "user_id")
-                        else "Channel"
-                        if hasattr(saved_from_peer, "channel_id")
-                        else "Chat"
-                        if hasattr(saved_from_peer, "chat_id")
-                        else "Unknown",
-                        "username": None,
-                        "first_name": None,
-                        "last_name": None,
-                    }
-            except Exception as e:
-                logger.warning(
-                    f"Failed to resolve forwarded chat entity {chat_id}: {e}"
-                )
-                # Fallback to basic info
-                chat = {
-                    "id": chat_id,
-                    "title": None,
-                    "type": "User"
-                    if hasattr(saved_from_peer, "user_id")
-                    else "Channel"
-                    if hasattr(saved_from_peer, "channel_id")
-                    else "Chat"
-                    if hasattr(saved_from_peer, "chat_id")
-                    else "Unknown",
-                    "username": None,
-                    "first_name": None,
-                    "last_name": None,
-                }
+        chat = _forward_origin(saved_from_peer, origins)
 
     return {"sender": sender, "date": original_date, "chat": chat}
 
@@ -364,53 +412,175 @@ def compute_entity_identifier(entity) -> str:
     return entity_id_str
 
 
-async def _get_chat_message_count(chat_id: str) -> int | None:
+# Counter names accepted by get_search_counters -> messages.getSearchCounters filter
+COUNTER_FILTERS = {
+    "all": InputMessagesFilterEmpty,
+    "media": InputMessagesFilterPhotoVideo,
+    "photos": InputMessagesFilterPhotos,
+    "videos": InputMessagesFilterVideo,
+    "documents": InputMessagesFilterDocument,
+    "voice": InputMessagesFilterVoice,
+    "links": InputMessagesFilterUrl,
+    "music": InputMessagesFilterMusic,
+}
+
+# Counters change slowly; a short TTL absorbs repeated paging/total_count calls
+SEARCH_COUNTERS_TTL_SECONDS = 30
+_search_counters_cache: dict[tuple[str, int, str], tuple[float, int]] = {}
+
+
+async def get_search_counters(
+    entities: list, filters: list[str] | tuple[str, ...] = ("all",)
+) -> dict[int, dict[str, int] | None]:
+    """
+    Count messages per chat for several filters at once.
+
+    Issues one messages.getSearchCounters request per chat carrying all
+    requested filters, concurrently across chats. Counts are cached per session
+    for SEARCH_COUNTERS_TTL_SECONDS; only missing ones are requested.
+
+    Args:
+        entities: Resolved chat entities (no re-resolution happens here)
+        filters: Counter names from COUNTER_FILTERS
+
+    Returns:
+        Mapping of entity id to {filter name: count}, or None when the request failed
+
+    Raises:
+        ValueError: If a filter name is unknown
+    """
+    unknown = [name for name in filters if name not in COUNTER_FILTERS]
+    if unknown:
+        raise ValueError(
+            f"Unknown counter filter(s) {', '.join(unknown)}. Use: {', '.join(COUNTER_FILTERS)}"
+        )
+
+    client = await get_connected_client()
+    session_key = get_request_session_key()
+    now = time.time()
+
+    async def count_chat(entity) -> dict[str, int] | None:
+        counts: dict[str, int] = {}
+        missing = []
+        for name in filters:
+            cached = _search_counters_cache.get((session_key, entity.id, name))
+            if cached and now - cached[0] < SEARCH_COUNTERS_TTL_SECONDS:
+                counts[name] = cached[1]
+            else:
+                missing.append(name)
+        if not missing:
+            return counts
+
+        try:
+            result = await client(
+                GetSearchCountersRequest(
+                    peer=entity, filters=[COUNTER_FILTERS[name]() for name in missing]
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Error getting search counters for chat {entity.id}: {e!s}")
+            return None
+
+        by_filter = {
+            type(counter.filter): counter.count
+            for counter in getattr(result, "counters", None) or []
+        }
+        for name in missing:
+            counts[name] = by_filter.get(COUNTER_FILTERS[name], 0)
+            _search_counters_cache[(session_key, entity.id, name)] = (now, counts[name])
+        return counts
+
+    results = await asyncio.gather(*(count_chat(entity) for entity in entities))
+    return {entity.id: counts for entity, counts in zip(entities, results, strict=True)}
+
+
+def clear_search_counters_cache(session_key: str) -> None:
+    for key in [k for k in _search_counters_cache if k[0] == session_key]:
+        del _search_counters_cache[key]
+
+
+register_session_close_callback(clear_search_counters_cache)
+
+
+async def _get_chat_message_count(chat_id: str, entity=None) -> int | None:
     """
     Get total message count for a specific chat.
+
+    Pass the already resolved entity to avoid resolving chat_id again.
     """
     try:
-        client = await get_connected_client()
-        entity = await get_entity_by_id(chat_id)
+        if entity is None:
+            entity = await get_entity_by_id(chat_id)
         if not entity:
             return None
 
-        result = await client(
-            GetSearchCountersRequest(peer=entity, filters=[InputMessagesFilterEmpty()])
-        )
-
-        if hasattr(result, "counters") and result.counters:
-            for counter in result.counters:
-                if hasattr(counter, "filter") and isinstance(
-                    counter.filter, InputMessagesFilterEmpty
-                ):
-                    return getattr(counter, "count", 0)
-
-        return 0
+        counts = (await get_search_counters([entity], ("all",)))[entity.id]
+        return counts["all"] if counts is not None else None
 
     except Exception as e:
         logger.warning(f"Error getting search count for chat {chat_id}: {e!s}")
         return None
 
 
-def _matches_chat_type(entity, chat_type: str) -> bool:
-    """Check if entity matches the specified chat type filter.
+VALID_CHAT_TYPES = frozenset({"private", "group", "channel"})
 
-    Supports comma-separated values (e.g., "private,group").
-    Whitespace is trimmed, case-insensitive, empty values are ignored.
+
+@dataclass(frozen=True, slots=True)
+class ChatFilter:
+    """Chat-level search filters, parsed once per request.
+
+    Both criteria depend only on the chat, so callers evaluate matches() once
+    per chat (and can skip a chat before fetching any of its messages) rather
+    than once per message.
     """
-    if not chat_type:
-        return True
 
-    # Split by comma, strip whitespace, filter out empty strings, convert to lowercase
-    chat_types = [ct.strip().lower() for ct in chat_type.split(",") if ct.strip()]
+    chat_types: frozenset[str] | None = None
+    public: bool | None = None
+    invalid: bool = False
+
+    @classmethod
+    def compile(cls, chat_type: str | None = None, public: bool | None = None):
+        """Parse a comma-separated chat_type ("private,group") and public flag.
+
+        Whitespace is trimmed and matching is case-insensitive. Unknown types
+        make the filter match nothing.
+        """
+        if not chat_type:
+            return cls(public=public)
+        chat_types = frozenset(
+            ct.strip().lower() for ct in chat_type.split(",") if ct.strip()
+        )
+        return cls(
+            chat_types=chat_types,
+            public=public,
+            invalid=not chat_types or not chat_types <= VALID_CHAT_TYPES,
+        )
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.invalid and self.chat_types is None and self.public is None
 
-    # Validate that all specified types are valid
-    valid_types = {"private", "group", "channel"}
-    if not all(ct in valid_types for ct in chat_types):
-        return False
+    def matches(self, entity) -> bool:
+        if self.invalid:
+            return False
+        if self.is_noop:
+            return True
+        normalized_type = get_normalized_chat_type(entity)
+        if self.chat_types is not None and normalized_type not in self.chat_types:
+            return False
+        # Private chats (User entities) are never filtered by the public parameter
+        if self.public is None or normalized_type == "private":
+            return True
+        return bool(getattr(entity, "username", None)) == self.public
 
-    normalized_type = get_normalized_chat_type(entity)
-    return normalized_type in chat_types
+
+def _matches_chat_type(entity, chat_type: str) -> bool:
+    """Check if entity matches the specified chat type filter.
+
+    Supports comma-separated values (e.g., "private,group"). Prefer compiling
+    a ChatFilter once when checking many entities.
+    """
+    return ChatFilter.compile(chat_type).matches(entity)
 
 
 def _matches_public_filter(entity, public: bool | None) -> bool:
@@ -427,19 +597,7 @@ def _matches_public_filter(entity, public: bool | None) -> bool:
     Returns:
         True if entity matches public filter, False otherwise
     """
-    # Private chats (User entities) are never filtered by public parameter
-    if get_normalized_chat_type(entity) == "private":
-        return True
-
-    if public is None:
-        return True
-
-    has_username = bool(getattr(entity, "username", None))
-
-    if public:
-        return has_username  # public=True means has username
-
-    return not has_username  # public=False means no username
+    return ChatFilter(public=public).matches(entity)
 
 
 async def build_entity_dict_enriched(entity_or_id) -> dict:
@@ -1,3 +1,5 @@
+import base64
+import json
 from functools import cache
 from importlib import import_module
 from typing import Any
@@ -23,6 +25,28 @@ def _append_dedup_until_limit(
             break
 
 
+def encode_cursor(state: dict[str, Any]) -> str:
+    """Encode pagination state as an opaque URL-safe string."""
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if not isinstance(state, dict):
+        raise ValueError("Invalid cursor: expected an object")
+    return state
+
+
 def normalize_method_name(method: str) -> str:
     """Normalize method to telethon.tl.functions path (case-insensitive).
 
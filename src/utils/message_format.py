@@ -1,26 +1,122 @@
 import asyncio
+import json
 import logging
+import re
+from collections.abc import Collection
 from typing import Any
 
-from telethon.errors import RPCError
+from telethon import utils as telethon_utils
+from telethon.errors import FloodWaitError, RPCError
+from telethon.tl import types as tl_types
 from telethon.tl.functions.messages import TranscribeAudioRequest
 
 from src.client.connection import get_connected_client
-from src.utils.entity import _extract_forward_info, build_entity_dict, get_entity_by_id
+from src.client.profile import get_account_profile
+from src.utils.entity import (
+    _extract_forward_info,
+    build_entity_dict,
+    get_entity_by_id,
+    resolve_forward_origins,
+)
+from src.utils.transcription import get_session_transcriptions
 
 logger = logging.getLogger(__name__)
 
+# Keys of message results that can be requested with fields=
+MESSAGE_FIELDS = frozenset(
+    {
+        "id",
+        "date",
+        "chat",
+        "text",
+        "link",
+        "sender",
+        "reply_to_msg_id",
+        "media",
+        "forwarded_from",
+        "reply_markup",
+        "transcription",
+    }
+)
 
-def _has_any_media(message) -> bool:
-    """Check if message contains any type of media content."""
-    if not hasattr(message, "media") or message.media is None:
-        return False
+# Characters of a replied-to message's text kept in its reply_to preview
+REPLY_PREVIEW_CHARS = 200
+
+# Identify a message across chats (dedup, grouping); returned for any projection
+ALWAYS_INCLUDED_FIELDS = frozenset({"id", "chat"})
+
+
+def normalize_fields(fields: Collection[str] | str | None) -> frozenset[str] | None:
+    """Validate a fields= projection; None means all fields.
+
+    Accepts a list or a comma-separated string. Transcription needs the media
+    placeholder to find voice messages, so requesting it also returns media.
+    Raises ValueError for unknown field names.
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    requested = frozenset(fields)
+    unknown = requested - MESSAGE_FIELDS
+    if unknown:
+        raise ValueError(
+            f"Unknown message fields: {', '.join(sorted(unknown))}. "
+            f"Valid fields: {', '.join(sorted(MESSAGE_FIELDS))}"
+        )
+    if "transcription" in requested:
+        requested |= {"media"}
+    return requested | ALWAYS_INCLUDED_FIELDS
+
+
+def project_message(result: dict[str, Any], fields: frozenset[str] | None):
+    """Drop keys outside a normalized projection from an already built result."""
+    if fields is None or "error" in result:
+        return result
+    return {key: value for key, value in result.items() if key in fields}
 
-    media = message.media
-    media_class = media.__class__.__name__
 
-    # Check for all known media types
-    return media_class in [
+class _TypeRegistry:
+    """Values keyed by Telethon TL type, built once at import.
+
+    Types are registered by class name. Names present in the installed
+    Telethon layer are also keyed by CONSTRUCTOR_ID, the fast path for real
+    TL objects; the name table covers types from other layers and test doubles.
+    """
+
+    __slots__ = ("_by_constructor", "_by_name")
+
+    def __init__(self):
+        self._by_constructor: dict[int, Any] = {}
+        self._by_name: dict[str, Any] = {}
+
+    def add(self, names: Collection[str], value: Any) -> None:
+        for name in names:
+            self._by_name[name] = value
+            tl_class = getattr(tl_types, name, None)
+            if tl_class is not None:
+                self._by_constructor[tl_class.CONSTRUCTOR_ID] = value
+
+    def register(self, *names: str):
+        """Decorator form of add() for serializer functions."""
+
+        def decorator(func):
+            self.add(names, func)
+            return func
+
+        return decorator
+
+    def get(self, obj) -> Any | None:
+        cls = obj.__class__
+        value = self._by_constructor.get(getattr(cls, "CONSTRUCTOR_ID", None))
+        if value is None:
+            value = self._by_name.get(cls.__name__)
+        return value
+
+
+_MEDIA_TYPES = _TypeRegistry()
+_MEDIA_TYPES.add(
+    (
         "MessageMediaPhoto",  # Photos
         "MessageMediaDocument",  # Documents, files, audio, video files
         "MessageMediaAudio",  # Audio files
@@ -36,7 +132,17 @@ def _has_any_media(message) -> bool:
         "MessageMediaInvoice",  # Payments/invoices
         "MessageMediaToDo",  # Todo lists
         "MessageMediaUnsupported",  # Unsupported media types
-    ]
+    ),
+    True,
+)
+
+
+def _has_any_media(message) -> bool:
+    """Check if message contains any type of media content."""
+    media = getattr(message, "media", None)
+    if media is None:
+        return False
+    return _MEDIA_TYPES.get(media) is not None
 
 
 def build_send_edit_result(message, chat, status: str) -> dict[str, Any]:
@@ -64,7 +170,15 @@ def build_send_edit_result(message, chat, status: str) -> dict[str, Any]:
     return result
 
 
+# Entities Telethon attaches to messages from the users/chats of a response
+_SENDER_TYPES = (tl_types.User, tl_types.Channel, tl_types.Chat)
+
+
 async def get_sender_info(client, message) -> dict[str, Any] | None:
+    # Messages from iterators and history pages carry their sender already
+    sender = getattr(message, "sender", None)
+    if isinstance(sender, _SENDER_TYPES):
+        return build_entity_dict(sender)
     if hasattr(message, "sender_id") and message.sender_id:
         try:
             sender = await get_entity_by_id(message.sender_id)
@@ -76,6 +190,127 @@ async def get_sender_info(client, message) -> dict[str, Any] | None:
     return None
 
 
+# Inline button serializers, keyed by button class (older layers) or by the
+# button's `type` object (layers where every button is KeyboardInlineButton)
+_BUTTON_SERIALIZERS = _TypeRegistry()
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardButtonUrl", "InlineButtonTypeUrl")
+def _url_button(button) -> dict[str, Any]:
+    return {"type": "url", "url": getattr(button, "url", "")}
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardButtonCallback", "InlineButtonTypeCallback")
+def _callback_button(button) -> dict[str, Any]:
+    data = getattr(button, "data", None)
+    return {
+        "type": "callback_data",
+        "data": data.decode("utf-8", errors="replace") if data else "",
+    }
+
+
+@_BUTTON_SERIALIZERS.register(
+    "KeyboardButtonSwitchInline", "InlineButtonTypeSwitchInline"
+)
+def _switch_inline_button(button) -> dict[str, Any]:
+    same_peer = getattr(button, "same_peer", False) is True
+    return {
+        "type": "switch_inline_query_current_chat"
+        if same_peer
+        else "switch_inline_query",
+        "query": getattr(button, "query", ""),
+    }
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardButtonSwitchInlineSame")
+def _switch_inline_same_button(button) -> dict[str, Any]:
+    return {
+        "type": "switch_inline_query_current_chat",
+        "query": getattr(button, "query", ""),
+    }
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardButtonGame", "InlineButtonTypeGame")
+def _game_button(button) -> dict[str, Any]:
+    return {"type": "callback_game"}
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardButtonBuy", "InlineButtonTypeBuy")
+def _buy_button(button) -> dict[str, Any]:
+    return {"type": "pay"}
+
+
+@_BUTTON_SERIALIZERS.register(
+    "KeyboardButtonUserProfile", "InlineButtonTypeUserProfile"
+)
+def _user_profile_button(button) -> dict[str, Any]:
+    return {"type": "user_profile", "user_id": getattr(button, "user_id", None)}
+
+
+@_BUTTON_SERIALIZERS.register("KeyboardInlineButton")
+def _typed_inline_button(button) -> dict[str, Any]:
+    kind = getattr(button, "type", None)
+    serializer = _BUTTON_SERIALIZERS.get(kind) if kind is not None else None
+    return serializer(kind) if serializer else {"type": "unknown"}
+
+
+def _serialize_inline_button(button) -> dict[str, Any]:
+    button_info = {"text": getattr(button, "text", "")}
+    serializer = _BUTTON_SERIALIZERS.get(button)
+    button_info.update(serializer(button) if serializer else {"type": "unknown"})
+    return button_info
+
+
+def _markup_rows(reply_markup, serialize_button) -> list[list[dict[str, Any]]]:
+    return [
+        [serialize_button(button) for button in getattr(row, "buttons", ())]
+        for row in getattr(reply_markup, "rows", ())
+    ]
+
+
+_MARKUP_SERIALIZERS = _TypeRegistry()
+
+
+@_MARKUP_SERIALIZERS.register("ReplyKeyboardMarkup")
+def _keyboard_markup(reply_markup) -> dict[str, Any]:
+    return {
+        "type": "keyboard",
+        "rows": _markup_rows(
+            reply_markup, lambda button: {"text": getattr(button, "text", "")}
+        ),
+        "resize": getattr(reply_markup, "resize", None),
+        "single_use": getattr(reply_markup, "single_use", None),
+        "selective": getattr(reply_markup, "selective", None),
+        "persistent": getattr(reply_markup, "persistent", None),
+        "placeholder": getattr(reply_markup, "placeholder", None),
+    }
+
+
+@_MARKUP_SERIALIZERS.register("ReplyInlineMarkup")
+def _inline_markup(reply_markup) -> dict[str, Any]:
+    return {
+        "type": "inline",
+        "rows": _markup_rows(reply_markup, _serialize_inline_button),
+    }
+
+
+@_MARKUP_SERIALIZERS.register("ReplyKeyboardForceReply")
+def _force_reply_markup(reply_markup) -> dict[str, Any]:
+    return {
+        "type": "force_reply",
+        "selective": getattr(reply_markup, "selective", None),
+        "placeholder": getattr(reply_markup, "placeholder", None),
+    }
+
+
+@_MARKUP_SERIALIZERS.register("ReplyKeyboardHide")
+def _hide_markup(reply_markup) -> dict[str, Any]:
+    return {
+        "type": "hide",
+        "selective": getattr(reply_markup, "selective", None),
+    }
+
+
 def _extract_reply_markup(message) -> dict[str, Any] | None:
     """Extract and serialize reply markup from a message.
 
@@ -85,123 +320,187 @@ def _extract_reply_markup(message) -> dict[str, Any] | None:
     if not reply_markup:
         return None
 
-    markup_class = reply_markup.__class__.__name__
-
-    if markup_class == "ReplyKeyboardMarkup":
-        # Extract keyboard buttons organized in rows
-        rows = []
-        if hasattr(reply_markup, "rows"):
-            for row in reply_markup.rows:
-                row_buttons = []
-                if hasattr(row, "buttons"):
-                    for button in row.buttons:
-                        button_text = getattr(button, "text", "")
-                        row_buttons.append({"text": button_text})
-                rows.append(row_buttons)
-
-        return {
-            "type": "keyboard",
-            "rows": rows,
-            "resize": getattr(reply_markup, "resize", None),
-            "single_use": getattr(reply_markup, "single_use", None),
-            "selective": getattr(reply_markup, "selective", None),
-            "persistent": getattr(reply_markup, "persistent", None),
-            "placeholder": getattr(reply_markup, "placeholder", None),
-        }
-
-    if markup_class == "ReplyInlineMarkup":
-        # Extract inline buttons
-        rows = []
-        if hasattr(reply_markup, "rows"):
-            for row in reply_markup.rows:
-                row_buttons = []
-                if hasattr(row, "buttons"):
-                    for button in row.buttons:
-                        button_info = {"text": getattr(button, "text", "")}
-
-                        # Extract button-specific data based on button type
-                        button_class = button.__class__.__name__
-
-                        if button_class == "KeyboardButtonUrl":
-                            button_info.update(
-                                {
-                                    "type": "url",
-                                    "url": getattr(button, "url", ""),
-                                }
-                            )
-                        elif button_class == "KeyboardButtonCallback":
-                            button_info.update(
-                                {
-                                    "type": "callback_data",
-                                    "data": getattr(button, "data", b"").decode(
-                                        "utf-8", errors="replace"
-                                    )
-                                    if getattr(button, "data", None)
-                                    else "",
-                                }
-                            )
-                        elif button_class == "KeyboardButtonSwitchInline":
-                            button_info.update(
-                                {
-                                    "type": "switch_inline_query",
-                                    "query": getattr(button, "query", ""),
-                                }
-                            )
-                        elif button_class == "KeyboardButtonSwitchInlineSame":
-                            button_info.update(
-                                {
-                                    "type": "switch_inline_query_current_chat",
-                                    "query": getattr(button, "query", ""),
-                                }
-                            )
-                        elif button_class == "KeyboardButtonGame":
-                            button_info.update(
-                                {
-                                    "type": "callback_game",
-                                }
-                            )
-                        elif button_class == "KeyboardButtonBuy":
-                            button_info.update(
-                                {
-                                    "type": "pay",
-                                }
-                            )
-                        elif button_class == "KeyboardButtonUserProfile":
-                            button_info.update(
-                                {
-                                    "type": "user_profile",
-                                    "user_id": getattr(button, "user_id", None),
-                                }
-                            )
-                        else:
-                            button_info["type"] = "unknown"
-
-                        row_buttons.append(button_info)
-                rows.append(row_buttons)
-
-        return {
-            "type": "inline",
-            "rows": rows,
-        }
-
-    if markup_class == "ReplyKeyboardForceReply":
-        return {
-            "type": "force_reply",
-            "selective": getattr(reply_markup, "selective", None),
-            "placeholder": getattr(reply_markup, "placeholder", None),
-        }
-
-    if markup_class == "ReplyKeyboardHide":
-        return {
-            "type": "hide",
-            "selective": getattr(reply_markup, "selective", None),
-        }
+    serializer = _MARKUP_SERIALIZERS.get(reply_markup)
+    if serializer is not None:
+        return serializer(reply_markup)
 
     # Unknown markup type
     return {
         "type": "unknown",
-        "class": markup_class,
+        "class": reply_markup.__class__.__name__,
+    }
+
+
+# What a document attribute says about the document
+_DOCUMENT_ATTRIBUTE_KINDS = _TypeRegistry()
+_DOCUMENT_ATTRIBUTE_KINDS.add(("DocumentAttributeAudio",), "audio")
+_DOCUMENT_ATTRIBUTE_KINDS.add(("DocumentAttributeVideo",), "video")
+
+# Media placeholder serializers; unregistered media get _generic_placeholder
+_MEDIA_SERIALIZERS = _TypeRegistry()
+
+
+@_MEDIA_SERIALIZERS.register("MessageMediaDocument")
+def _document_placeholder(media) -> dict[str, Any]:
+    placeholder: dict[str, Any] = {}
+    document = getattr(media, "document", None)
+    if not document:
+        return placeholder
+
+    # Check if it's a voice message or round video via attributes
+    is_voice = False
+    is_round_video = False
+    duration = None
+
+    for attr in getattr(document, "attributes", None) or ():
+        kind = _DOCUMENT_ATTRIBUTE_KINDS.get(attr)
+        if kind == "audio":
+            if getattr(attr, "voice", False):
+                is_voice = True
+            if hasattr(attr, "duration"):
+                duration = attr.duration
+        elif kind == "video":
+            if getattr(attr, "round_message", False):
+                is_round_video = True
+            if hasattr(attr, "duration"):
+                duration = attr.duration
+        elif getattr(attr, "file_name", None):
+            placeholder["filename"] = attr.file_name
+
+    if is_voice:
+        placeholder["type"] = "voice"
+        if duration is not None:
+            placeholder["duration_seconds"] = duration
+
+    elif is_round_video:
+        placeholder["type"] = "round_video"
+        if duration is not None:
+            placeholder["duration_seconds"] = duration
+
+    # Get mime_type and file_size from document object
+    mime_type = getattr(document, "mime_type", None)
+    if mime_type:
+        placeholder["mime_type"] = mime_type
+
+    file_size = getattr(document, "size", None)
+    if file_size is not None:
+        placeholder["approx_size_bytes"] = file_size
+    return placeholder
+
+
+@_MEDIA_SERIALIZERS.register("MessageMediaVoice")
+def _voice_placeholder(media) -> dict[str, Any]:
+    placeholder: dict[str, Any] = {"type": "voice"}
+    # Duration is stored in document attributes
+    document = getattr(media, "document", None)
+    if document and hasattr(document, "attributes"):
+        for attr in document.attributes:
+            if hasattr(attr, "duration") and attr.duration is not None:
+                placeholder["duration_seconds"] = attr.duration
+                break
+    return placeholder
+
+
+@_MEDIA_SERIALIZERS.register("MessageMediaToDo")
+def _todo_placeholder(media) -> dict[str, Any]:
+    placeholder: dict[str, Any] = {}
+    todo_list = getattr(media, "todo", None)
+    if not todo_list:
+        return placeholder
+
+    placeholder["type"] = "todo"
+    title_obj = getattr(todo_list, "title", None)
+    if title_obj and hasattr(title_obj, "text"):
+        placeholder["title"] = title_obj.text
+
+    items = getattr(todo_list, "list", [])
+    if not isinstance(items, list):
+        items = []
+    by_id: dict[Any, dict[str, Any]] = {}
+    placeholder["items"] = []
+    for item in items:
+        item_dict = {
+            "id": getattr(item, "id", 0),
+            "text": getattr(getattr(item, "title", None), "text", ""),
+            "completed": False,  # Will be updated if completions exist
+        }
+        placeholder["items"].append(item_dict)
+        by_id.setdefault(item_dict["id"], item_dict)
+
+    # Map completions to items
+    completions = getattr(media, "completions", [])
+    if not isinstance(completions, list):
+        completions = []
+    for completion in completions:
+        item = by_id.get(getattr(completion, "id", None))
+        if item is None:
+            continue
+        item["completed"] = True
+        completed_by = getattr(completion, "completed_by", None)
+        if completed_by is not None:
+            item["completed_by"] = completed_by
+        completed_at = getattr(completion, "date", None)
+        if completed_at is not None:
+            item["completed_at"] = completed_at.isoformat()
+    return placeholder
+
+
+@_MEDIA_SERIALIZERS.register("MessageMediaPoll")
+def _poll_placeholder(media) -> dict[str, Any]:
+    poll = getattr(media, "poll", None)
+    if not poll:
+        return {}
+    results = getattr(media, "results", None)
+    placeholder: dict[str, Any] = {"type": "poll"}
+
+    question_obj = getattr(poll, "question", None)
+    if question_obj and hasattr(question_obj, "text"):
+        placeholder["question"] = question_obj.text
+
+    # Results are matched to answers by option bytes: Telegram omits answers
+    # nobody voted for and does not promise the answers' order
+    total_voters = (getattr(results, "total_voters", None) or 0) if results else 0
+    counts = {
+        result.option: result
+        for result in (getattr(results, "results", None) or ())
+        if getattr(result, "option", None) is not None
     }
+    placeholder["options"] = []
+    for answer in getattr(poll, "answers", None) or ():
+        counted = counts.get(getattr(answer, "option", None))
+        voters = (getattr(counted, "voters", None) or 0) if counted else 0
+        placeholder["options"].append(
+            {
+                "text": getattr(getattr(answer, "text", None), "text", ""),
+                "voters": voters,
+                "percent": round(100 * voters / total_voters, 1)
+                if total_voters
+                else 0.0,
+                # Set only on the results of polls the account voted in
+                "chosen": getattr(counted, "chosen", None) is True,
+                "correct": getattr(counted, "correct", None) is True,
+            }
+        )
+
+    placeholder["total_voters"] = total_voters
+    placeholder["closed"] = getattr(poll, "closed", False)
+    placeholder["public_voters"] = getattr(poll, "public_voters", True)
+    placeholder["multiple_choice"] = getattr(poll, "multiple_choice", False)
+    placeholder["quiz"] = getattr(poll, "quiz", False)
+    return placeholder
+
+
+def _generic_placeholder(media) -> dict[str, Any]:
+    # Photos, videos, etc.: try to get mime_type and size from the media object
+    placeholder: dict[str, Any] = {}
+    mime_type = getattr(media, "mime_type", None)
+    if mime_type:
+        placeholder["mime_type"] = mime_type
+
+    file_size = getattr(media, "size", None)
+    if file_size is not None:
+        placeholder["approx_size_bytes"] = file_size
+    return placeholder
 
 
 def _build_media_placeholder(message) -> dict[str, Any] | None:
@@ -213,229 +512,386 @@ def _build_media_placeholder(message) -> dict[str, Any] | None:
     if not media:
         return None
 
-    placeholder: dict[str, Any] = {}
-
-    media_cls = media.__class__.__name__
-
-    # Extract document-specific information
-    if media_cls == "MessageMediaDocument":
-        document = getattr(media, "document", None)
-        if document:
-            # Check if it's a voice message or round video via attributes
-            is_voice = False
-            is_round_video = False
-            duration = None
-
-            if hasattr(document, "attributes"):
-                for attr in document.attributes:
-                    attr_cls = attr.__class__.__name__
-                    if attr_cls == "DocumentAttributeAudio":
-                        if getattr(attr, "voice", False):
-                            is_voice = True
-                        if hasattr(attr, "duration"):
-                            duration = attr.duration
-                    elif attr_cls == "DocumentAttributeVideo":
-                        if getattr(attr, "round_message", False):
-                            is_round_video = True
-                        if hasattr(attr, "duration"):
-                            duration = attr.duration
-                    elif hasattr(attr, "file_name") and attr.file_name:
-                        placeholder["filename"] = attr.file_name
-
-            if is_voice:
-                placeholder["type"] = "voice"
-                if duration is not None:
-                    placeholder["duration_seconds"] = duration
-
-            elif is_round_video:
-                placeholder["type"] = "round_video"
-                if duration is not None:
-                    placeholder["duration_seconds"] = duration
-
-            # Get mime_type and file_size from document object
-            mime_type = getattr(document, "mime_type", None)
-            if mime_type:
-                placeholder["mime_type"] = mime_type
-
-            file_size = getattr(document, "size", None)
-            if file_size is not None:
-                placeholder["approx_size_bytes"] = file_size
-
-    # Handle Voice Messages
-    elif media_cls == "MessageMediaVoice":
-        placeholder["type"] = "voice"
-        # Extract duration from the document
-        document = getattr(media, "document", None)
-        if document and hasattr(document, "attributes"):
-            # Duration is stored in document attributes
-            for attr in document.attributes:
-                if hasattr(attr, "duration") and attr.duration is not None:
-                    placeholder["duration_seconds"] = attr.duration
-                    break
-
-    # Handle Todo Lists
-    elif media_cls == "MessageMediaToDo":
-        todo_list = getattr(media, "todo", None)
-        if todo_list:
-            placeholder["type"] = "todo"
-            # Extract title
-            title_obj = getattr(todo_list, "title", None)
-            if title_obj and hasattr(title_obj, "text"):
-                placeholder["title"] = title_obj.text
-
-            # Extract items
-            items = getattr(todo_list, "list", [])
-            if not isinstance(items, list):
-                items = []
-            placeholder["items"] = []
-            for item in items:
-                item_dict = {
-                    "id": getattr(item, "id", 0),
-                    "text": getattr(getattr(item, "title", None), "text", ""),
-                    "completed": False,  # Will be updated if completions exist
-                }
-                placeholder["items"].append(item_dict)
-
-            # Map completions to items
-            completions = getattr(media, "completions", [])
-            if not isinstance(completions, list):
-                completions = []
-            for completion in completions:
-                item_id = getattr(completion, "id", None)
-                completed_by = getattr(completion, "completed_by", None)
-                completed_at = getattr(completion, "date", None)
-
-                # Find the corresponding item and mark as completed
-                for item in placeholder["items"]:
-                    if item["id"] == item_id:
-                        item["completed"] = True
-                        if completed_by is not None:
-                            item["completed_by"] = completed_by
-                        if completed_at is not None:
-                            item["completed_at"] = completed_at.isoformat()
-                        break
-
-    # Handle Polls
-    elif media_cls == "MessageMediaPoll":
-        poll = getattr(media, "poll", None)
-        results = getattr(media, "results", None)
-        if poll:
-            placeholder["type"] = "poll"
-
-            # Extract question
-            question_obj = getattr(poll, "question", None)
-            if question_obj and hasattr(question_obj, "text"):
-                placeholder["question"] = question_obj.text
-
-            # Extract options
-            answers = getattr(poll, "answers", [])
-            placeholder["options"] = []
-            for answer in answers:
-                option_dict = {
-                    "text": getattr(getattr(answer, "text", None), "text", ""),
-                    "voters": 0,  # Will be updated from results
-                    "chosen": getattr(answer, "chosen", False),
-                    "correct": getattr(answer, "correct", False),
-                }
-                placeholder["options"].append(option_dict)
-
-            # Map vote counts from results
-            if results and hasattr(results, "results"):
-                result_counts = getattr(results, "results", [])
-                for result in result_counts:
-                    voters = getattr(result, "voters", 0)
-
-                    # For simplicity, we'll map by index for now
-                    # In a more sophisticated implementation, we'd match by option bytes
-                    for option in placeholder["options"]:
-                        if (
-                            option["voters"] == 0
-                        ):  # Simple mapping - first result to first option
-                            option["voters"] = voters
-                            break
-
-            # Extract poll metadata
-            placeholder["total_voters"] = (
-                getattr(results, "total_voters", 0) if results else 0
-            )
-            placeholder["closed"] = getattr(poll, "closed", False)
-            placeholder["public_voters"] = getattr(poll, "public_voters", True)
-            placeholder["multiple_choice"] = getattr(poll, "multiple_choice", False)
-            placeholder["quiz"] = getattr(poll, "quiz", False)
-
-    else:
-        # For other media types (photos, videos, etc.), try to get mime_type and size from media object
-        mime_type = getattr(media, "mime_type", None)
-        if mime_type:
-            placeholder["mime_type"] = mime_type
-
-        file_size = getattr(media, "size", None)
-        if file_size is not None:
-            placeholder["approx_size_bytes"] = file_size
+    serializer = _MEDIA_SERIALIZERS.get(media) or _generic_placeholder
+    placeholder = serializer(media)
 
     # Return None if no meaningful media metadata was extracted
     return placeholder if placeholder else None
 
 
 async def build_message_result(
-    client, message, entity_or_chat, link: str | None
+    client,
+    message,
+    entity_or_chat,
+    link: str | None,
+    fields: frozenset[str] | None = None,
+    forward_origins: dict | None = None,
 ) -> dict[str, Any]:
-    sender = await get_sender_info(client, message)
-    chat = build_entity_dict(entity_or_chat)
-    forward_info = await _extract_forward_info(message)
-
-    full_text = (
-        getattr(message, "text", None)
-        or getattr(message, "message", None)
-        or getattr(message, "caption", None)
-    )
+    """Format a Telethon message into the uniform message schema.
 
-    result: dict[str, Any] = {
-        "id": message.id,
-        "date": message.date.isoformat() if getattr(message, "date", None) else None,
-        "chat": chat,
-        "text": full_text,
-        "link": link,
-        "sender": sender,
-    }
+    fields is a projection from normalize_fields; keys outside it are neither
+    computed nor returned, so e.g. sender and forward lookups are skipped
+    unless requested. None builds every field.
 
-    reply_to_msg_id = getattr(message, "reply_to_msg_id", None) or getattr(
-        getattr(message, "reply_to", None), "reply_to_msg_id", None
-    )
-    if reply_to_msg_id is not None:
-        result["reply_to_msg_id"] = reply_to_msg_id
+    forward_origins comes from prefetch_forward_origins for the page being
+    formatted; pass the same dict for every message so that a forward source
+    is resolved once per page rather than once per message.
+    """
+
+    def wanted(key: str) -> bool:
+        return fields is None or key in fields
+
+    result: dict[str, Any] = {"id": message.id}
+    if wanted("date"):
+        result["date"] = (
+            message.date.isoformat() if getattr(message, "date", None) else None
+        )
+    result["chat"] = build_entity_dict(entity_or_chat)
+    if wanted("text"):
+        result["text"] = (
+            getattr(message, "text", None)
+            or getattr(message, "message", None)
+            or getattr(message, "caption", None)
+        )
+    if wanted("link"):
+        result["link"] = link
+    if wanted("sender"):
+        result["sender"] = await get_sender_info(client, message)
+
+    if wanted("reply_to_msg_id"):
+        reply_to_msg_id = getattr(message, "reply_to_msg_id", None) or getattr(
+            getattr(message, "reply_to", None), "reply_to_msg_id", None
+        )
+        if reply_to_msg_id is not None:
+            result["reply_to_msg_id"] = reply_to_msg_id
 
-    if hasattr(message, "media") and message.media:
+    if wanted("media") and hasattr(message, "media") and message.media:
         media_placeholder = _build_media_placeholder(message)
         if media_placeholder is not None:
             result["media"] = media_placeholder
 
-    if forward_info is not None:
-        result["forwarded_from"] = forward_info
+    if wanted("forwarded_from"):
+        forward_info = await _extract_forward_info(message, forward_origins)
+        if forward_info is not None:
+            result["forwarded_from"] = forward_info
 
-    reply_markup = _extract_reply_markup(message)
-    if reply_markup is not None:
-        result["reply_markup"] = reply_markup
+    if wanted("reply_markup"):
+        reply_markup = _extract_reply_markup(message)
+        if reply_markup is not None:
+            result["reply_markup"] = reply_markup
+
+    return result
+
+
+async def prefetch_forward_origins(
+    messages, fields: frozenset[str] | None = None
+) -> dict:
+    """Resolve the forward origins of a page in one lookup before formatting it."""
+    if fields is not None and "forwarded_from" not in fields:
+        return {}
+    return await resolve_forward_origins(messages)
+
+
+def _reply_preview(message) -> dict[str, Any]:
+    """Compact form of a replied-to message: no links, lookups or transcription."""
+    preview: dict[str, Any] = {"id": message.id}
+    if getattr(message, "date", None):
+        preview["date"] = message.date.isoformat()
+    # getMessages returns the senders with the messages: no extra lookup
+    sender = getattr(message, "sender", None)
+    if sender is not None:
+        preview["sender"] = build_entity_dict(sender)
+    elif getattr(message, "sender_id", None):
+        preview["sender"] = {"id": message.sender_id}
+    text = getattr(message, "message", None)
+    if text:
+        preview["text"] = text
+        truncate_message_text(preview, REPLY_PREVIEW_CHARS)
+    media = _build_media_placeholder(message)
+    if media is not None and media.get("type"):
+        preview["media_type"] = media["type"]
+    return preview
+
+
+# Peer types to try for each normalized chat type; megagroups and legacy
+# groups both report "group"
+_CHAT_PEER_TYPES = {
+    "private": (tl_types.PeerUser,),
+    "channel": (tl_types.PeerChannel,),
+    "group": (tl_types.PeerChannel, tl_types.PeerChat),
+}
+
+
+async def _input_chat(client, chat: dict[str, Any]):
+    """Input peer of a result's chat dict, from Telethon's entity cache."""
+    chat_id = chat.get("id")
+    if chat_id is None:
+        return None
+    peer_types = _CHAT_PEER_TYPES.get(
+        chat.get("type"), (tl_types.PeerUser, tl_types.PeerChannel, tl_types.PeerChat)
+    )
+    for peer_type in peer_types:
+        try:
+            return await client.get_input_entity(peer_type(chat_id))
+        except Exception:
+            continue
+    return None
+
+
+async def attach_reply_parents(
+    client, results: list[dict[str, Any]], entities: dict[Any, Any] | None = None
+) -> None:
+    """Attach a preview of each result's replied-to message as result["reply_to"].
+
+    Parent ids of the whole page are grouped per chat and fetched with one
+    get_messages call per chat (messages.getMessages or channels.getMessages),
+    instead of one read_messages call per reply. Results need reply_to_msg_id.
+    entities maps chat dict ids to entities already at hand; other chats are
+    resolved from the entity cache. Parents that no longer exist are reported
+    with an error, chats that cannot be read are left without previews.
+    """
+    by_chat: dict[Any, tuple[dict[str, Any], list[dict[str, Any]]]] = {}
+    for result in results:
+        parent_id = result.get("reply_to_msg_id")
+        chat = result.get("chat")
+        if parent_id is None or not isinstance(chat, dict) or "error" in result:
+            continue
+        by_chat.setdefault(chat.get("id"), (chat, []))[1].append(result)
+
+    async def fetch_chat(chat_id, chat: dict[str, Any], replies: list) -> None:
+        entity = (entities or {}).get(chat_id) or await _input_chat(client, chat)
+        if entity is None:
+            return
+        parent_ids = list(dict.fromkeys(r["reply_to_msg_id"] for r in replies))
+        try:
+            parents = await client.get_messages(entity, ids=parent_ids)
+        except Exception as e:
+            logger.warning(f"Failed to fetch reply parents in chat {chat_id}: {e}")
+            return
+        found = {
+            parent_id: parent
+            for parent_id, parent in zip(parent_ids, parents, strict=False)
+            if parent is not None
+        }
+        previews = {
+            parent_id: _reply_preview(parent) for parent_id, parent in found.items()
+        }
+        for result in replies:
+            parent_id = result["reply_to_msg_id"]
+            result["reply_to"] = previews.get(parent_id) or {
+                "id": parent_id,
+                "error": "Message not found or inaccessible",
+            }
+
+    await asyncio.gather(
+        *(
+            fetch_chat(chat_id, chat, replies)
+            for chat_id, (chat, replies) in by_chat.items()
+        )
+    )
+
+
+# Forward fallbacks carry the Telethon class name as type
+_ENTITY_KEY_TYPES = {"User": "private", "Chat": "group", "Channel": "channel"}
 
+
+def _entity_key(entity: dict[str, Any]) -> str:
+    """Key an entity dict by type and id: users and chats share bare ids."""
+    entity_type = entity.get("type")
+    return (
+        f"{_ENTITY_KEY_TYPES.get(entity_type, entity_type) or 'entity'}:{entity['id']}"
+    )
+
+
+def _entity_ref(
+    container: dict[str, Any], key: str, entities: dict[str, dict[str, Any]]
+) -> None:
+    """Replace container[key] (an entity dict) with a key_ref into entities."""
+    entity = container.pop(key, None)
+    if entity is None:
+        return
+    if not isinstance(entity, dict) or entity.get("id") is None:
+        # Nothing to reference by: keep the value inline
+        container[key] = entity
+        return
+    ref = _entity_key(entity)
+    entities.setdefault(ref, entity)
+    container[f"{key}_ref"] = ref
+
+
+def compact_messages(
+    messages: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], dict[str, dict[str, Any]]]:
+    """Move chat and sender dicts of message results into one entity table.
+
+    Messages reference entities by chat_ref / sender_ref (also inside
+    forwarded_from), so a page of messages from one chat carries its chat dict
+    once instead of once per message. Input dicts are not modified.
+
+    Returns:
+        (compacted messages, entities keyed by "<type>:<id>", e.g. "private:7")
+    """
+    entities: dict[str, dict[str, Any]] = {}
+    compacted = []
+    for message in messages:
+        message = dict(message)
+        _entity_ref(message, "chat", entities)
+        _entity_ref(message, "sender", entities)
+        forward = message.get("forwarded_from")
+        if isinstance(forward, dict):
+            forward = dict(forward)
+            _entity_ref(forward, "chat", entities)
+            _entity_ref(forward, "sender", entities)
+            message["forwarded_from"] = forward
+        compacted.append(message)
+    return compacted, entities
+
+
+def compact_response(response: dict[str, Any]) -> dict[str, Any]:
+    """Apply compact_messages to a tool response with a "messages" list."""
+    messages = response.get("messages")
+    if isinstance(messages, list):
+        response["messages"], response["entities"] = compact_messages(messages)
+    return response
+
+
+def truncate_message_text(result: dict[str, Any], max_chars: int) -> dict[str, Any]:
+    """Cut result["text"] to max_chars characters, flagging it as truncated."""
+    text = result.get("text")
+    if isinstance(text, str) and len(text) > max_chars:
+        result["text"] = text[:max_chars].rstrip() + "…"
+        result["text_truncated"] = True
     return result
 
 
+class SnippetMatcher:
+    """Cuts a window of message text around the search terms.
+
+    All terms are compiled into one case-insensitive alternation once per
+    request; each text is scanned in a single finditer pass that stops at the
+    end of the window. Texts without a literal hit (Telegram also matches
+    word forms) get a window from the start.
+    """
+
+    def __init__(self, terms: list[str], window: int):
+        # Longest first so "launches" wins over "launch" at the same position
+        cleaned = sorted(
+            {t.strip().strip('"*').strip() for t in terms} - {""},
+            key=len,
+            reverse=True,
+        )
+        self.pattern = (
+            re.compile("|".join(map(re.escape, cleaned)), re.IGNORECASE)
+            if cleaned
+            else None
+        )
+        self.window = window
+
+    def snippet(self, text: str) -> tuple[str, list[list[int]]]:
+        """Return (snippet, [[start, end], ...]) with offsets into the snippet."""
+        if len(text) <= self.window and self.pattern is None:
+            return text, []
+        matches: list[tuple[int, int]] = []
+        start, end = 0, min(len(text), self.window)
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                if not matches:
+                    # Center the window on the first hit
+                    start = max(
+                        0,
+                        min(match.start() - self.window // 3, len(text) - self.window),
+                    )
+                    end = min(len(text), start + self.window)
+                if match.start() >= end:
+                    break
+                matches.append((match.start(), min(match.end(), end)))
+
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        shift = len(prefix) - start
+        return (
+            prefix + text[start:end] + suffix,
+            [[s + shift, e + shift] for s, e in matches],
+        )
+
+    def apply(self, result: dict[str, Any]) -> dict[str, Any]:
+        """Replace result["text"] with "snippet" and "match_offsets"."""
+        text = result.get("text")
+        if isinstance(text, str) and text:
+            del result["text"]
+            result["snippet"], result["match_offsets"] = self.snippet(text)
+        return result
+
+
+class ResponseBudget:
+    """Byte budget for the messages of one tool response.
+
+    Each message is measured once when it is offered (its own JSON encoding
+    plus a separator), so the check stays incremental however many messages
+    are added. The first message is always admitted so every page makes
+    progress; later ones are refused once they would exceed the budget.
+    """
+
+    # Response keys besides "messages" (has_more, cursor, ...) and brackets
+    ENVELOPE_BYTES = 256
+
+    def __init__(self, max_bytes: int | None, max_text_chars: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_text_chars = max_text_chars
+        self.used = self.ENVELOPE_BYTES
+        self.admitted = 0
+        self.exhausted = False
+
+    def admit(self, result: dict[str, Any]) -> bool:
+        """Account for result and return True if it fits in the remaining budget."""
+        if self.exhausted:
+            return False
+        if self.max_text_chars is not None:
+            truncate_message_text(result, self.max_text_chars)
+        if self.max_bytes is None:
+            self.admitted += 1
+            return True
+        size = len(json.dumps(result, ensure_ascii=False, default=str).encode()) + 2
+        if self.admitted and self.used + size > self.max_bytes:
+            self.exhausted = True
+            return False
+        self.used += size
+        self.admitted += 1
+        return True
+
+    def fit(self, results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return the leading results that fit in the budget."""
+        kept = []
+        for result in results:
+            if not self.admit(result):
+                break
+            kept.append(result)
+        return kept
+
+
 class PremiumRequiredError(Exception):
     """Exception raised when transcription fails due to non-premium account."""
 
 
+class TranscriptionPendingError(Exception):
+    """Raised instead of waiting when a transcription is not ready yet."""
+
+    def __init__(self, transcription_id: int):
+        super().__init__(f"Transcription {transcription_id} is pending")
+        self.transcription_id = transcription_id
+
+
 async def _is_user_premium(client) -> bool:
     """Check if the current user has Telegram Premium."""
     try:
-        me = await client.get_me()
-        return bool(getattr(me, "premium", False))
+        return (await get_account_profile(client)).premium
     except Exception as e:
         logger.warning(f"Failed to check user premium status: {e}")
         return False
 
 
 async def _transcribe_single_voice_message(
-    client, chat_entity, message_id: int
+    client, chat_entity, message_id: int, wait: bool = True
 ) -> str | None:
     """
     Transcribe a single voice message.
@@ -443,79 +899,50 @@ async def _transcribe_single_voice_message(
     Returns the transcription text, or raises PremiumRequiredError if account lacks premium.
     Returns None if transcription fails for other reasons.
 
-    If transcription is pending, polls until completion.
+    A pending transcription is awaited through its updateTranscribedAudio
+    (see src.utils.transcription); with wait=False, or when it is still
+    unfinished after the wait, TranscriptionPendingError carries its
+    transcription_id instead. Requests share the session's concurrency cap.
     """
     try:
-        result = await client(
-            TranscribeAudioRequest(peer=chat_entity, msg_id=message_id)
-        )
+        state = get_session_transcriptions(client)
+        peer_id = telethon_utils.get_peer_id(chat_entity)
+        finished = state.completed(peer_id, message_id)
+        if finished is not None:
+            return finished or None
+        if not state.quota.available():
+            return None
 
-        # If transcription is already complete, return it
-        if (
-            hasattr(result, "text")
-            and result.text
-            and not getattr(result, "pending", False)
-        ):
-            return result.text
-
-        # If transcription is pending, poll until it's ready
-        if (
-            hasattr(result, "pending")
-            and result.pending
-            and hasattr(result, "transcription_id")
-        ):
-            transcription_id = result.transcription_id
-            logger.debug(
-                f"Transcription pending for message {message_id}, polling for completion..."
+        async with state.semaphore:
+            result = await client(
+                TranscribeAudioRequest(peer=chat_entity, msg_id=message_id)
             )
+        state.quota.record(result)
 
-            # Poll for completion (up to 30 seconds with 1-second intervals)
-            max_attempts = 30
-            for attempt in range(max_attempts):
-                await asyncio.sleep(1)  # Wait 1 second between polls
-
-                try:
-                    # Poll by calling transcribeAudio again with the same parameters
-                    poll_result = await client(
-                        TranscribeAudioRequest(peer=chat_entity, msg_id=message_id)
-                    )
-
-                    # Check if this is the same transcription (matching transcription_id)
-                    if (
-                        hasattr(poll_result, "transcription_id")
-                        and poll_result.transcription_id == transcription_id
-                    ):
-                        if hasattr(poll_result, "pending") and poll_result.pending:
-                            # Still pending, continue polling
-                            continue
-                        if hasattr(poll_result, "text") and poll_result.text:
-                            # Transcription completed
-                            logger.debug(
-                                f"Transcription completed for message {message_id} after {attempt + 1} polls"
-                            )
-                            return poll_result.text
-                        # Unexpected state
-                        logger.warning(
-                            f"Unexpected transcription state for message {message_id}"
-                        )
-                        return None
-
-                except Exception as poll_error:
-                    logger.warning(
-                        f"Error polling transcription for message {message_id}: {poll_error}"
-                    )
-                    return None
+        if not getattr(result, "pending", False):
+            text = getattr(result, "text", None) or ""
+            state.remember(peer_id, message_id, text)
+            return text or None
 
-            # Timeout after max attempts
-            logger.warning(
-                f"Transcription polling timeout for message {message_id} after {max_attempts} attempts"
-            )
+        transcription_id = getattr(result, "transcription_id", None)
+        if transcription_id is None:
+            logger.debug(f"No transcription available for message {message_id}")
             return None
-
-        # No transcription available
-        logger.debug(f"No transcription available for message {message_id}")
+        if wait:
+            logger.debug(f"Transcription pending for message {message_id}, waiting...")
+            text = await state.wait(transcription_id, peer_id, message_id)
+            if text is not None:
+                return text or None
+        # Not waited for or still unfinished: hand out the id to poll
+        state.track(transcription_id, peer_id, message_id)
+        raise TranscriptionPendingError(transcription_id)
+
+    except FloodWaitError as e:
+        state.quota.block_for(e.seconds)
+        logger.warning(
+            f"Transcription of message {message_id} rate limited for {e.seconds}s"
+        )
         return None
-
     except RPCError as e:
         error_msg = str(e).lower()
         if "premium" in error_msg and "required" in error_msg:
@@ -524,6 +951,8 @@ async def _transcribe_single_voice_message(
             ) from None
         logger.warning(f"Transcription failed for message {message_id}: {e}")
         return None
+    except TranscriptionPendingError:
+        raise
     except Exception as e:
         logger.warning(
             f"Unexpected error during transcription of message {message_id}: {e}"
@@ -531,8 +960,37 @@ async def _transcribe_single_voice_message(
         return None
 
 
-async def transcribe_voice_messages(
+async def fill_cached_transcriptions(
     messages: list[dict[str, Any]], chat_entity
+) -> list[dict[str, Any]]:
+    """
+    Add already known transcriptions to voice message results, without requests.
+
+    Returns:
+        The voice message results still lacking a transcription
+    """
+    voice_messages = [
+        msg
+        for msg in messages
+        if isinstance(msg.get("media"), dict)
+        and msg["media"].get("type") == "voice"
+        and "transcription" not in msg
+    ]
+    if not voice_messages:
+        return []
+
+    client = await get_connected_client()
+    cached = get_session_transcriptions(client).cached(
+        telethon_utils.get_peer_id(chat_entity), [msg["id"] for msg in voice_messages]
+    )
+    for msg in voice_messages:
+        if cached.get(msg["id"]):
+            msg["transcription"] = cached[msg["id"]]
+    return [msg for msg in voice_messages if msg["id"] not in cached]
+
+
+async def transcribe_voice_messages(
+    messages: list[dict[str, Any]], chat_entity, wait: bool = True
 ) -> None:
     """
     Transcribe voice messages in the results list for premium accounts.
@@ -540,15 +998,24 @@ async def transcribe_voice_messages(
     Args:
         messages: List of message result dictionaries
         chat_entity: The chat entity containing the messages
+        wait: Wait for pending transcriptions; when False (or when the wait
+            runs out) they are marked transcription_pending with the
+            transcription_id to pass to get_transcription
 
     This function:
-    - Checks if the user has Telegram Premium before attempting transcription
-    - Runs transcriptions in parallel using asyncio.TaskGroup
+    - Fills cached transcriptions first (one lookup for the whole page)
+    - Checks if the user has Telegram Premium before requesting the rest
+    - Runs transcriptions in parallel using asyncio.TaskGroup, at most
+      max_concurrent_transcriptions requests at a time
     - Cancels all transcription tasks if any fails with PremiumRequiredError
     - Updates message results with transcription text when available
     """
+    voice_messages = await fill_cached_transcriptions(messages, chat_entity)
+    if not voice_messages:
+        return
 
     client = await get_connected_client()
+    state = get_session_transcriptions(client)
 
     # Check if user has premium before attempting transcription
     is_premium = await _is_user_premium(client)
@@ -558,20 +1025,8 @@ async def transcribe_voice_messages(
             "Skipping voice transcription - user does not have Telegram Premium"
         )
         return
-
-    # Find voice messages that need transcription
-    voice_messages = []
-    for msg in messages:
-        media = msg.get("media")
-        has_voice_type = (
-            media and isinstance(media, dict) and media.get("type") == "voice"
-        )
-        has_transcription = "transcription" in msg
-
-        if has_voice_type and not has_transcription:
-            voice_messages.append(msg)
-
-    if not voice_messages:
+    if not state.quota.available():
+        logger.debug("Skipping voice transcription - transcription quota exhausted")
         return
 
     logger.debug(f"Found {len(voice_messages)} voice messages to transcribe")
@@ -579,9 +1034,14 @@ async def transcribe_voice_messages(
     async def transcribe_task(msg_dict: dict[str, Any]):
         """Transcribe a single voice message and update the result dict."""
         message_id = msg_dict["id"]
-        transcription = await _transcribe_single_voice_message(
-            client, chat_entity, message_id
-        )
+        try:
+            transcription = await _transcribe_single_voice_message(
+                client, chat_entity, message_id, wait=wait
+            )
+        except TranscriptionPendingError as e:
+            msg_dict["transcription_pending"] = True
+            msg_dict["transcription_id"] = e.transcription_id
+            return
         if transcription:
             msg_dict["transcription"] = transcription
             logger.debug(
@@ -0,0 +1,648 @@
+"""
+Local per-session message store backed by SQLite FTS5.
+
+Formatted message results (the same dicts returned by search and read tools)
+are persisted per session and indexed with FTS5, so `source="local"` searches
+can answer with BM25 ranking, phrase/prefix/boolean queries and no network calls.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from datetime import UTC, datetime
+from itertools import pairwise
+from pathlib import Path
+from typing import Any
+
+from src.client.connection import (
+    get_request_session_key,
+    register_session_close_callback,
+)
+from src.config.server_config import get_config
+from src.utils.entity import build_entity_dict
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+STORE_FILE_SUFFIX = ".messages.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    date INTEGER,
+    sender_id INTEGER,
+    peer_kind TEXT,
+    text TEXT,
+    payload TEXT NOT NULL,
+    indexed_at REAL NOT NULL,
+    UNIQUE (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS messages_chat_date ON messages (chat_id, date);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text,
+    content='messages',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text)
+    VALUES ('delete', old.rowid, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text)
+    VALUES ('delete', old.rowid, old.text);
+    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    username TEXT COLLATE NOCASE,
+    peer_kind TEXT,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_username ON entities (username);
+
+-- Voice message transcriptions keyed by marked peer id (-100... for channels)
+CREATE TABLE IF NOT EXISTS transcriptions (
+    peer_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    transcribed_at REAL NOT NULL,
+    PRIMARY KEY (peer_id, message_id)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Message id spans [low_id, high_id] whose history sync_chat fully fetched;
+-- passively indexed messages never count as synced
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    chat_id INTEGER NOT NULL,
+    low_id INTEGER NOT NULL,
+    high_id INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, low_id)
+);
+
+CREATE TABLE IF NOT EXISTS tracked_chats (
+    chat_id INTEGER PRIMARY KEY,
+    peer_kind TEXT,
+    pts INTEGER,
+    last_synced_at REAL,
+    backlog INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Map chat dict types to Telegram peer kinds; "group" is ambiguous
+# (basic chat or megagroup) and stays unknown unless an entity is provided
+_PEER_KIND_BY_CHAT_TYPE = {"private": "user", "channel": "channel"}
+
+
+# ============================================================================
+# UTILITY FUNCTIONS
+# ============================================================================
+
+
+def get_store_path(session_key: str) -> Path:
+    """Return the SQLite file path of the local message store for a session."""
+    return get_config().session_directory / f"{session_key}{STORE_FILE_SUFFIX}"
+
+
+def _peer_kind_for_entity(entity) -> str | None:
+    """Return 'user', 'chat' or 'channel' for a Telethon entity."""
+    if entity is None:
+        return None
+    entity_class = entity.__class__.__name__
+    if entity_class == "User":
+        return "user"
+    if entity_class in ("Chat", "ChatForbidden"):
+        return "chat"
+    if entity_class in ("Channel", "ChannelForbidden"):
+        return "channel"
+    return None
+
+
+def _to_timestamp(value: str | datetime | None) -> int | None:
+    """Convert an ISO string or datetime to a UTC epoch timestamp."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return int(value.timestamp())
+
+
+def normalize_local_chat_id(chat_id: str | int) -> int | None:
+    """Convert numeric chat identifiers (including -100 forms) to raw entity ids."""
+    try:
+        numeric = int(chat_id)
+    except (TypeError, ValueError):
+        return None
+    text = str(numeric)
+    if text.startswith("-100"):
+        return int(text[4:])
+    return abs(numeric)
+
+
+def _build_match_expression(queries: list[str]) -> str:
+    """Combine comma-separated query terms into one FTS5 OR expression."""
+    if len(queries) == 1:
+        return queries[0]
+    return " OR ".join(f"({q})" for q in queries)
+
+
+def _quote_fts_term(term: str) -> str:
+    """Quote a term as an FTS5 phrase, escaping embedded double quotes."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+
+class MessageStore:
+    """SQLite FTS5 index of formatted message results for one session."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def index_messages(self, results: list[dict[str, Any]], entity=None) -> int:
+        """Upsert formatted message results and their chats into the index.
+
+        Args:
+            results: Message dicts as produced by build_message_result
+            entity: Optional Telethon entity all results belong to; pins the peer
+                kind so deletions from updates can be applied unambiguously
+
+        Returns:
+            Number of messages written
+        """
+        now = time.time()
+        entity_kind = _peer_kind_for_entity(entity)
+        message_rows = []
+        chats: dict[int, tuple[str | None, str | None, str]] = {}
+
+        for result in results:
+            chat = result.get("chat") or {}
+            chat_id = chat.get("id")
+            message_id = result.get("id")
+            if chat_id is None or message_id is None or "error" in result:
+                continue
+
+            peer_kind = entity_kind or _PEER_KIND_BY_CHAT_TYPE.get(chat.get("type"))
+            sender = result.get("sender") or {}
+            text_parts = [result.get("text"), result.get("transcription")]
+            text = "\n".join(part for part in text_parts if part)
+            message_rows.append(
+                (
+                    chat_id,
+                    message_id,
+                    _to_timestamp(result.get("date")),
+                    sender.get("id"),
+                    peer_kind,
+                    text,
+                    json.dumps(result, ensure_ascii=False, default=str),
+                    now,
+                )
+            )
+            chats[chat_id] = (
+                chat.get("username"),
+                peer_kind,
+                json.dumps(chat, ensure_ascii=False, default=str),
+            )
+
+        if not message_rows:
+            return 0
+
+        with self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO messages
+                    (chat_id, message_id, date, sender_id, peer_kind, text, payload, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chat_id, message_id) DO UPDATE SET
+                    date = excluded.date,
+                    sender_id = excluded.sender_id,
+                    peer_kind = COALESCE(excluded.peer_kind, messages.peer_kind),
+                    text = excluded.text,
+                    payload = excluded.payload,
+                    indexed_at = excluded.indexed_at
+                """,
+                message_rows,
+            )
+            self._conn.executemany(
+                """
+                INSERT INTO entities (id, username, peer_kind, payload, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username,
+                    peer_kind = COALESCE(excluded.peer_kind, entities.peer_kind),
+                    payload = excluded.payload,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (chat_id, username, kind, payload, now)
+                    for chat_id, (username, kind, payload) in chats.items()
+                ],
+            )
+        return len(message_rows)
+
+    def index_entities(self, entities: list) -> int:
+        """Upsert Telethon users/chats into the entity index without messages."""
+        now = time.time()
+        rows = []
+        for entity in entities:
+            entity_dict = build_entity_dict(entity)
+            if not entity_dict or entity_dict.get("id") is None:
+                continue
+            rows.append(
+                (
+                    entity_dict["id"],
+                    entity_dict.get("username"),
+                    _peer_kind_for_entity(entity),
+                    json.dumps(entity_dict, ensure_ascii=False, default=str),
+                    now,
+                )
+            )
+        with self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO entities (id, username, peer_kind, payload, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username,
+                    peer_kind = COALESCE(excluded.peer_kind, entities.peer_kind),
+                    payload = excluded.payload,
+                    updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def delete_messages(self, chat_id: int, message_ids: list[int]) -> int:
+        """Delete messages of one chat (channel deletions carry the channel id)."""
+        placeholders = ", ".join("?" for _ in message_ids)
+        with self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM messages WHERE chat_id = ? AND message_id IN ({placeholders})",
+                [chat_id, *message_ids],
+            )
+        return cursor.rowcount
+
+    def delete_common_box_messages(self, message_ids: list[int]) -> int:
+        """Delete private/basic-group messages by id.
+
+        Telegram reports these deletions without a peer: ids are unique across
+        the account's common message box, so channel rows must never match.
+        """
+        placeholders = ", ".join("?" for _ in message_ids)
+        with self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM messages WHERE peer_kind IN ('user', 'chat') "
+                f"AND message_id IN ({placeholders})",
+                message_ids,
+            )
+        return cursor.rowcount
+
+    def track_chat(self, chat_id: int, peer_kind: str | None, pts: int | None) -> None:
+        """Register a chat for incremental sync (pts is required for channels)."""
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO tracked_chats (chat_id, peer_kind, pts, last_synced_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                    peer_kind = COALESCE(excluded.peer_kind, tracked_chats.peer_kind),
+                    pts = COALESCE(excluded.pts, tracked_chats.pts),
+                    last_synced_at = excluded.last_synced_at
+                """,
+                (chat_id, peer_kind, pts, time.time()),
+            )
+
+    def get_tracked_chats(self) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            """
+            SELECT t.chat_id, t.peer_kind, t.pts, t.last_synced_at, t.backlog,
+                   e.payload AS entity,
+                   (SELECT MAX(date) FROM messages m WHERE m.chat_id = t.chat_id)
+                       AS newest_date
+            FROM tracked_chats t LEFT JOIN entities e ON e.id = t.chat_id
+            ORDER BY t.chat_id
+            """
+        ).fetchall()
+        return [
+            {
+                "chat_id": row["chat_id"],
+                "peer_kind": row["peer_kind"],
+                "pts": row["pts"],
+                "last_synced_at": row["last_synced_at"],
+                "backlog": row["backlog"],
+                "newest_date": row["newest_date"],
+                "title": json.loads(row["entity"]).get("title")
+                if row["entity"]
+                else None,
+            }
+            for row in rows
+        ]
+
+    def update_tracked_chat(
+        self,
+        chat_id: int,
+        pts: int | None = None,
+        backlog: int = 0,
+        synced_at: float | None = None,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                """
+                UPDATE tracked_chats
+                SET pts = COALESCE(?, pts), backlog = ?, last_synced_at = ?
+                WHERE chat_id = ?
+                """,
+                (pts, backlog, synced_at or time.time(), chat_id),
+            )
+
+    def mark_common_box_synced(self, backlog: int = 0) -> None:
+        """Stamp all tracked private/basic-group chats after a getDifference run."""
+        with self._conn:
+            self._conn.execute(
+                """
+                UPDATE tracked_chats SET last_synced_at = ?, backlog = ?
+                WHERE peer_kind IN ('user', 'chat')
+                """,
+                (time.time(), backlog),
+            )
+
+    def add_synced_range(self, chat_id: int, low_id: int, high_id: int) -> None:
+        """Record that history from low_id to high_id (inclusive) was synced.
+
+        Overlapping and adjacent ranges are merged, so a chat whose history
+        is fully synced ends up with a single range starting at 1.
+        """
+        with self._conn:
+            rows = self._conn.execute(
+                """
+                SELECT low_id, high_id FROM synced_ranges
+                WHERE chat_id = ? AND low_id <= ? AND high_id >= ?
+                """,
+                (chat_id, high_id + 1, low_id - 1),
+            ).fetchall()
+            for row in rows:
+                low_id = min(low_id, row["low_id"])
+                high_id = max(high_id, row["high_id"])
+            self._conn.execute(
+                "DELETE FROM synced_ranges WHERE chat_id = ? AND low_id >= ? AND high_id <= ?",
+                (chat_id, low_id, high_id),
+            )
+            self._conn.execute(
+                "INSERT INTO synced_ranges (chat_id, low_id, high_id) VALUES (?, ?, ?)",
+                (chat_id, low_id, high_id),
+            )
+
+    def clear_synced_ranges(self, chat_id: int) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM synced_ranges WHERE chat_id = ?", (chat_id,)
+            )
+
+    def save_transcriptions(self, peer_id: int, texts: dict[int, str]) -> None:
+        """Store final voice transcriptions of one peer's messages."""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO transcriptions "
+                "(peer_id, message_id, text, transcribed_at) VALUES (?, ?, ?, ?)",
+                [
+                    (peer_id, message_id, text, now)
+                    for message_id, text in texts.items()
+                ],
+            )
+
+    def set_meta(self, key: str, value: Any) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def resolve_chat_id(self, chat_id: str | int) -> int | None:
+        """Resolve a tool-level chat identifier to a stored chat id without RPCs."""
+        if chat_id == "me":
+            return self.get_meta("self_id")
+        numeric = normalize_local_chat_id(chat_id)
+        if numeric is not None:
+            return numeric
+        row = self._conn.execute(
+            "SELECT id FROM entities WHERE username = ?",
+            (str(chat_id).lstrip("@"),),
+        ).fetchone()
+        return row["id"] if row else None
+
+    def get_transcriptions(
+        self, peer_id: int, message_ids: list[int]
+    ) -> dict[int, str]:
+        """Return stored transcriptions of the given messages of one peer."""
+        placeholders = ", ".join("?" for _ in message_ids)
+        rows = self._conn.execute(
+            f"SELECT message_id, text FROM transcriptions "
+            f"WHERE peer_id = ? AND message_id IN ({placeholders})",
+            [peer_id, *message_ids],
+        ).fetchall()
+        return {row["message_id"]: row["text"] for row in rows}
+
+    def get_synced_ranges(self, chat_id: int) -> list[tuple[int, int]]:
+        """Return the synced (low_id, high_id) ranges of a chat, newest first."""
+        rows = self._conn.execute(
+            "SELECT low_id, high_id FROM synced_ranges WHERE chat_id = ? "
+            "ORDER BY high_id DESC",
+            (chat_id,),
+        ).fetchall()
+        return [(row["low_id"], row["high_id"]) for row in rows]
+
+    def get_sync_gaps(self, chat_id: int) -> list[tuple[int, int | None]]:
+        """Return the unsynced (min_id, max_id) id windows of a chat, newest first.
+
+        Both bounds are exclusive, matching iter_messages: the first window is
+        everything newer than the newest synced range (max_id None), then the
+        holes between ranges, then the older history below the backfill cursor
+        (min_id 0). A fully synced chat only has the first window.
+        """
+        ranges = self.get_synced_ranges(chat_id)
+        if not ranges:
+            return [(0, None)]
+        gaps: list[tuple[int, int | None]] = [(ranges[0][1], None)]
+        for (low, _), (_, next_high) in pairwise(ranges):
+            gaps.append((next_high, low))
+        if ranges[-1][0] > 1:
+            gaps.append((0, ranges[-1][0]))
+        return gaps
+
+    def count_messages(self, chat_id: int | None = None) -> int:
+        if chat_id is None:
+            row = self._conn.execute("SELECT COUNT(*) AS n FROM messages").fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS n FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return row["n"]
+
+    def search(
+        self,
+        queries: list[str],
+        chat_id: int | None = None,
+        limit: int = 20,
+        min_date: str | None = None,
+        max_date: str | None = None,
+        chat_types: list[str] | None = None,
+        public: bool | None = None,
+        offset: int = 0,
+    ) -> list[dict[str, Any]]:
+        """Search stored messages.
+
+        With queries, results are ordered by BM25 relevance; terms use FTS5
+        syntax (phrases, prefix*, AND/OR/NOT). Without queries (per-chat only),
+        the newest stored messages are returned.
+
+        Raises:
+            ValueError: If the FTS5 expression is invalid even after quoting
+        """
+        where: list[str] = []
+        args: list[Any] = []
+        if chat_id is not None:
+            where.append("m.chat_id = ?")
+            args.append(chat_id)
+        if min_date:
+            where.append("m.date >= ?")
+            args.append(_to_timestamp(min_date))
+        if max_date:
+            where.append("m.date <= ?")
+            args.append(_to_timestamp(max_date))
+        if chat_types:
+            placeholders = ", ".join("?" for _ in chat_types)
+            where.append(f"json_extract(m.payload, '$.chat.type') IN ({placeholders})")
+            args.extend(chat_types)
+        if public is not None:
+            # Public filter never applies to private chats
+            where.append(
+                "(json_extract(m.payload, '$.chat.type') = 'private' OR "
+                f"(json_extract(m.payload, '$.chat.username') IS {'NOT ' if public else ''}NULL))"
+            )
+
+        if not queries:
+            sql = "SELECT m.payload FROM messages m"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY m.date DESC, m.message_id DESC LIMIT ? OFFSET ?"
+            rows = self._conn.execute(sql, [*args, limit, offset]).fetchall()
+            return [json.loads(row["payload"]) for row in rows]
+
+        sql = (
+            "SELECT m.payload FROM messages_fts f "
+            "JOIN messages m ON m.rowid = f.rowid "
+            "WHERE messages_fts MATCH ?"
+        )
+        if where:
+            sql += " AND " + " AND ".join(where)
+        sql += " ORDER BY bm25(messages_fts), m.date DESC LIMIT ? OFFSET ?"
+
+        try:
+            rows = self._conn.execute(
+                sql, [_build_match_expression(queries), *args, limit, offset]
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Plain terms with punctuation are not valid FTS5 syntax; retry as phrases
+            logger.debug(f"FTS5 query rejected ({e}), retrying with quoted terms")
+            quoted = _build_match_expression([_quote_fts_term(q) for q in queries])
+            try:
+                rows = self._conn.execute(
+                    sql, [quoted, *args, limit, offset]
+                ).fetchall()
+            except sqlite3.OperationalError as e2:
+                raise ValueError(f"Invalid local search query: {e2}") from e2
+        return [json.loads(row["payload"]) for row in rows]
+
+
+# ============================================================================
+# PER-SESSION REGISTRY
+# ============================================================================
+
+_stores: dict[str, MessageStore] = {}
+
+
+def get_message_store(session_key: str | None = None) -> MessageStore:
+    """Return the local message store of a session (default: the current request's)."""
+    session_key = session_key or get_request_session_key()
+    store = _stores.get(session_key)
+    if store is None:
+        store = MessageStore(get_store_path(session_key))
+        _stores[session_key] = store
+    return store
+
+
+def find_message_store(session_key: str) -> MessageStore | None:
+    """Return a session's store if it is open or exists on disk, without creating one."""
+    store = _stores.get(session_key)
+    if store is None and get_store_path(session_key).exists():
+        store = get_message_store(session_key)
+    return store
+
+
+def close_message_store(session_key: str) -> None:
+    """Close and forget the store of a session (called when the session is dropped)."""
+    store = _stores.pop(session_key, None)
+    if store is not None:
+        store.close()
+
+
+register_session_close_callback(close_message_store)
+
+
+def index_results(results: list[dict[str, Any]], entity=None) -> None:
+    """Index tool results into the local store when passive indexing is enabled.
+
+    Never raises: the local store is an optimization and must not break tools.
+    """
+    if not results or not get_config().local_store_enabled:
+        return
+    try:
+        get_message_store().index_messages(results, entity)
+    except Exception as e:
+        logger.warning(f"Failed to index messages into local store: {e}")
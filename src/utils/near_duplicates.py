@@ -0,0 +1,114 @@
+"""
+Near-duplicate detection for search results.
+
+Reposts of the same text across channels differ only in a footer, a link or
+a few words. Texts are fingerprinted with a 64-bit SimHash over their words
+and two fingerprints within MAX_HAMMING_DISTANCE bits count as duplicates. The
+fingerprint is cut into MAX_HAMMING_DISTANCE + 1 bands: two fingerprints that
+close must agree on at least one whole band, so only texts sharing a band are
+compared instead of every pair on the page.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Any
+
+FINGERPRINT_BITS = 64
+MAX_HAMMING_DISTANCE = 8
+
+# Short texts ("ok", "thanks!") are too generic to call duplicates
+MIN_DUPLICATE_TOKENS = 6
+
+_BAND_WIDTHS = (7, 7, 7, 7, 7, 7, 7, 7, 8)
+_TOKEN_RE = re.compile(r"\w+")
+
+# SimHash sums every fingerprint bit over all features. Each byte of a
+# feature hash is spread into 8 lanes of _LANE_BITS bits of one big integer,
+# so a single integer addition per feature updates all 64 bit counters.
+_LANE_BITS = 16
+_BYTE_LANES = [
+    sum(((byte >> bit) & 1) << (bit * _LANE_BITS) for bit in range(8))
+    for byte in range(256)
+]
+_LANE_MASK = (1 << _LANE_BITS) - 1
+
+
+def _band_slices() -> list[tuple[int, int]]:
+    slices = []
+    shift = 0
+    for width in _BAND_WIDTHS:
+        slices.append((shift, (1 << width) - 1))
+        shift += width
+    return slices
+
+
+_BANDS = _band_slices()
+
+
+@lru_cache(maxsize=65536)
+def _spread_feature(feature: str) -> int:
+    """Hash a feature and spread its 64 bits into counter lanes."""
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    return sum(
+        _BYTE_LANES[byte] << (index * 8 * _LANE_BITS)
+        for index, byte in enumerate(digest)
+    )
+
+
+def simhash(text: str) -> int | None:
+    """Return the SimHash of text, or None when it is too short to compare."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < MIN_DUPLICATE_TOKENS:
+        return None
+    # Distinct words; a Telegram message has far fewer than 2**16
+    features = set(tokens)
+    counters = sum(_spread_feature(feature) for feature in features)
+    half = len(features) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        # Byte i of the digest is bits 56-8i..63-8i of the big-endian hash
+        byte_index, bit_in_byte = divmod(bit, 8)
+        lane = (7 - byte_index) * 8 + bit_in_byte
+        if (counters >> (lane * _LANE_BITS)) & _LANE_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """Representatives of one result page, looked up by fingerprint band."""
+
+    def __init__(self, max_distance: int = MAX_HAMMING_DISTANCE):
+        self.max_distance = max_distance
+        self._buckets: dict[tuple[int, int], list[tuple[int, Any]]] = {}
+
+    def match_or_add(self, text: str | None, payload: Any) -> Any | None:
+        """Return the payload of an earlier near-duplicate of text.
+
+        When there is none, text is registered with payload as a new
+        representative and None is returned. Empty and short texts are never
+        duplicates.
+        """
+        if not isinstance(text, str) or not text:
+            return None
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+        keys = [
+            (index, (fingerprint >> shift) & mask)
+            for index, (shift, mask) in enumerate(_BANDS)
+        ]
+        for key in keys:
+            for other, other_payload in self._buckets.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return other_payload
+        for key in keys:
+            self._buckets.setdefault(key, []).append((fingerprint, payload))
+        return None
+
+
+def attach_duplicate(result: dict[str, Any], link: str | None) -> None:
+    """Record a collapsed near-duplicate on its representative result."""
+    result["duplicates"] = result.get("duplicates", 0) + 1
+    if link:
+        result.setdefault("duplicate_links", []).append(link)
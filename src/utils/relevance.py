@@ -0,0 +1,104 @@
+"""
+In-process BM25 scoring of search results.
+
+Telegram orders global results by its own rate and per-chat results by date,
+so a multi-term query's best matches can fall past the limit. Search tools
+over-fetch a bounded candidate set and rerank it here. Query words match
+message words by prefix, like Telegram's search ("proj" matches "projects").
+"""
+
+import math
+import re
+from typing import Any
+
+_TOKEN_RE = re.compile(r"\w+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def query_words(queries: list[str]) -> list[str]:
+    """Distinct lowercase words of the comma-separated query terms, in order."""
+    words: list[str] = []
+    for query in queries:
+        for word in _TOKEN_RE.findall(query.lower()):
+            if word not in words:
+                words.append(word)
+    return words
+
+
+class BM25Scorer:
+    """Scores a candidate set against the query words with Okapi BM25.
+
+    Each text is scanned once with a single compiled pattern that captures
+    which query word a message word starts with, producing one term-frequency
+    array per candidate. Document frequencies and the average length come
+    from the candidate set itself.
+    """
+
+    def __init__(self, words: list[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.words = words
+        self.k1 = k1
+        self.b = b
+        # Longest first so "launches" is credited to "launches", not "launch"
+        order = sorted(range(len(words)), key=lambda i: len(words[i]), reverse=True)
+        self._group_word = [0, *order]
+        self.pattern = (
+            re.compile(
+                r"\b(?:" + "|".join(f"({re.escape(words[i])})" for i in order) + r")\w*"
+            )
+            if words
+            else None
+        )
+
+    def term_frequencies(self, text: str) -> tuple[list[int], int]:
+        """Return (frequency of each query word, number of words) of text."""
+        lowered = text.lower()
+        frequencies = [0] * len(self.words)
+        if self.pattern is not None:
+            for match in self.pattern.finditer(lowered):
+                frequencies[self._group_word[match.lastindex]] += 1
+        return frequencies, len(_TOKEN_RE.findall(lowered))
+
+    def score(self, texts: list[str]) -> list[float]:
+        """BM25 score of each text relative to the others."""
+        if not texts or not self.words:
+            return [0.0] * len(texts)
+        rows = [self.term_frequencies(text) for text in texts]
+        count = len(rows)
+        average_length = (sum(length for _, length in rows) / count) or 1.0
+        document_frequency = [
+            sum(1 for frequencies, _ in rows if frequencies[i])
+            for i in range(len(self.words))
+        ]
+        idf = [
+            math.log((count - df + 0.5) / (df + 0.5) + 1.0) for df in document_frequency
+        ]
+
+        scores = []
+        for frequencies, length in rows:
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            scores.append(
+                sum(
+                    weight * tf * (self.k1 + 1) / (tf + norm)
+                    for weight, tf in zip(idf, frequencies, strict=True)
+                    if tf
+                )
+            )
+        return scores
+
+
+def _result_text(result: dict[str, Any]) -> str:
+    parts = [result.get("text"), result.get("transcription")]
+    return "\n".join(part for part in parts if isinstance(part, str))
+
+
+def rank_by_relevance(
+    results: list[dict[str, Any]], queries: list[str]
+) -> list[dict[str, Any]]:
+    """Sort results by BM25 score (ties keep their order) and add relevance_score."""
+    scores = BM25Scorer(query_words(queries)).score([_result_text(r) for r in results])
+    for result, score in zip(results, scores, strict=True):
+        result["relevance_score"] = round(score, 3)
+    order = sorted(range(len(results)), key=lambda i: -scores[i])
+    return [results[i] for i in order]
@@ -0,0 +1,226 @@
+"""
+Per-session state of voice message transcription.
+
+messages.transcribeAudio answers pending=True for audio Telegram has not
+recognized yet and later pushes updateTranscribedAudio with the final text.
+Each session registers one raw update handler that resolves a future keyed by
+transcription_id, so a pending transcription costs one request and no polling.
+
+Final texts are cached by (peer, message id): in memory for the session and,
+when the local store is enabled, in the session's SQLite store next to the
+entity index, so re-reading a voice message never transcribes it again.
+Transcriptions handed back unfinished keep their transcription_id as a handle
+that get_transcription can poll without another transcribeAudio request.
+Requests are capped per session and Telegram's reported allowance (trial
+counts, flood waits) is tracked to stop requests that would be refused.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from telethon import events
+from telethon import utils as telethon_utils
+from telethon.tl.types import UpdateTranscribedAudio
+
+from src.client.connection import (
+    get_request_session_key,
+    register_session_close_callback,
+)
+from src.config.server_config import get_config
+from src.utils.message_store import get_message_store
+
+logger = logging.getLogger(__name__)
+
+# Longest wait for a pending transcription inside one tool call
+TRANSCRIPTION_TIMEOUT = 30.0
+
+# Finished transcriptions kept in memory per session
+MAX_COMPLETED_TRANSCRIPTIONS = 512
+
+
+class TranscriptionQuota:
+    """Transcription allowance of one session as last reported by Telegram."""
+
+    def __init__(self):
+        self.requests = 0
+        self.trial_remains: int | None = None
+        self.blocked_until = 0.0
+
+    def record(self, result) -> None:
+        """Account for one transcribeAudio answer."""
+        self.requests += 1
+        remains = getattr(result, "trial_remains_num", None)
+        if isinstance(remains, int):
+            self.trial_remains = remains
+            until = getattr(result, "trial_remains_until_date", None)
+            if remains == 0 and until is not None:
+                self.blocked_until = max(self.blocked_until, until.timestamp())
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    def available(self) -> bool:
+        return time.time() >= self.blocked_until
+
+
+class SessionTranscriptions:
+    """Pending futures, cached texts, request cap and quota of one client."""
+
+    def __init__(
+        self,
+        client,
+        session_key: str,
+        max_concurrent: int | None = None,
+        maxlen: int = MAX_COMPLETED_TRANSCRIPTIONS,
+    ):
+        self.client = client
+        self.session_key = session_key
+        self.maxlen = maxlen
+        self.semaphore = asyncio.Semaphore(
+            max_concurrent or get_config().max_concurrent_transcriptions
+        )
+        self.quota = TranscriptionQuota()
+        self._futures: dict[int, asyncio.Future] = {}
+        self._completed: OrderedDict[tuple[int, int], str] = OrderedDict()
+        self._pending: OrderedDict[int, tuple[int, int]] = OrderedDict()
+        self._handler_registered = False
+
+    def ensure_handler(self) -> None:
+        if not self._handler_registered:
+            self.client.add_event_handler(
+                self.on_update, events.Raw(UpdateTranscribedAudio)
+            )
+            self._handler_registered = True
+
+    def remove_handler(self) -> None:
+        if self._handler_registered:
+            self.client.remove_event_handler(self.on_update)
+            self._handler_registered = False
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
+    async def on_update(self, update) -> None:
+        # Partial results arrive with pending=True while recognition runs
+        if getattr(update, "pending", False):
+            return
+        text = update.text or ""
+        self.remember(telethon_utils.get_peer_id(update.peer), update.msg_id, text)
+
+        future = self._futures.pop(update.transcription_id, None)
+        if future is not None and not future.done():
+            future.set_result(text)
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _keep(self, peer_id: int, message_id: int, text: str) -> None:
+        key = (peer_id, message_id)
+        self._completed[key] = text
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.maxlen:
+            self._completed.popitem(last=False)
+
+    def remember(self, peer_id: int, message_id: int, text: str) -> None:
+        """Cache a final transcription (empty text: nothing was recognized)."""
+        self._keep(peer_id, message_id, text)
+        if not get_config().local_store_enabled:
+            return
+        try:
+            get_message_store(self.session_key).save_transcriptions(
+                peer_id, {message_id: text}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist transcription of {message_id}: {e}")
+
+    def completed(self, peer_id: int, message_id: int) -> str | None:
+        """Final text of a transcription finished in this session, if known."""
+        return self._completed.get((peer_id, message_id))
+
+    def track(self, transcription_id: int, peer_id: int, message_id: int) -> None:
+        """Remember which message a transcription handed out unfinished belongs to."""
+        self._pending[transcription_id] = (peer_id, message_id)
+        self._pending.move_to_end(transcription_id)
+        while len(self._pending) > self.maxlen:
+            self._pending.popitem(last=False)
+
+    def lookup(self, transcription_id: int) -> tuple[int, int] | None:
+        """(peer id, message id) of a tracked transcription, if still known."""
+        return self._pending.get(transcription_id)
+
+    def cached(self, peer_id: int, message_ids: list[int]) -> dict[int, str]:
+        """Cached texts of the given messages: memory first, then one store query."""
+        found = {
+            message_id: text
+            for message_id in message_ids
+            if (text := self.completed(peer_id, message_id)) is not None
+        }
+        missing = [m for m in message_ids if m not in found]
+        if missing and get_config().local_store_enabled:
+            try:
+                stored = get_message_store(self.session_key).get_transcriptions(
+                    peer_id, missing
+                )
+            except Exception as e:
+                logger.warning(f"Failed to read cached transcriptions: {e}")
+                stored = {}
+            for message_id, text in stored.items():
+                self._keep(peer_id, message_id, text)
+            found.update(stored)
+        return found
+
+    async def wait(
+        self,
+        transcription_id: int,
+        peer_id: int,
+        message_id: int,
+        timeout: float = TRANSCRIPTION_TIMEOUT,
+    ) -> str | None:
+        """Wait for the final text of a pending transcription; None on timeout."""
+        # The update may have been handled before the caller got here
+        text = self.completed(peer_id, message_id)
+        if text is not None:
+            return text
+        future = self._futures.get(transcription_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[transcription_id] = future
+        try:
+            # Shielded: concurrent waiters of one transcription share the future
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except TimeoutError:
+            if self._futures.get(transcription_id) is future:
+                del self._futures[transcription_id]
+            logger.warning(
+                f"Transcription of message {message_id} still pending after {timeout}s"
+            )
+            return None
+
+
+# Session cache key -> transcription state
+_session_transcriptions: dict[str, SessionTranscriptions] = {}
+
+
+def get_session_transcriptions(client) -> SessionTranscriptions:
+    """Return the transcription state of the current session, registering its handler."""
+    key = get_request_session_key()
+    state = _session_transcriptions.get(key)
+    if state is None or state.client is not client:
+        if state is not None:
+            state.remove_handler()
+        state = SessionTranscriptions(client, key)
+        _session_transcriptions[key] = state
+    state.ensure_handler()
+    return state
+
+
+def _drop_session_transcriptions(token: str) -> None:
+    state = _session_transcriptions.pop(token, None)
+    if state is not None:
+        state.remove_handler()
+
+
+register_session_close_callback(_drop_session_transcriptions)
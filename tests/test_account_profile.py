@@ -0,0 +1,114 @@
+"""
+Tests for the per-session cached account profile.
+"""
+
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.tl.types import UpdateUser
+
+from src.client import connection, profile
+from src.server_components import bot_restrictions
+from src.utils import message_format
+
+# Captured at import: the shared conftest fixture replaces it with a mock
+_get_client_by_token = connection._get_client_by_token
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = MagicMock()
+    client.session = SimpleNamespace(dc_id=2)
+    client.get_me = AsyncMock(
+        return_value=SimpleNamespace(id=42, premium=True, bot=False)
+    )
+    monkeypatch.setattr(profile, "get_request_session_key", lambda: "profile-test")
+    monkeypatch.setattr(profile, "get_connected_client", AsyncMock(return_value=client))
+    profile._profiles.clear()
+    profile._update_handlers.clear()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_profile_is_loaded_once_per_session(client):
+    first = await profile.get_account_profile()
+    second = await profile.get_account_profile(client)
+
+    assert first is second
+    assert first.user_id == 42 and first.dc_id == 2
+    assert first.premium and not first.bot
+    assert await message_format._is_user_premium(client) is True
+    assert await bot_restrictions._is_bot_session(client) is False
+    client.get_me.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_update_user_for_self_reloads_profile(client):
+    await profile.get_account_profile()
+    handler = client.add_event_handler.call_args.args[0]
+
+    await handler(UpdateUser(user_id=7))
+    await profile.get_account_profile()
+    assert client.get_me.await_count == 1
+
+    client.get_me.return_value = SimpleNamespace(id=42, premium=False, bot=False)
+    await handler(UpdateUser(user_id=42))
+    assert (await profile.get_account_profile()).premium is False
+    assert client.get_me.await_count == 2
+    # One handler per session, however often the profile reloads
+    client.add_event_handler.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_expired_profile_is_reloaded(client):
+    loaded = await profile.get_account_profile()
+    profile._profiles["profile-test"] = (
+        client,
+        replace(loaded, loaded_at=loaded.loaded_at - profile.PROFILE_TTL_SECONDS),
+    )
+
+    await profile.get_account_profile()
+
+    assert client.get_me.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_profile_is_preloaded_and_dropped_with_session(client):
+    await connection._notify_session_opened("profile-test", client)
+    assert "profile-test" in profile._profiles
+
+    connection._notify_session_closed("profile-test")
+
+    assert "profile-test" not in profile._profiles
+    client.remove_event_handler.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_open_callbacks_run_outside_cache_lock(client, monkeypatch, tmp_path):
+    client.connect = AsyncMock()
+    client.is_user_authorized = AsyncMock(return_value=True)
+    monkeypatch.setattr(connection, "TelegramClient", lambda *a, **kw: client)
+    monkeypatch.setattr(connection, "SESSION_DIR", tmp_path)
+    monkeypatch.setattr(connection, "_session_cache", {})
+    lock_held = []
+
+    async def on_open(token, opened):
+        lock_held.append(connection._cache_lock.locked())
+
+    monkeypatch.setattr(connection, "_session_open_callbacks", [on_open])
+
+    assert await _get_client_by_token("lock-test") is client
+    assert await _get_client_by_token("lock-test") is client
+
+    # Run once, for the new client only, with other sessions free to proceed
+    assert lock_held == [False]
+
+
+@pytest.mark.asyncio
+async def test_lookup_failures_keep_safe_defaults(client):
+    client.get_me.side_effect = ConnectionError("offline")
+
+    assert await message_format._is_user_premium(client) is False
+    assert await bot_restrictions._is_bot_session(client) is False
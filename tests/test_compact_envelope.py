@@ -0,0 +1,97 @@
+"""
+Tests for the compact response envelope (shared entity table).
+"""
+
+import json
+
+from src.utils.message_format import compact_messages, compact_response
+
+CHAT = {"id": 1001, "title": "Release Notes", "type": "channel", "username": "notes"}
+ALICE = {"id": 7, "title": "Alice Example", "type": "private", "username": "alice"}
+BOB = {"id": 8, "title": "Bob Example", "type": "private", "username": "bob"}
+
+
+def _message(message_id, sender, **extra):
+    return {
+        "id": message_id,
+        "date": "2024-01-15T10:30:00",
+        "chat": dict(CHAT),
+        "text": f"message {message_id}",
+        "link": f"https://t.me/notes/{message_id}",
+        "sender": dict(sender) if sender else None,
+        **extra,
+    }
+
+
+def test_entities_listed_once_and_referenced_by_id():
+    messages = [_message(1, ALICE), _message(2, BOB), _message(3, ALICE)]
+
+    compacted, entities = compact_messages(messages)
+
+    assert entities == {"channel:1001": CHAT, "private:7": ALICE, "private:8": BOB}
+    assert [(m["chat_ref"], m["sender_ref"]) for m in compacted] == [
+        ("channel:1001", "private:7"),
+        ("channel:1001", "private:8"),
+        ("channel:1001", "private:7"),
+    ]
+    assert all("chat" not in m and "sender" not in m for m in compacted)
+    # Input messages are left untouched
+    assert messages[0]["chat"] == CHAT
+
+
+def test_forwarded_from_and_missing_sender():
+    forwarded = _message(
+        4, None, forwarded_from={"sender": BOB, "chat": None, "date": "2024-01-01"}
+    )
+
+    (compacted,), entities = compact_messages([forwarded])
+
+    assert "sender_ref" not in compacted
+    assert compacted["forwarded_from"] == {
+        "sender_ref": "private:8",
+        "date": "2024-01-01",
+    }
+    assert set(entities) == {"channel:1001", "private:8"}
+
+
+def test_sender_without_id_stays_inline():
+    message = _message(5, None)
+    message["sender"] = {"error": "Sender not found"}
+
+    (compacted,), _ = compact_messages([message])
+
+    assert compacted["sender"] == {"error": "Sender not found"}
+
+
+def test_compact_response_keeps_other_keys():
+    response = compact_response({"messages": [_message(1, ALICE)], "has_more": True})
+    assert response["has_more"] is True
+    assert set(response["entities"]) == {"channel:1001", "private:7"}
+
+
+def test_user_and_channel_with_same_id_stay_apart():
+    channel = {"id": 5, "title": "Five", "type": "channel"}
+    user = {"id": 5, "title": "Eve", "type": "private"}
+    message = {"id": 1, "chat": channel, "sender": user}
+    # Unresolved forward origins carry the Telethon class name as type
+    message["forwarded_from"] = {"sender": {"id": 5, "type": "User"}}
+
+    (compacted,), entities = compact_messages([message])
+
+    assert entities == {"channel:5": channel, "private:5": user}
+    assert (compacted["chat_ref"], compacted["sender_ref"]) == (
+        "channel:5",
+        "private:5",
+    )
+    assert compacted["forwarded_from"]["sender_ref"] == "private:5"
+
+
+def test_compact_envelope_is_smaller_for_single_chat_page():
+    """A 50-message page from one chat serializes far smaller when compact."""
+    messages = [_message(i, ALICE if i % 2 else BOB) for i in range(50)]
+
+    full_size = len(json.dumps({"messages": messages}))
+    compacted, entities = compact_messages(messages)
+    compact_size = len(json.dumps({"messages": compacted, "entities": entities}))
+
+    assert compact_size < full_size * 0.6
@@ -0,0 +1,127 @@
+"""
+Tests for NDJSON chat history export with checkpointed resume.
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.tools import export
+from src.tools.export import export_chat_history_impl
+
+
+class _History:
+    """Fake client serving ids newest-first below offset_id."""
+
+    def __init__(self, newest_id):
+        self.newest_id = newest_id
+
+    def iter_messages(self, entity, limit=None, offset_id=0, wait_time=None):
+        start = offset_id - 1 if offset_id else self.newest_id
+        ids = list(range(start, 0, -1))[:limit]
+
+        async def gen():
+            for message_id in ids:
+                message = MagicMock()
+                message.id = message_id
+                yield message
+
+        return gen()
+
+
+@pytest.fixture
+def export_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        export, "get_config", lambda: SimpleNamespace(session_directory=tmp_path)
+    )
+    monkeypatch.setattr(export, "get_request_session_key", lambda: "session")
+    return export.get_export_dir("session")
+
+
+@pytest.fixture
+def patched(monkeypatch, export_dir):
+    entity = MagicMock(id=555)
+    client = _History(newest_id=250)
+    monkeypatch.setattr(export, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(export, "get_entity_by_id", AsyncMock(return_value=entity))
+    monkeypatch.setattr(export, "_get_chat_message_count", AsyncMock(return_value=250))
+    monkeypatch.setattr(export, "compute_entity_identifier", lambda e: "555")
+    monkeypatch.setattr(export, "build_entity_dict", lambda e: {"id": 555})
+
+    async def fake_build(client, message, entity, link, forward_origins=None):
+        return {"id": message.id}
+
+    monkeypatch.setattr(export, "build_message_result", fake_build)
+    return client
+
+
+def _ids(path):
+    return [json.loads(line)["id"] for line in path.read_text().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_export_writes_ndjson_and_clears_checkpoint(patched, export_dir):
+    out = export_dir / "chat.ndjson"
+
+    result = await export_chat_history_impl("555", "chat.ndjson", use_takeout=False)
+
+    assert result["complete"] is True
+    assert result["exported"] == 250
+    assert _ids(out) == list(range(250, 0, -1))
+    assert not (export_dir / "chat.ndjson.checkpoint.json").exists()
+
+
+@pytest.mark.asyncio
+async def test_export_resumes_from_checkpoint(patched, export_dir):
+    out = export_dir / "chat.ndjson"
+
+    first = await export_chat_history_impl(
+        "555", "chat.ndjson", limit=120, use_takeout=False
+    )
+    assert first["complete"] is False
+    checkpoint = json.loads((export_dir / "chat.ndjson.checkpoint.json").read_text())
+    assert checkpoint == {"chat_id": 555, "offset_id": 131, "exported": 120}
+
+    second = await export_chat_history_impl("555", "chat.ndjson", use_takeout=False)
+
+    assert second["complete"] is True
+    assert second["exported"] == 250
+    assert second["exported_this_call"] == 130
+    assert _ids(out) == list(range(250, 0, -1))
+
+
+@pytest.mark.asyncio
+async def test_export_ending_on_limit_is_complete(patched, export_dir):
+    result = await export_chat_history_impl("555", limit=250, use_takeout=False)
+
+    assert result["complete"] is True
+    assert result["exported"] == 250
+    assert _ids(export_dir / "555.ndjson") == list(range(250, 0, -1))
+    assert not (export_dir / "555.ndjson.checkpoint.json").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "output_path", ["../other/chat.ndjson", "/etc/passwd", "sub/../../x.ndjson", "."]
+)
+async def test_export_rejects_paths_outside_export_dir(
+    patched, export_dir, tmp_path, output_path
+):
+    result = await export_chat_history_impl("555", output_path, use_takeout=False)
+
+    assert result["ok"] is False
+    assert "export directory" in result["error"]
+    assert not (tmp_path / "other").exists()
+
+
+def test_sessions_export_to_separate_directories(export_dir):
+    assert export.get_export_dir("token-a") != export.get_export_dir("token-b")
+    assert "token-a" not in str(export.get_export_dir("token-a"))
+
+
+def test_exports_live_under_the_session_directory(export_dir, tmp_path):
+    # Same volume as the session files, so checkpoints survive a restart
+    assert export_dir.parent == tmp_path / "exports"
+
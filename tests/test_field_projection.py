@@ -0,0 +1,102 @@
+"""
+Tests for fields= projection of message results.
+"""
+
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.utils import message_format
+from src.utils.message_format import (
+    build_message_result,
+    normalize_fields,
+    project_message,
+)
+
+
+def _message():
+    return SimpleNamespace(
+        id=42,
+        date=datetime(2024, 1, 1, tzinfo=UTC),
+        text="hello",
+        sender_id=7,
+        reply_to=None,
+        reply_to_msg_id=None,
+        media=None,
+        forward=SimpleNamespace(date=None, from_id=None),
+        reply_markup=None,
+    )
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    sender = AsyncMock(return_value={"id": 7})
+    forward = AsyncMock(return_value={"date": None})
+    monkeypatch.setattr(message_format, "get_sender_info", sender)
+    monkeypatch.setattr(message_format, "_extract_forward_info", forward)
+    monkeypatch.setattr(
+        message_format, "build_entity_dict", lambda e: {"id": e.id, "type": "channel"}
+    )
+    return sender, forward
+
+
+@pytest.mark.asyncio
+async def test_projection_skips_sender_and_forward_lookups(lookups):
+    sender, forward = lookups
+    fields = normalize_fields(["id", "date", "text", "link"])
+
+    result = await build_message_result(
+        None, _message(), SimpleNamespace(id=1), "https://t.me/c/1/42", fields=fields
+    )
+
+    assert result == {
+        "id": 42,
+        "date": "2024-01-01T00:00:00+00:00",
+        "chat": {"id": 1, "type": "channel"},
+        "text": "hello",
+        "link": "https://t.me/c/1/42",
+    }
+    sender.assert_not_awaited()
+    forward.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_no_projection_builds_every_field(lookups):
+    sender, forward = lookups
+
+    result = await build_message_result(None, _message(), SimpleNamespace(id=1), None)
+
+    assert list(result) == [
+        "id",
+        "date",
+        "chat",
+        "text",
+        "link",
+        "sender",
+        "forwarded_from",
+    ]
+    sender.assert_awaited_once()
+    forward.assert_awaited_once()
+
+
+def test_normalize_fields():
+    assert normalize_fields(None) is None
+    assert normalize_fields("text, link") == {"id", "chat", "text", "link"}
+    assert "media" in normalize_fields(["transcription"])
+    with pytest.raises(ValueError, match="bogus"):
+        normalize_fields(["text", "bogus"])
+
+
+def test_project_message_keeps_errors_whole():
+    fields = normalize_fields(["text"])
+    assert project_message(
+        {"id": 1, "chat": {}, "sender": {}, "text": "x"}, fields
+    ) == {
+        "id": 1,
+        "chat": {},
+        "text": "x",
+    }
+    error = {"id": 1, "error": "Message not found"}
+    assert project_message(error, fields) is error
@@ -0,0 +1,195 @@
+"""
+Tests for folder-scoped global search.
+"""
+
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telethon.tl.types import (
+    Channel,
+    DialogFilter,
+    DialogFilterDefault,
+    InputPeerChannel,
+    InputPeerSelf,
+    InputPeerUser,
+    PeerNotifySettings,
+    TextWithEntities,
+    User,
+)
+from telethon.tl.types.messages import DialogFilters
+
+from src.tools import search
+from src.tools.search import search_messages_impl
+
+
+def _work_folder():
+    return DialogFilter(
+        id=3,
+        title=TextWithEntities(text="Work", entities=[]),
+        pinned_peers=[InputPeerSelf()],
+        include_peers=[
+            InputPeerChannel(channel_id=100, access_hash=1),
+            InputPeerUser(user_id=42, access_hash=2),
+        ],
+        exclude_peers=[],
+    )
+
+
+def _channels_folder():
+    return DialogFilter(
+        id=4,
+        title=TextWithEntities(text="Channels", entities=[]),
+        pinned_peers=[],
+        include_peers=[InputPeerUser(user_id=42, access_hash=2)],
+        exclude_peers=[InputPeerChannel(channel_id=102, access_hash=3)],
+        broadcasts=True,
+        exclude_muted=True,
+    )
+
+
+def _dialog(entity, muted=False):
+    mute_until = datetime.now(UTC) + timedelta(days=1) if muted else None
+    return SimpleNamespace(
+        id=-1000000000000 - entity.id if isinstance(entity, Channel) else entity.id,
+        entity=entity,
+        archived=False,
+        unread_count=0,
+        dialog=SimpleNamespace(
+            unread_mark=False,
+            notify_settings=PeerNotifySettings(mute_until=mute_until),
+        ),
+    )
+
+
+def _broadcast(channel_id):
+    return Channel(id=channel_id, title="C", photo=None, date=None, broadcast=True)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = AsyncMock(
+        return_value=DialogFilters(
+            filters=[DialogFilterDefault(), _work_folder(), _channels_folder()]
+        )
+    )
+    dialogs = [
+        _dialog(_broadcast(100)),
+        _dialog(_broadcast(101), muted=True),
+        _dialog(_broadcast(102)),
+        _dialog(Channel(id=103, title="G", photo=None, date=None, megagroup=True)),
+        _dialog(User(id=42, first_name="Bob")),
+    ]
+
+    async def iter_dialogs():
+        for dialog in dialogs:
+            yield dialog
+
+    client.iter_dialogs = iter_dialogs
+
+    async def get_entity(peers):
+        # Entities built from the InputPeers themselves, never from id strings
+        assert all(not isinstance(peer, str) for peer in peers)
+        return [
+            User(id=0, is_self=True)
+            if isinstance(peer, InputPeerSelf)
+            else _broadcast(peer.channel_id)
+            if isinstance(peer, InputPeerChannel)
+            else User(id=peer.user_id, access_hash=peer.access_hash)
+            for peer in peers
+        ]
+
+    client.get_entity = AsyncMock(side_effect=get_entity)
+    monkeypatch.setattr(search, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(search, "get_request_session_key", lambda: "folder-test")
+    search._dialog_filters_cache.clear()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_custom_folder_uses_multi_chat_path(client, monkeypatch):
+    multi = AsyncMock(return_value={"messages": [{"id": 1}], "has_more": False})
+    monkeypatch.setattr(search, "search_messages_in_chats_impl", multi)
+
+    result = await search_messages_impl("invoice", folder="work")
+
+    assert multi.await_args.kwargs["chat_ids"] == ["me", "-1000000000100", "42"]
+    assert result["folder"]["title"] == "Work"
+    # The folder's peers are resolved in one batch and handed over as entities
+    client.get_entity.assert_awaited_once()
+    entities = multi.await_args.kwargs["resolved_entities"]
+    assert entities["42"].access_hash == 2
+    assert entities["-1000000000100"].id == 100
+
+
+@pytest.mark.asyncio
+async def test_custom_folder_forwards_total_count(client, monkeypatch):
+    multi = AsyncMock(return_value={"messages": [], "has_more": False})
+    monkeypatch.setattr(search, "search_messages_in_chats_impl", multi)
+
+    await search_messages_impl("invoice", folder="work", include_total_count=True)
+
+    assert multi.await_args.kwargs["include_total_count"] is True
+
+
+@pytest.mark.asyncio
+async def test_custom_folder_rejects_relevance_rank(client, monkeypatch):
+    multi = AsyncMock()
+    monkeypatch.setattr(search, "search_messages_in_chats_impl", multi)
+
+    result = await search_messages_impl("invoice", folder="work", rank="relevance")
+
+    assert result["ok"] is False
+    assert "not available for custom folders" in result["error"]
+    multi.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_category_folder_applies_flags_and_exclusions(client, monkeypatch):
+    multi = AsyncMock(return_value={"messages": [], "has_more": False})
+    monkeypatch.setattr(search, "search_messages_in_chats_impl", multi)
+
+    await search_messages_impl("news", folder="Channels")
+
+    # Broadcasts that are not muted or excluded, plus the explicitly included user
+    assert multi.await_args.kwargs["chat_ids"] == ["42", "-1000000000100"]
+
+
+@pytest.mark.asyncio
+async def test_dialog_filters_are_cached(client, monkeypatch):
+    monkeypatch.setattr(
+        search,
+        "search_messages_in_chats_impl",
+        AsyncMock(return_value={"messages": [], "has_more": False}),
+    )
+
+    await search_messages_impl("a", folder="Work")
+    await search_messages_impl("b", folder="3")
+
+    assert client.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_archive_maps_to_folder_id(client, monkeypatch):
+    seen = {}
+
+    async def fake_generator(*args, folder_id=None, **kwargs):
+        seen["folder_id"] = folder_id
+        yield {"id": 1, "chat": {"id": 1}}
+
+    monkeypatch.setattr(search, "_search_global_messages_generator", fake_generator)
+    monkeypatch.setattr(search, "index_results", lambda *a, **k: None)
+
+    result = await search_messages_impl("x", folder="Archive", limit=5)
+
+    assert seen["folder_id"] == search.ARCHIVE_FOLDER_ID
+    assert result["messages"] == [{"id": 1, "chat": {"id": 1}}]
+
+
+@pytest.mark.asyncio
+async def test_unknown_folder_lists_available(client):
+    result = await search_messages_impl("x", folder="Nope")
+
+    assert result["ok"] is False
+    assert "Archive, Work, Channels" in result["error"]
@@ -0,0 +1,109 @@
+"""
+Tests for batched forward-origin resolution.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telethon.tl.types import Channel, PeerChannel, PeerUser
+
+from src.utils import entity as entity_module
+from src.utils.entity import _extract_forward_info, resolve_forward_origins
+from src.utils.message_format import prefetch_forward_origins
+
+
+def _forwarded(from_id=None, saved_from_peer=None, from_name=None):
+    return SimpleNamespace(
+        forward=SimpleNamespace(
+            date=None,
+            from_id=from_id,
+            saved_from_peer=saved_from_peer,
+            from_name=from_name,
+        )
+    )
+
+
+def _channel(channel_id):
+    return Channel(
+        id=channel_id,
+        title="Source",
+        photo=None,
+        date=None,
+        broadcast=True,
+        username="source",
+    )
+
+
+@pytest.fixture
+def lookup(monkeypatch):
+    async def get_entities_by_ids(ids):
+        return {
+            peer_id: _channel(-peer_id - 1000000000000) if peer_id < 0 else None
+            for peer_id in ids
+        }
+
+    lookup = AsyncMock(side_effect=get_entities_by_ids)
+    monkeypatch.setattr(entity_module, "get_entities_by_ids", lookup)
+    return lookup
+
+
+@pytest.mark.asyncio
+async def test_page_from_one_source_resolves_it_once(lookup):
+    messages = [
+        _forwarded(PeerChannel(77), saved_from_peer=PeerChannel(77)) for _ in range(20)
+    ]
+
+    origins = await prefetch_forward_origins(messages)
+    infos = [await _extract_forward_info(m, origins) for m in messages]
+
+    lookup.assert_awaited_once_with([-1000000000077])
+    assert all(info["sender"]["id"] == 77 for info in infos)
+    assert infos[0]["chat"] is infos[-1]["chat"]
+
+
+@pytest.mark.asyncio
+async def test_stream_reuses_resolved_origins(lookup):
+    origins = {}
+    for _ in range(3):
+        await resolve_forward_origins([_forwarded(PeerChannel(5))], origins)
+
+    assert lookup.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unresolved_origin_gets_its_own_fallback(lookup):
+    first = await _extract_forward_info(_forwarded(PeerUser(9)))
+    second = await _extract_forward_info(_forwarded(PeerUser(9)))
+
+    assert first["sender"] == {
+        "id": 9,
+        "title": None,
+        "type": "User",
+        "username": None,
+        "first_name": None,
+        "last_name": None,
+    }
+    assert second["sender"] == first["sender"]
+    # Results are edited downstream (projection, compaction): never shared
+    first["sender"]["title"] = "changed"
+    assert second["sender"]["title"] is None
+
+
+@pytest.mark.asyncio
+async def test_hidden_sender_needs_no_lookup(lookup):
+    info = await _extract_forward_info(_forwarded(from_name="Anonymous Fox"))
+
+    assert info["sender"]["title"] == "Anonymous Fox"
+    assert info["sender"]["id"] is None
+    lookup.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_projection_without_forwards_skips_prefetch(lookup):
+    origins = await prefetch_forward_origins(
+        [_forwarded(PeerChannel(1))], frozenset({"id", "text"})
+    )
+
+    assert origins == {}
+    lookup.assert_not_awaited()
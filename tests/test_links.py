@@ -6,15 +6,19 @@ Tests the links.py module including link generation for public/private chats,
 query parameter handling, entity resolution, and error cases.
 """
 
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
 from src.tools.links import (
+    MessageLinkBuilder,
     _build_query_string,
     _normalize_channel_id,
     _resolve_entity_for_links,
     generate_telegram_links,
+    message_link,
+    message_link_prefix,
 )
 
 
@@ -364,3 +368,65 @@ class TestGenerateTelegramLinks:
             await generate_telegram_links("test", [123])
 
         assert "Test error" in str(exc_info.value)
+
+
+class TestMessageLinkBuilder:
+    """Test the synchronous per-chat link prefix builder."""
+
+    def test_public_prefix(self):
+        entity = SimpleNamespace(id=123456789, username="@testchannel")
+        assert message_link_prefix(entity) == "https://t.me/testchannel"
+        assert (
+            message_link("https://t.me/testchannel", 5) == "https://t.me/testchannel/5"
+        )
+
+    def test_private_prefix(self):
+        entity = SimpleNamespace(id=-1001234567890, username=None)
+        assert message_link_prefix(entity) == "https://t.me/c/1234567890"
+
+    def test_missing_entity(self):
+        assert message_link_prefix(None) is None
+        assert message_link(None, 5) is None
+
+    @pytest.mark.asyncio
+    async def test_matches_generate_telegram_links(self):
+        """Builder links are identical to generate_telegram_links output."""
+        builder = MessageLinkBuilder()
+        for entity in (
+            SimpleNamespace(id=1234567890, username="testchannel"),
+            SimpleNamespace(id=-1009876543210, username=None),
+        ):
+            expected = await generate_telegram_links(
+                "x", [7, 8], resolved_entity=entity
+            )
+            assert [
+                builder.link(entity, 7),
+                builder.link(entity, 8),
+            ] == expected["message_links"]
+
+    def test_prefix_computed_once_per_chat(self, monkeypatch):
+        calls = []
+
+        def counting_prefix(entity):
+            calls.append(entity.id)
+            return f"https://t.me/c/{entity.id}"
+
+        monkeypatch.setattr("src.tools.links.message_link_prefix", counting_prefix)
+        builder = MessageLinkBuilder()
+        chats = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+        links = [builder.link(chats[i % 2], i) for i in range(10)]
+
+        assert calls == [1, 2]
+        assert links[3] == "https://t.me/c/2/3"
+
+    def test_builder_needs_no_entity_resolution(self, monkeypatch):
+        """Links of a page are plain string formatting: nothing is resolved or awaited."""
+        resolve = AsyncMock()
+        monkeypatch.setattr("src.tools.links._resolve_entity_for_links", resolve)
+        entity = SimpleNamespace(id=1234567890, username=None)
+        builder = MessageLinkBuilder()
+
+        links = [builder.link(entity, msg_id) for msg_id in range(2000)]
+
+        resolve.assert_not_called()
+        assert links[1999] == "https://t.me/c/1234567890/1999"
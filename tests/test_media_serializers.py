@@ -0,0 +1,229 @@
+"""
+Tests for the type-keyed media and reply markup serializers.
+"""
+
+import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from telethon.tl import types
+from telethon.tl.types import (
+    Document,
+    DocumentAttributeAudio,
+    DocumentAttributeFilename,
+    GeoPoint,
+    MessageMediaDocument,
+    MessageMediaGeo,
+    MessageMediaPhoto,
+    MessageMediaPoll,
+    Poll,
+    PollAnswer,
+    PollAnswerVoters,
+    PollResults,
+    TextWithEntities,
+)
+
+from src.utils import message_format
+from src.utils.message_format import (
+    _build_media_placeholder,
+    _extract_reply_markup,
+    _has_any_media,
+    _TypeRegistry,
+)
+
+
+def _voice_media():
+    return MessageMediaDocument(
+        document=Document(
+            id=1,
+            access_hash=2,
+            file_reference=b"",
+            date=datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+            mime_type="audio/ogg",
+            size=4096,
+            dc_id=2,
+            attributes=[
+                DocumentAttributeAudio(duration=7, voice=True),
+                DocumentAttributeFilename(file_name="note.ogg"),
+            ],
+        )
+    )
+
+
+class TestTypeRegistry:
+    def test_real_tl_objects_are_keyed_by_constructor(self):
+        registry = _TypeRegistry()
+        registry.add(["MessageMediaGeo"], "geo")
+        # Same constructor, different class name: still found
+        renamed = type(
+            "Renamed", (), {"CONSTRUCTOR_ID": MessageMediaGeo.CONSTRUCTOR_ID}
+        )
+        assert registry.get(renamed()) == "geo"
+
+    def test_class_name_fallback_for_other_layers(self):
+        registry = _TypeRegistry()
+        registry.add(["MessageMediaFromAnotherLayer"], "other")
+        obj = MagicMock()
+        obj.__class__.__name__ = "MessageMediaFromAnotherLayer"
+        assert registry.get(obj) == "other"
+        assert registry.get(object()) is None
+
+
+class TestMediaPlaceholders:
+    def test_voice_document(self):
+        placeholder = _build_media_placeholder(SimpleNamespace(media=_voice_media()))
+        assert placeholder == {
+            "filename": "note.ogg",
+            "type": "voice",
+            "duration_seconds": 7,
+            "mime_type": "audio/ogg",
+            "approx_size_bytes": 4096,
+        }
+
+    def test_unregistered_media_uses_generic_path(self):
+        media = MessageMediaGeo(geo=GeoPoint(long=1.0, lat=2.0, access_hash=0))
+        assert _has_any_media(SimpleNamespace(media=media))
+        assert _build_media_placeholder(SimpleNamespace(media=media)) is None
+
+    def test_has_any_media(self):
+        assert _has_any_media(SimpleNamespace(media=MessageMediaPhoto()))
+        assert not _has_any_media(SimpleNamespace(media=None))
+        assert not _has_any_media(SimpleNamespace(media=object()))
+
+    def test_new_media_type_is_one_registration(self, monkeypatch):
+        registry = _TypeRegistry()
+        registry.add(["MessageMediaGeo"], lambda media: {"type": "location"})
+        monkeypatch.setattr(message_format, "_MEDIA_SERIALIZERS", registry)
+        media = MessageMediaGeo(geo=GeoPoint(long=1.0, lat=2.0, access_hash=0))
+        assert _build_media_placeholder(SimpleNamespace(media=media)) == {
+            "type": "location"
+        }
+
+    def test_page_formatting_builds_no_registry(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("registry built while formatting")
+
+        monkeypatch.setattr(_TypeRegistry, "add", fail)
+        messages = [SimpleNamespace(media=_voice_media()) for _ in range(500)]
+
+        placeholders = [_build_media_placeholder(m) for m in messages]
+
+        assert all(_has_any_media(m) for m in messages)
+        assert all(p["type"] == "voice" for p in placeholders)
+
+
+def _poll_media(votes: dict[bytes, int], chosen=b"", correct=b"", total=None):
+    answers = [
+        PollAnswer(
+            text=TextWithEntities(text=f"Option {i}", entities=[]), option=option
+        )
+        for i, option in enumerate([b"0", b"1", b"2", b"3"])
+    ]
+    poll = Poll(
+        id=1,
+        question=TextWithEntities(text="Which?", entities=[]),
+        answers=answers,
+        hash=0,
+        quiz=bool(correct),
+    )
+    results = PollResults(
+        # Telegram lists only answers with votes, in no particular order
+        results=[
+            PollAnswerVoters(
+                option=option,
+                voters=count,
+                chosen=option == chosen or None,
+                correct=option == correct or None,
+            )
+            for option, count in reversed(votes.items())
+        ],
+        total_voters=sum(votes.values()) if total is None else total,
+    )
+    return MessageMediaPoll(poll=poll, results=results)
+
+
+class TestPollPlaceholder:
+    def test_results_are_joined_by_option_bytes(self):
+        media = _poll_media({b"1": 3, b"3": 1}, chosen=b"3", correct=b"1")
+
+        placeholder = _build_media_placeholder(SimpleNamespace(media=media))
+
+        options = placeholder["options"]
+        assert [o["voters"] for o in options] == [0, 3, 0, 1]
+        assert [o["percent"] for o in options] == [0.0, 75.0, 0.0, 25.0]
+        assert [o["chosen"] for o in options] == [False, False, False, True]
+        assert [o["correct"] for o in options] == [False, True, False, False]
+        assert placeholder["total_voters"] == 4
+        assert placeholder["quiz"] is True
+
+    def test_poll_without_results(self):
+        media = _poll_media({})
+        media.results = None
+
+        placeholder = _build_media_placeholder(SimpleNamespace(media=media))
+
+        assert placeholder["total_voters"] == 0
+        assert all(
+            o["voters"] == 0 and o["percent"] == 0.0 for o in placeholder["options"]
+        )
+
+    def test_results_are_read_once_per_poll(self):
+        media = _poll_media({b"0": 120000, b"1": 30000, b"2": 5000, b"3": 2})
+        reads = []
+
+        class CountingResults(list):
+            def __iter__(self):
+                reads.append(1)
+                return super().__iter__()
+
+        media.results.results = CountingResults(media.results.results)
+
+        placeholder = _build_media_placeholder(SimpleNamespace(media=media))
+
+        # Joined through one lookup table, not rescanned for every answer
+        assert len(reads) == 1
+        assert [o["voters"] for o in placeholder["options"]] == [120000, 30000, 5000, 2]
+
+
+def test_typed_inline_buttons():
+    if not hasattr(types, "KeyboardInlineButton"):
+        pytest.skip("Telethon layer without typed inline buttons")
+    markup = types.ReplyInlineMarkup(
+        rows=[
+            types.KeyboardInlineButtonRow(
+                buttons=[
+                    types.KeyboardInlineButton(
+                        text="Open", type=types.InlineButtonTypeUrl(url="https://x.y")
+                    ),
+                    types.KeyboardInlineButton(
+                        text="Vote",
+                        type=types.InlineButtonTypeCallback(data=b"up"),
+                    ),
+                    types.KeyboardInlineButton(
+                        text="Here",
+                        type=types.InlineButtonTypeSwitchInline(
+                            query="q", same_peer=True
+                        ),
+                    ),
+                ]
+            )
+        ]
+    )
+
+    result = _extract_reply_markup(SimpleNamespace(reply_markup=markup))
+
+    assert result == {
+        "type": "inline",
+        "rows": [
+            [
+                {"text": "Open", "type": "url", "url": "https://x.y"},
+                {"text": "Vote", "type": "callback_data", "data": "up"},
+                {
+                    "text": "Here",
+                    "type": "switch_inline_query_current_chat",
+                    "query": "q",
+                },
+            ]
+        ],
+    }
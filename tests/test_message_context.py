@@ -0,0 +1,92 @@
+"""
+Tests for get_message_context: the window around a message in one request.
+"""
+
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.tl.functions.messages import GetHistoryRequest
+from telethon.tl.types import (
+    Channel,
+    Message,
+    MessageEmpty,
+    PeerChannel,
+    PeerUser,
+    User,
+)
+
+from src.tools import messages as messages_module
+
+CHANNEL = Channel(
+    id=1, title="Team", photo=None, date=None, megagroup=True, username="team"
+)
+ALICE = User(id=7, first_name="Alice")
+
+
+def _message(message_id):
+    return Message(
+        id=message_id,
+        peer_id=PeerChannel(1),
+        date=datetime(2024, 1, 1, tzinfo=UTC),
+        message=f"message {message_id}",
+        from_id=PeerUser(7),
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = MagicMock()
+
+    async def history(request):
+        # Newest first, like Telegram; 49 was deleted
+        ids = range(52, 47, -1)
+        return MagicMock(
+            messages=[
+                MessageEmpty(id=i, peer_id=PeerChannel(1)) if i == 49 else _message(i)
+                for i in ids
+            ],
+            users=[ALICE],
+            chats=[CHANNEL],
+        )
+
+    client.side_effect = history
+    monkeypatch.setattr(
+        messages_module, "get_connected_client", AsyncMock(return_value=client)
+    )
+    monkeypatch.setattr(
+        messages_module, "get_entity_by_id", AsyncMock(return_value=CHANNEL)
+    )
+    monkeypatch.setattr(messages_module, "transcribe_voice_messages", AsyncMock())
+    monkeypatch.setattr(messages_module, "index_results", MagicMock())
+    return client
+
+
+@pytest.mark.asyncio
+async def test_window_is_one_history_request(client):
+    response = await messages_module.get_message_context_impl(
+        "@team", 50, before=2, after=2
+    )
+
+    (call,) = client.call_args_list
+    request = call.args[0]
+    assert isinstance(request, GetHistoryRequest)
+    assert (request.offset_id, request.add_offset, request.limit) == (50, -3, 5)
+
+    assert [m["id"] for m in response["messages"]] == [48, 50, 51, 52]
+    assert response["anchor_found"] is True
+    assert response["has_more_before"] is False
+    assert response["has_more_after"] is True
+    # Senders come from the response, not from separate lookups
+    assert response["messages"][0]["sender"]["title"] == "Alice"
+    messages_module.get_entity_by_id.assert_awaited_once_with("@team")
+
+
+@pytest.mark.asyncio
+async def test_window_size_is_validated(client):
+    result = await messages_module.get_message_context_impl(
+        "@team", 50, before=60, after=40
+    )
+
+    assert result["ok"] is False
+    client.assert_not_called()
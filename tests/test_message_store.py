@@ -0,0 +1,154 @@
+"""
+Tests for the local SQLite FTS5 message store.
+"""
+
+import pytest
+
+from src.utils.message_store import MessageStore, normalize_local_chat_id
+
+
+def _result(chat_id, message_id, text, date="2024-01-15T10:00:00+00:00", **chat):
+    return {
+        "id": message_id,
+        "date": date,
+        "chat": {"id": chat_id, "title": "Chat", "type": "channel", **chat},
+        "text": text,
+        "link": f"https://t.me/c/{chat_id}/{message_id}",
+        "sender": {"id": 42, "title": "Alice"},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(tmp_path / "test.messages.db")
+    yield store
+    store.close()
+
+
+class TestMessageStore:
+    def test_index_and_search_roundtrip(self, store):
+        written = store.index_messages(
+            [
+                _result(1, 10, "Release notes for version two"),
+                _result(1, 11, "Lunch plans"),
+                _result(2, 5, "Another release is coming"),
+            ]
+        )
+        assert written == 3
+
+        results = store.search(["release"])
+        assert {(r["chat"]["id"], r["id"]) for r in results} == {(1, 10), (2, 5)}
+        # Payload is returned unchanged
+        assert results[0]["link"].startswith("https://t.me/c/")
+
+    def test_upsert_replaces_text(self, store):
+        store.index_messages([_result(1, 10, "old words")])
+        store.index_messages([_result(1, 10, "new words")])
+
+        assert store.search(["old"]) == []
+        assert [r["text"] for r in store.search(["new"])] == ["new words"]
+        assert store.count_messages(1) == 1
+
+    def test_fts_syntax_phrase_prefix_and_or(self, store):
+        store.index_messages(
+            [
+                _result(1, 1, "quarterly budget review"),
+                _result(1, 2, "budget quarterly"),
+                _result(1, 3, "launching tomorrow"),
+            ]
+        )
+        assert [r["id"] for r in store.search(['"quarterly budget"'])] == [1]
+        assert [r["id"] for r in store.search(["launch*"])] == [3]
+        assert {r["id"] for r in store.search(["review", "launch*"])} == {1, 3}
+
+    def test_invalid_syntax_falls_back_to_phrase(self, store):
+        store.index_messages([_result(1, 1, "send an e-mail today")])
+        assert [r["id"] for r in store.search(["e-mail"])] == [1]
+
+    def test_filters(self, store):
+        store.index_messages(
+            [
+                _result(1, 1, "hello", date="2024-01-01T00:00:00+00:00"),
+                _result(
+                    2, 2, "hello", date="2024-02-01T00:00:00+00:00", username="pub"
+                ),
+            ]
+        )
+        assert [r["id"] for r in store.search(["hello"], chat_id=2)] == [2]
+        assert [r["id"] for r in store.search(["hello"], min_date="2024-01-15")] == [2]
+        assert [r["id"] for r in store.search(["hello"], public=True)] == [2]
+        assert [r["id"] for r in store.search(["hello"], public=False)] == [1]
+        assert store.search(["hello"], chat_types=["private"]) == []
+
+    def test_empty_query_lists_newest_first(self, store):
+        store.index_messages(
+            [
+                _result(1, 1, "a", date="2024-01-01T00:00:00+00:00"),
+                _result(1, 2, "b", date="2024-01-02T00:00:00+00:00"),
+            ]
+        )
+        assert [r["id"] for r in store.search([], chat_id=1)] == [2, 1]
+
+    def test_resolve_chat_id(self, store):
+        store.index_messages([_result(7, 1, "x", username="SomeChannel")])
+        store.set_meta("self_id", 99)
+
+        assert store.resolve_chat_id("@somechannel") == 7
+        assert store.resolve_chat_id("-1007") == 7
+        assert store.resolve_chat_id("me") == 99
+        assert store.resolve_chat_id("unknown") is None
+
+    def test_error_results_are_skipped(self, store):
+        written = store.index_messages(
+            [{"id": 1, "chat": {"id": 1}, "error": "Message not found"}]
+        )
+        assert written == 0
+
+
+def test_normalize_local_chat_id():
+    assert normalize_local_chat_id("-1001234") == 1234
+    assert normalize_local_chat_id("-55") == 55
+    assert normalize_local_chat_id(77) == 77
+    assert normalize_local_chat_id("username") is None
+
+
+class TestIncrementalSyncState:
+    def test_delete_common_box_keeps_channel_rows(self, store):
+        store.index_messages(
+            [
+                _result(1, 10, "private", type="private"),
+                _result(2, 10, "channel post"),
+            ]
+        )
+        assert store.delete_common_box_messages([10]) == 1
+        assert [r["chat"]["id"] for r in store.search(["channel"])] == [2]
+        assert store.delete_messages(2, [10]) == 1
+        assert store.count_messages() == 0
+
+    def test_tracked_chats_keep_pts_and_backlog(self, store):
+        store.track_chat(5, "channel", 100)
+        store.track_chat(5, "channel", None)
+        store.update_tracked_chat(5, pts=120, backlog=3)
+
+        (chat,) = store.get_tracked_chats()
+        assert chat["chat_id"] == 5
+        assert chat["pts"] == 120
+        assert chat["backlog"] == 3
+        assert chat["last_synced_at"] is not None
+
+    def test_synced_ranges_merge_and_report_gaps(self, store):
+        assert store.get_sync_gaps(5) == [(0, None)]
+
+        store.add_synced_range(5, 901, 1000)
+        store.add_synced_range(5, 401, 500)
+        assert store.get_sync_gaps(5) == [(1000, None), (500, 901), (0, 401)]
+
+        # Filling the hole joins both ranges; backfilling to 1 completes history
+        store.add_synced_range(5, 501, 900)
+        store.add_synced_range(5, 1, 400)
+        assert store.get_synced_ranges(5) == [(1, 1000)]
+        assert store.get_sync_gaps(5) == [(1000, None)]
+
+    def test_passive_indexing_does_not_mark_synced(self, store):
+        store.index_messages([_result(5, 1000, "seen in a search")])
+        assert store.get_sync_gaps(5) == [(0, None)]
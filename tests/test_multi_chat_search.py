@@ -0,0 +1,255 @@
+"""
+Tests for multi-chat search fan-out, merge and per-chat cursors.
+"""
+
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.tools import search
+from src.tools.search import search_messages_in_chats_impl
+from src.utils.helpers import decode_cursor, encode_cursor
+
+BASE = datetime(2024, 1, 1, tzinfo=UTC)
+
+
+def _message(message_id, minutes):
+    message = MagicMock()
+    message.id = message_id
+    message.text = f"text {message_id}"
+    message.date = BASE + timedelta(minutes=minutes)
+    return message
+
+
+class _Client:
+    """Serves per-chat histories newest first, honoring offset_id and limit."""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.calls = []
+
+    async def get_messages(self, entity, search, limit, offset_id, offset_date, **kw):
+        self.calls.append((entity.id, offset_id))
+        history = self.histories[entity.id]
+        if offset_id:
+            history = [m for m in history if m.id < offset_id]
+        return history[:limit]
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    chats = {"a": MagicMock(id=1), "b": MagicMock(id=2)}
+    client = _Client(
+        {
+            # chat 1 is busy: recent messages; chat 2 has two older ones
+            1: [_message(i, 100 + i) for i in range(10, 0, -1)],
+            2: [_message(2, 50), _message(1, 40)],
+        }
+    )
+    monkeypatch.setattr(search, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(search, "get_entities_by_ids", AsyncMock(return_value=chats))
+    monkeypatch.setattr(search, "transcribe_voice_messages", AsyncMock())
+    monkeypatch.setattr(search, "index_results", lambda *a, **k: None)
+
+    async def fake_build(
+        client, message, entity, link, fields=None, forward_origins=None
+    ):
+        return {"id": message.id, "chat": {"id": entity.id}}
+
+    monkeypatch.setattr(search, "build_message_result", fake_build)
+    return client
+
+
+def _keys(result):
+    return [(m["chat"]["id"], m["id"]) for m in result["messages"]]
+
+
+@pytest.mark.asyncio
+async def test_results_merged_by_date_with_per_chat_cursor(setup):
+    first = await search_messages_in_chats_impl(["a", "b"], query="x", limit=3)
+
+    assert _keys(first) == [(1, 10), (1, 9), (1, 8)]
+    # chat 2 was fully fetched but nothing returned yet: it resumes from the start
+    assert decode_cursor(first["cursor"]) == {"1:0": 8, "2:0": 0}
+
+    setup.calls.clear()
+    second = await search_messages_in_chats_impl(
+        ["a", "b"], query="x", limit=10, cursor=first["cursor"]
+    )
+    assert _keys(second) == [(1, i) for i in range(7, 0, -1)] + [(2, 2), (2, 1)]
+    assert second["has_more"] is False
+    assert second["cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_cursor_skips_exhausted_chats(setup):
+    cursor = encode_cursor({"1:0": 5})
+
+    result = await search_messages_in_chats_impl(["a", "b"], limit=10, cursor=cursor)
+
+    assert setup.calls == [(1, 5)]
+    assert _keys(result) == [(1, i) for i in range(4, 0, -1)]
+
+
+@pytest.mark.asyncio
+async def test_resolved_entities_skip_the_lookup(setup):
+    search.get_entities_by_ids.side_effect = AssertionError("looked up again")
+
+    result = await search_messages_in_chats_impl(
+        ["-1", "2"],
+        query="x",
+        limit=2,
+        resolved_entities={"-1": MagicMock(id=1), "2": None},
+    )
+
+    assert _keys(result) == [(1, 10), (1, 9)]
+    assert result["unresolved_chats"] == ["2"]
+
+
+@pytest.mark.asyncio
+async def test_empty_chat_list_is_an_error():
+    result = await search_messages_in_chats_impl([], query="x")
+    assert result["ok"] is False
+
+
+def test_cursor_roundtrip_and_validation():
+    assert decode_cursor(encode_cursor({"1:0": 42})) == {"1:0": 42}
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor!")
+
+
+@pytest.mark.asyncio
+async def test_get_entities_by_ids_falls_back_per_id(monkeypatch):
+    from src.utils import entity as entity_module
+
+    client = MagicMock()
+    client.get_entity = AsyncMock(side_effect=ValueError("unknown peer"))
+    monkeypatch.setattr(
+        entity_module, "get_connected_client", AsyncMock(return_value=client)
+    )
+    known = MagicMock(id=7)
+    monkeypatch.setattr(
+        entity_module,
+        "get_entity_by_id",
+        AsyncMock(side_effect=lambda i: known if i == "7" else None),
+    )
+
+    resolved = await entity_module.get_entities_by_ids(["7", "missing", "7"])
+
+    assert resolved == {"7": known, "missing": None}
+    client.get_entity.assert_awaited_once_with([7, "missing"])
+
+
+@pytest.mark.asyncio
+async def test_media_and_sender_filters_are_sent_to_telegram(setup, monkeypatch):
+    calls = []
+
+    async def get_messages(entity, **kwargs):
+        calls.append(kwargs)
+        return []
+
+    setup.get_messages = get_messages
+    alice = MagicMock(id=42)
+    monkeypatch.setattr(search, "get_entity_by_id", AsyncMock(return_value=alice))
+
+    await search_messages_in_chats_impl(
+        ["a"], media_type="document", from_user="@alice"
+    )
+
+    assert type(calls[0]["filter"]).__name__ == "InputMessagesFilterDocument"
+    assert calls[0]["from_user"] is alice
+
+
+def test_build_message_filter():
+    assert search.build_message_filter(None) is None
+    assert type(search.build_message_filter("Voice")).__name__ == (
+        "InputMessagesFilterVoice"
+    )
+    with pytest.raises(ValueError):
+        search.build_message_filter("pdf")
+
+
+@pytest.mark.asyncio
+async def test_from_user_requires_chat_for_global_search():
+    result = await search.search_messages_impl("x", from_user="@alice")
+    assert result["ok"] is False
+
+
+@pytest.mark.asyncio
+async def test_compact_results_reference_entity_table(setup, monkeypatch):
+    async def typed_build(client, message, entity, link, **kwargs):
+        return {"id": message.id, "chat": {"id": entity.id, "type": "channel"}}
+
+    monkeypatch.setattr(search, "build_message_result", typed_build)
+    result = await search_messages_in_chats_impl(
+        ["a", "b"], query="x", limit=12, compact=True
+    )
+
+    assert set(result["entities"]) == {"channel:1", "channel:2"}
+    assert [m["chat_ref"] for m in result["messages"]][-2:] == ["channel:2"] * 2
+    assert all("chat" not in m for m in result["messages"])
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_ends_page_and_cursor_resumes(setup):
+    # Envelope allowance plus room for three of the small fake results
+    result = await search_messages_in_chats_impl(
+        ["a", "b"], query="x", limit=10, max_response_bytes=351
+    )
+
+    assert _keys(result) == [(1, 10), (1, 9), (1, 8)]
+    assert result["has_more"] is True
+    assert decode_cursor(result["cursor"]) == {"1:0": 8, "2:0": 0}
+
+    rest = await search_messages_in_chats_impl(
+        ["a", "b"], query="x", limit=10, cursor=result["cursor"]
+    )
+    assert _keys(rest) == [(1, i) for i in range(7, 0, -1)] + [(2, 2), (2, 1)]
+
+
+@pytest.mark.asyncio
+async def test_collapse_duplicates_across_chats(setup):
+    text = "the same long announcement text was reposted in both of these chats"
+    setup.histories[1][0].message = text
+    setup.histories[2][0].message = text + " (repost)"
+
+    result = await search_messages_in_chats_impl(
+        ["a", "b"], query="x", limit=20, collapse_duplicates=True
+    )
+
+    first = result["messages"][0]
+    assert (first["chat"]["id"], first["id"]) == (1, 10)
+    assert first["duplicates"] == 1
+    assert len(first["duplicate_links"]) == 1
+    assert (2, 2) not in _keys(result)
+
+
+@pytest.mark.asyncio
+async def test_duplicates_of_budget_cut_results_are_served_later(setup):
+    text = "the same long announcement text was reposted in both of these chats"
+    setup.histories[1][1].message = text
+    # Chat 2's only hit folds into chat 1's message 9, which the budget cuts
+    setup.histories[2] = [_message(2, 50)]
+    setup.histories[2][0].message = text + " (repost)"
+
+    result = await search_messages_in_chats_impl(
+        ["a", "b"],
+        query="x",
+        limit=20,
+        collapse_duplicates=True,
+        max_response_bytes=250,
+    )
+
+    assert _keys(result) == [(1, 10)]
+    assert decode_cursor(result["cursor"]) == {"1:0": 10, "2:0": 0}
+
+    rest = await search_messages_in_chats_impl(
+        ["a", "b"],
+        query="x",
+        limit=20,
+        collapse_duplicates=True,
+        cursor=result["cursor"],
+    )
+    assert rest["messages"][0]["id"] == 9
+    assert rest["messages"][0]["duplicates"] == 1
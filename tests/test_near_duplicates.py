@@ -0,0 +1,80 @@
+"""
+Tests for near-duplicate collapsing of search results.
+"""
+
+import pytest
+
+from src.tools.search import _execute_parallel_searches_generators
+from src.utils.near_duplicates import (
+    MAX_HAMMING_DISTANCE,
+    NearDuplicateIndex,
+    attach_duplicate,
+    simhash,
+)
+
+STORY = (
+    "SpaceX has moved the Starship launch to Friday morning after a fuel "
+    "valve issue was found during the final inspection at the Texas site"
+)
+REPOST = STORY + " via @space_news_daily"
+OTHER = (
+    "The city council approved the new budget for public transport and "
+    "promised more night buses on weekends starting next month"
+)
+
+
+def test_simhash_close_for_reposts_and_far_for_other_texts():
+    assert (simhash(STORY) ^ simhash(REPOST)).bit_count() <= MAX_HAMMING_DISTANCE
+    assert (simhash(STORY) ^ simhash(OTHER)).bit_count() > 2 * MAX_HAMMING_DISTANCE
+    assert simhash(STORY) == simhash(STORY.upper())
+    assert simhash("ok thanks") is None
+
+
+def test_index_returns_first_representative():
+    index = NearDuplicateIndex()
+    assert index.match_or_add(STORY, "first") is None
+    assert index.match_or_add(OTHER, "other") is None
+    assert index.match_or_add(REPOST, "repost") == "first"
+    assert index.match_or_add(None, "media") is None
+    assert index.match_or_add("short text", "short") is None
+
+
+def test_attach_duplicate():
+    result = {"id": 1}
+    attach_duplicate(result, "https://t.me/a/1")
+    attach_duplicate(result, None)
+    assert result == {"id": 1, "duplicates": 2, "duplicate_links": ["https://t.me/a/1"]}
+
+
+async def _gen(results):
+    for result in results:
+        yield result
+
+
+def _result(chat_id, message_id, text):
+    return {
+        "id": message_id,
+        "chat": {"id": chat_id},
+        "text": text,
+        "link": f"https://t.me/c/{chat_id}/{message_id}",
+    }
+
+
+@pytest.mark.asyncio
+async def test_duplicates_do_not_take_result_slots():
+    generators = [
+        _gen([_result(1, 10, STORY), _result(1, 9, OTHER)]),
+        _gen([_result(2, 5, REPOST), _result(3, 7, REPOST), _result(1, 10, STORY)]),
+    ]
+    collected = []
+
+    await _execute_parallel_searches_generators(
+        generators, collected, set(), 5, NearDuplicateIndex()
+    )
+
+    assert [(r["chat"]["id"], r["id"]) for r in collected] == [(1, 10), (1, 9)]
+    assert collected[0]["duplicates"] == 2
+    assert collected[0]["duplicate_links"] == [
+        "https://t.me/c/2/5",
+        "https://t.me/c/3/7",
+    ]
@@ -0,0 +1,137 @@
+"""
+Tests for BM25 relevance ranking of search results.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.tools import search
+from src.utils.relevance import BM25Scorer, query_words, rank_by_relevance
+
+
+def test_query_words_split_and_deduplicate():
+    assert query_words(["Postgres replication", "lag, postgres"]) == [
+        "postgres",
+        "replication",
+        "lag",
+    ]
+
+
+def test_words_match_by_prefix_and_longest_word_wins():
+    scorer = BM25Scorer(["launch", "launches"])
+    frequencies, length = scorer.term_frequencies("Launches and launched, launch!")
+    assert frequencies == [2, 1]
+    assert length == 4
+
+
+def test_more_matching_terms_rank_higher():
+    results = [
+        {"id": 1, "text": "postgres is up"},
+        {"id": 2, "text": "nothing relevant here"},
+        {"id": 3, "text": "postgres replication lag is growing on the replica"},
+        {"id": 4, "transcription": "the replication lag again"},
+    ]
+
+    ranked = rank_by_relevance(results, ["postgres, replication, lag"])
+
+    assert [r["id"] for r in ranked] == [3, 4, 1, 2]
+    assert ranked[0]["relevance_score"] > ranked[1]["relevance_score"] > 0
+    assert ranked[-1]["relevance_score"] == 0
+
+
+def test_ties_keep_original_order():
+    results = [{"id": i, "text": "same words"} for i in range(5)]
+    assert [r["id"] for r in rank_by_relevance(results, ["same"])] == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_relevance_rank_overfetches_and_returns_top(monkeypatch):
+    seen_limits = []
+
+    async def fake_generator(client, entity, query, limit, *args, **kwargs):
+        seen_limits.append(limit)
+        for i in range(limit):
+            text = "deploy failed on staging" if i == 30 else f"message {i}"
+            yield {"id": 100 - i, "chat": {"id": 1}, "text": text}
+
+    monkeypatch.setattr(search, "get_connected_client", AsyncMock())
+    monkeypatch.setattr(search, "get_entity_by_id", AsyncMock(return_value=MagicMock()))
+    monkeypatch.setattr(search, "_search_chat_messages_generator", fake_generator)
+    monkeypatch.setattr(search, "transcribe_voice_messages", AsyncMock())
+    monkeypatch.setattr(search, "index_results", MagicMock())
+
+    response = await search.search_messages_impl(
+        "deploy, staging",
+        chat_id="me",
+        limit=10,
+        rank="relevance",
+        fields=["id", "date"],
+    )
+
+    assert seen_limits == [40, 40]
+    assert response["rank"] == "relevance"
+    assert response["messages"][0]["id"] == 70
+    assert "text" not in response["messages"][0]
+    assert response["messages"][0]["relevance_score"] > 0
+    assert len(response["messages"]) == 10
+    assert response["has_more"] is True
+
+
+@pytest.mark.asyncio
+async def test_transcribed_voice_messages_are_scored(monkeypatch):
+    voice = {"type": "voice"}
+
+    async def fake_generator(client, entity, query, limit, *args, **kwargs):
+        for i in range(limit):
+            yield {"id": 100 - i, "chat": {"id": 1}, "text": "", "media": voice}
+
+    async def fill_stored(results, entity):
+        # Message 95 was transcribed by an earlier call
+        for result in results:
+            if result["id"] == 95:
+                result["transcription"] = "the deploy failed on staging"
+
+    async def transcribe_page(results, entity, wait=True):
+        results[1]["transcription"] = "staging is back"
+
+    monkeypatch.setattr(search, "get_connected_client", AsyncMock())
+    monkeypatch.setattr(search, "get_entity_by_id", AsyncMock(return_value=MagicMock()))
+    monkeypatch.setattr(search, "_search_chat_messages_generator", fake_generator)
+    monkeypatch.setattr(search, "fill_cached_transcriptions", fill_stored)
+    monkeypatch.setattr(search, "transcribe_voice_messages", transcribe_page)
+    monkeypatch.setattr(search, "index_results", MagicMock())
+
+    response = await search.search_messages_impl(
+        "deploy, staging", chat_id="me", limit=3, rank="relevance"
+    )
+
+    scores = {m["id"]: m["relevance_score"] for m in response["messages"]}
+    assert response["messages"][0]["id"] == 95
+    # Transcribed while building the page, then rescored with its spoken words
+    assert scores[100] > 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_rank_is_rejected():
+    result = await search.search_messages_impl("x", chat_id="me", rank="popularity")
+    assert result["ok"] is False
+
+
+def test_each_candidate_is_scanned_once():
+    texts = ["postgres replication lag"] * search.MAX_RELEVANCE_CANDIDATES
+    scorer = BM25Scorer(query_words(["postgres, replication, lag, failover"]))
+    pattern = scorer.pattern
+    scans = []
+
+    class CountingPattern:
+        def finditer(self, text):
+            scans.append(text)
+            return pattern.finditer(text)
+
+    scorer.pattern = CountingPattern()
+    scores = scorer.score(texts)
+
+    # One pass per candidate however many query words there are
+    assert len(scans) == len(texts)
+    assert all(score > 0 for score in scores)
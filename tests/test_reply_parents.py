@@ -0,0 +1,129 @@
+"""
+Tests for include_reply_parents: replied-to messages fetched once per chat.
+"""
+
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.tl.types import PeerUser
+
+from src.tools import search
+from src.utils.message_format import REPLY_PREVIEW_CHARS, attach_reply_parents
+
+
+def _parent(message_id, text="parent text"):
+    return SimpleNamespace(
+        id=message_id,
+        date=datetime(2024, 1, 1, tzinfo=UTC),
+        sender=None,
+        sender_id=7,
+        message=text,
+        media=None,
+    )
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+
+    async def get_messages(entity, ids):
+        return [_parent(i, "x" * 500 if i == 3 else "parent text") for i in ids]
+
+    client.get_messages = AsyncMock(side_effect=get_messages)
+    client.get_input_entity = AsyncMock(side_effect=lambda peer: peer)
+    return client
+
+
+def _reply(message_id, parent_id, chat_id=1, chat_type="channel"):
+    return {
+        "id": message_id,
+        "chat": {"id": chat_id, "type": chat_type},
+        "reply_to_msg_id": parent_id,
+    }
+
+
+@pytest.mark.asyncio
+async def test_one_request_per_chat(client):
+    results = [
+        _reply(10, 1),
+        _reply(11, 1),
+        _reply(12, 2),
+        _reply(20, 3, chat_id=2, chat_type="private"),
+        {"id": 13, "chat": {"id": 1, "type": "channel"}},
+    ]
+    entity = SimpleNamespace(id=1)
+
+    await attach_reply_parents(client, results, {1: entity})
+
+    channel_call, private_call = client.get_messages.await_args_list
+    assert channel_call.args[0] is entity
+    assert channel_call.kwargs["ids"] == [1, 2]
+    # The private chat is resolved from Telethon's entity cache
+    assert private_call.args[0] == PeerUser(2)
+    assert private_call.kwargs["ids"] == [3]
+    assert [r["reply_to"]["id"] for r in results[:4]] == [1, 1, 2, 3]
+    assert "reply_to" not in results[4]
+    assert results[0]["reply_to"] == {
+        "id": 1,
+        "date": "2024-01-01T00:00:00+00:00",
+        "sender": {"id": 7},
+        "text": "parent text",
+    }
+    long_preview = results[3]["reply_to"]
+    assert len(long_preview["text"]) == REPLY_PREVIEW_CHARS + 1
+    assert long_preview["text_truncated"] is True
+
+
+@pytest.mark.asyncio
+async def test_deleted_parent_is_reported(client):
+    client.get_messages = AsyncMock(return_value=[None])
+    results = [_reply(10, 1)]
+
+    await attach_reply_parents(client, results)
+
+    assert results[0]["reply_to"] == {
+        "id": 1,
+        "error": "Message not found or inaccessible",
+    }
+
+
+@pytest.mark.asyncio
+async def test_search_projection_keeps_only_preview(monkeypatch, client):
+    async def fake_generator(client, entity, query, limit, *args, fields=None, **kw):
+        assert "reply_to_msg_id" in fields
+        for i in range(3):
+            yield {
+                "id": 100 - i,
+                "chat": {"id": 1, "type": "channel"},
+                "text": "hi",
+                "reply_to_msg_id": 50,
+            }
+
+    monkeypatch.setattr(search, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(
+        search, "get_entity_by_id", AsyncMock(return_value=SimpleNamespace(id=1))
+    )
+    monkeypatch.setattr(search, "_search_chat_messages_generator", fake_generator)
+
+    response = await search.search_messages_impl(
+        "",
+        chat_id="@team",
+        limit=3,
+        fields=["id", "text"],
+        include_reply_parents=True,
+    )
+
+    assert client.get_messages.await_count == 1
+    message = response["messages"][0]
+    assert set(message) == {"id", "chat", "text", "reply_to"}
+    assert message["reply_to"]["id"] == 50
+
+
+@pytest.mark.asyncio
+async def test_local_source_rejects_reply_parents():
+    result = await search.search_messages_impl(
+        "x", chat_id="me", source="local", include_reply_parents=True
+    )
+    assert result["ok"] is False
@@ -0,0 +1,79 @@
+"""
+Tests for byte-budgeted message responses.
+"""
+
+import json
+
+import pytest
+
+from src.tools.search import _apply_response_budget
+from src.utils.message_format import ResponseBudget, truncate_message_text
+
+
+def _result(message_id, text="x" * 100):
+    return {"id": message_id, "chat": {"id": 1}, "text": text}
+
+
+def _size(result):
+    return len(json.dumps(result, ensure_ascii=False).encode()) + 2
+
+
+def test_budget_admits_until_exceeded():
+    results = [_result(i) for i in range(10)]
+    budget = ResponseBudget(ResponseBudget.ENVELOPE_BYTES + 3 * _size(results[0]))
+
+    kept = budget.fit(results)
+
+    assert [r["id"] for r in kept] == [0, 1, 2]
+    assert budget.exhausted
+    assert not budget.admit(_result(99, text=""))
+
+
+def test_first_message_always_admitted():
+    assert ResponseBudget(1).fit([_result(1, "y" * 10_000)]) == [
+        _result(1, "y" * 10_000)
+    ]
+
+
+def test_multibyte_text_is_measured_in_bytes():
+    ascii_budget = ResponseBudget(10_000)
+    ascii_budget.admit(_result(1, "a" * 100))
+    utf8_budget = ResponseBudget(10_000)
+    utf8_budget.admit(_result(1, "я" * 100))
+
+    assert utf8_budget.used - ascii_budget.used == 100
+
+
+def test_text_truncation():
+    result = truncate_message_text(_result(1, "word " * 50), 12)
+    assert result["text"] == "word word wo…"
+    assert result["text_truncated"] is True
+    short = truncate_message_text(_result(2, "short"), 12)
+    assert "text_truncated" not in short
+
+
+def test_apply_response_budget_marks_omitted():
+    response = {"messages": [_result(i) for i in range(5)], "has_more": False}
+
+    _apply_response_budget(response, None, 40)
+
+    assert len(response["messages"]) == 5
+    assert response["has_more"] is False
+    assert all(m["text_truncated"] for m in response["messages"])
+
+    response = {"messages": [_result(i) for i in range(5)], "has_more": False}
+    _apply_response_budget(
+        response, ResponseBudget.ENVELOPE_BYTES + 2 * _size(_result(0)), None
+    )
+    assert len(response["messages"]) == 2
+    assert response["has_more"] is True
+    assert response["omitted_by_budget"] == 3
+
+
+@pytest.mark.parametrize("kwargs", [{"max_response_bytes": 0}, {"max_text_chars": -1}])
+@pytest.mark.asyncio
+async def test_invalid_budget_is_rejected(kwargs):
+    from src.tools.search import search_messages_impl
+
+    result = await search_messages_impl("x", chat_id="me", **kwargs)
+    assert result["ok"] is False
@@ -0,0 +1,79 @@
+"""
+Tests for batched per-chat search counters.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.tl.types import (
+    InputMessagesFilterEmpty,
+    InputMessagesFilterUrl,
+    InputMessagesFilterVoice,
+)
+from telethon.tl.types.messages import SearchCounter
+
+from src.utils import entity as entity_module
+from src.utils.entity import _get_chat_message_count, get_search_counters
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def respond(request):
+        return MagicMock(
+            counters=[
+                SearchCounter(filter=f, count=10 * (request.peer.id + i))
+                for i, f in enumerate(request.filters)
+            ]
+        )
+
+    client = AsyncMock(side_effect=respond)
+    monkeypatch.setattr(
+        entity_module, "get_connected_client", AsyncMock(return_value=client)
+    )
+    monkeypatch.setattr(entity_module, "get_request_session_key", lambda: "s")
+    entity_module._search_counters_cache.clear()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_one_request_per_chat_with_all_filters(client):
+    chats = [MagicMock(id=1), MagicMock(id=2)]
+
+    counts = await get_search_counters(chats, ["all", "voice", "links"])
+
+    assert client.await_count == 2
+    filters = [type(f) for f in client.await_args_list[0].args[0].filters]
+    assert filters == [
+        InputMessagesFilterEmpty,
+        InputMessagesFilterVoice,
+        InputMessagesFilterUrl,
+    ]
+    assert counts[1] == {"all": 10, "voice": 20, "links": 30}
+    assert counts[2] == {"all": 20, "voice": 30, "links": 40}
+
+
+@pytest.mark.asyncio
+async def test_cached_counts_are_not_requested_again(client):
+    chat = MagicMock(id=1)
+
+    await get_search_counters([chat], ["all"])
+    await get_search_counters([chat], ["all", "voice"])
+
+    assert client.await_count == 2
+    second = client.await_args_list[1].args[0]
+    assert [type(f) for f in second.filters] == [InputMessagesFilterVoice]
+
+
+@pytest.mark.asyncio
+async def test_total_count_reuses_resolved_entity(client, monkeypatch):
+    resolve = AsyncMock()
+    monkeypatch.setattr(entity_module, "get_entity_by_id", resolve)
+
+    assert await _get_chat_message_count("1", MagicMock(id=1)) == 10
+    resolve.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_unknown_filter_rejected(client):
+    with pytest.raises(ValueError):
+        await get_search_counters([MagicMock(id=1)], ["pdf"])
@@ -0,0 +1,94 @@
+"""
+Tests for compiled chat filters and their use in search generators.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.tl.types import Channel, PeerChannel, User
+
+from src.tools import search
+from src.utils.entity import ChatFilter
+
+
+def _channel(username=None, megagroup=False):
+    channel = MagicMock(spec=Channel)
+    channel.id = 10
+    channel.username = username
+    channel.megagroup = megagroup
+    channel.broadcast = not megagroup
+    channel.gigagroup = False
+    return channel
+
+
+def _user():
+    user = MagicMock(spec=User)
+    user.id = 5
+    user.username = None
+    user.bot = False
+    return user
+
+
+class TestChatFilter:
+    def test_compile_normalizes_types(self):
+        chat_filter = ChatFilter.compile(" Channel, group ")
+        assert chat_filter.chat_types == frozenset({"channel", "group"})
+        assert not chat_filter.invalid
+
+    def test_unknown_type_matches_nothing(self):
+        assert ChatFilter.compile("channel,bogus").matches(_channel()) is False
+
+    def test_no_filters_is_noop(self):
+        assert ChatFilter.compile(None, None).is_noop
+        assert ChatFilter.compile(None, None).matches(object())
+
+    def test_public_filter_ignores_private_chats(self):
+        assert ChatFilter(public=True).matches(_user())
+        assert ChatFilter(public=True).matches(_channel("news"))
+        assert not ChatFilter(public=True).matches(_channel())
+        assert ChatFilter(public=False).matches(_channel())
+
+    def test_filter_is_immutable(self):
+        with pytest.raises(AttributeError):
+            ChatFilter().public = True
+
+
+@pytest.mark.asyncio
+async def test_chat_failing_filter_is_not_fetched():
+    client = MagicMock()
+    client.iter_messages = MagicMock()
+
+    generator = search._search_chat_messages_generator(
+        client, _channel(), "x", 10, ChatFilter.compile("private"), 0
+    )
+
+    assert [r async for r in generator] == []
+    client.iter_messages.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_global_search_resolves_each_chat_once(monkeypatch):
+    messages = []
+    for message_id in (3, 2, 1):
+        message = MagicMock()
+        message.id = message_id
+        message.peer_id = PeerChannel(10)
+        message.text = "hit"
+        messages.append(message)
+    client = AsyncMock(return_value=MagicMock(messages=messages))
+    resolve = AsyncMock(return_value=_channel())
+    monkeypatch.setattr(search, "get_entity_by_id", resolve)
+
+    async def fake_build(
+        client, message, entity, link, fields=None, forward_origins=None
+    ):
+        return {"id": message.id}
+
+    monkeypatch.setattr(search, "build_message_result", fake_build)
+
+    generator = search._search_global_messages_generator(
+        client, "hit", 10, None, None, ChatFilter.compile("private"), 0
+    )
+
+    assert [r async for r in generator] == []
+    resolve.assert_awaited_once()
@@ -0,0 +1,67 @@
+"""
+Tests for search match snippets.
+"""
+
+import json
+
+from src.utils.message_format import SnippetMatcher
+
+POST = (
+    "Weekly digest. " * 40
+    + "The Rocket launch was moved to Friday; the launch window opens at dawn. "
+    + "Other news follows. " * 150
+)
+
+
+def _highlighted(snippet, offsets):
+    return [snippet[start:end] for start, end in offsets]
+
+
+def test_window_centered_on_first_hit_with_offsets():
+    matcher = SnippetMatcher(["launch", "rocket"], 120)
+
+    snippet, offsets = matcher.snippet(POST)
+
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert len(snippet) == 122
+    assert _highlighted(snippet, offsets) == ["Rocket", "launch", "launch"]
+
+
+def test_longest_term_wins_at_same_position():
+    snippet, offsets = SnippetMatcher(["launch", "launches"], 50).snippet(
+        "It launches today"
+    )
+    assert _highlighted(snippet, offsets) == ["launches"]
+
+
+def test_terms_are_literal_and_fts_syntax_stripped():
+    matcher = SnippetMatcher(['"a.b"', "c++*", " "], 50)
+    snippet, offsets = matcher.snippet("axb a.b c++")
+    assert _highlighted(snippet, offsets) == ["a.b", "c++"]
+
+
+def test_no_literal_hit_falls_back_to_text_start():
+    snippet, offsets = SnippetMatcher(["launched"], 20).snippet(POST)
+    assert snippet == POST[:20] + "…"
+    assert offsets == []
+
+
+def test_apply_replaces_text():
+    result = SnippetMatcher(["rocket"], 100).apply({"id": 1, "text": POST})
+    assert "text" not in result
+    assert "Rocket" in result["snippet"]
+
+    media_only = SnippetMatcher(["rocket"], 100).apply({"id": 2, "text": None})
+    assert media_only == {"id": 2, "text": None}
+
+
+def test_snippets_shrink_long_post_results_tenfold():
+    results = [
+        {"id": i, "link": f"https://t.me/news/{i}", "text": POST} for i in range(20)
+    ]
+    matcher = SnippetMatcher(["launch"], 200)
+
+    full_size = len(json.dumps(results))
+    snippet_size = len(json.dumps([matcher.apply(dict(r)) for r in results]))
+
+    assert snippet_size * 10 < full_size
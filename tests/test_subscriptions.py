@@ -0,0 +1,105 @@
+"""
+Tests for the real-time subscription ring buffer.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.tools import subscriptions
+from src.tools.subscriptions import SessionSubscriptions, poll_updates_impl
+from src.utils.entity import ChatFilter
+
+
+def _state(maxlen=1000):
+    return SessionSubscriptions(MagicMock(), token=None, maxlen=maxlen)
+
+
+class TestSessionSubscriptions:
+    def test_drain_returns_only_newer_in_order(self):
+        state = _state()
+        for i in range(5):
+            state.append({"id": i})
+
+        messages, cursor = state.drain(since_cursor=3, limit=10)
+        assert [m["id"] for m in messages] == [3, 4]
+        assert cursor == 5
+
+        messages, cursor = state.drain(since_cursor=5, limit=10)
+        assert messages == []
+        assert cursor == 5
+
+    def test_drain_respects_limit(self):
+        state = _state()
+        for i in range(5):
+            state.append({"id": i})
+
+        messages, cursor = state.drain(since_cursor=0, limit=2)
+        assert [m["id"] for m in messages] == [0, 1]
+        assert cursor == 2
+
+    def test_buffer_is_bounded(self):
+        state = _state(maxlen=3)
+        for i in range(10):
+            state.append({"id": i})
+
+        assert len(state.buffer) == 3
+        assert state.oldest_cursor() == 8
+
+    def test_matching_by_chat_and_terms(self):
+        state = _state()
+        state.subscriptions = {
+            "a": {"chat_ids": {-1001}, "terms": [], "chat_filter": ChatFilter()},
+            "b": {"chat_ids": None, "terms": ["deploy"], "chat_filter": ChatFilter()},
+        }
+        chat = MagicMock()
+
+        assert state.matching_subscriptions(-1001, chat, "hello") == ["a"]
+        assert state.matching_subscriptions(5, chat, "Deploy done") == ["b"]
+        assert state.matching_subscriptions(5, chat, "hello") == []
+
+
+@pytest.mark.asyncio
+async def test_poll_updates_reports_dropped(monkeypatch):
+    state = _state(maxlen=2)
+    for i in range(5):
+        state.append({"id": i})
+    monkeypatch.setattr(subscriptions, "get_request_session_key", lambda: "k")
+    monkeypatch.setitem(subscriptions._session_subscriptions, "k", state)
+
+    result = await poll_updates_impl(since_cursor=1)
+
+    assert [m["id"] for m in result["messages"]] == [3, 4]
+    assert result["dropped"] == 2
+    assert result["cursor"] == 5
+    assert result["has_more"] is False
+
+
+@pytest.mark.asyncio
+async def test_new_message_is_buffered_and_notified(monkeypatch):
+    state = _state()
+    state.subscriptions = {
+        "s": {"chat_ids": None, "terms": [], "chat_filter": ChatFilter()}
+    }
+    session = MagicMock()
+    session.send_log_message = AsyncMock()
+    state.notify_sessions.add(session)
+
+    monkeypatch.setattr(
+        subscriptions,
+        "build_message_result",
+        AsyncMock(return_value={"id": 7, "chat": {"id": 1}}),
+    )
+
+    event = MagicMock()
+    event.get_chat = AsyncMock(return_value=MagicMock())
+    event.chat_id = -1001
+    event.message.id = 7
+    event.message.message = "hi"
+
+    await state.on_new_message(event)
+
+    messages, cursor = state.drain(0, 10)
+    assert messages == [{"id": 7, "chat": {"id": 1}, "subscription_ids": ["s"]}]
+    assert cursor == 1
+    session.send_log_message.assert_awaited_once()
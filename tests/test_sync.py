@@ -0,0 +1,223 @@
+"""
+Tests for incremental updates.getDifference sync into the local message store.
+"""
+
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telethon.tl import types
+from telethon.tl.functions.updates import GetStateRequest
+
+from src.tools import sync
+from src.tools.sync import _sync_channel, _sync_common_box
+from src.utils import message_store
+from src.utils.message_store import MessageStore
+
+NOW = datetime(2024, 1, 15, tzinfo=UTC)
+
+
+def _state(pts):
+    return types.updates.State(pts=pts, qts=0, date=NOW, seq=1, unread_count=0)
+
+
+def _result(chat_id, message_id, chat_type):
+    return {
+        "id": message_id,
+        "date": "2024-01-15T10:00:00+00:00",
+        "chat": {"id": chat_id, "title": "Chat", "type": chat_type},
+        "text": "hello",
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(tmp_path / "sync.messages.db")
+    yield store
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_first_run_records_state_only(store):
+    client = AsyncMock(return_value=_state(50))
+
+    totals = await _sync_common_box(client, store)
+
+    assert totals["applied"] == 0
+    assert store.get_meta("update_state")["pts"] == 50
+
+
+@pytest.mark.asyncio
+async def test_difference_applies_deletions_and_advances_state(store):
+    store.index_messages([_result(1, 7, "private"), _result(1, 8, "private")])
+    store.set_meta("update_state", {"pts": 10, "qts": 0, "date": NOW.timestamp()})
+    difference = types.updates.Difference(
+        new_messages=[],
+        new_encrypted_messages=[],
+        other_updates=[types.UpdateDeleteMessages(messages=[7], pts=11, pts_count=1)],
+        chats=[],
+        users=[],
+        state=_state(11),
+    )
+    client = AsyncMock(return_value=difference)
+
+    totals = await _sync_common_box(client, store)
+
+    assert totals["deleted"] == 1
+    assert store.count_messages() == 1
+    assert store.get_meta("update_state")["pts"] == 11
+
+
+@pytest.mark.asyncio
+async def test_difference_too_long_reports_backlog(store):
+    store.set_meta("update_state", {"pts": 10, "qts": 0, "date": NOW.timestamp()})
+    client = AsyncMock(return_value=types.updates.DifferenceTooLong(pts=60))
+
+    totals = await _sync_common_box(client, store)
+
+    assert totals["backlog"] == 50
+    assert store.get_meta("update_state")["pts"] == 60
+
+
+@pytest.mark.asyncio
+async def test_channel_difference_deletes_and_stores_pts(store):
+    store.index_messages([_result(3, 1, "channel"), _result(3, 2, "channel")])
+    store.track_chat(3, "channel", 100)
+    difference = types.updates.ChannelDifference(
+        pts=105,
+        new_messages=[],
+        other_updates=[
+            types.UpdateDeleteChannelMessages(
+                channel_id=3, messages=[2], pts=105, pts_count=1
+            )
+        ],
+        chats=[],
+        users=[],
+        final=True,
+    )
+    client = AsyncMock(return_value=difference)
+    client.get_input_entity = AsyncMock(
+        return_value=types.InputPeerChannel(channel_id=3, access_hash=0)
+    )
+
+    totals = await _sync_channel(client, store, store.get_tracked_chats()[0])
+
+    assert totals["deleted"] == 1
+    assert store.count_messages(3) == 1
+    assert store.get_tracked_chats()[0]["pts"] == 105
+
+
+@pytest.mark.asyncio
+async def test_unfinished_slices_report_pending_events(store):
+    store.set_meta("update_state", {"pts": 10, "qts": 0, "date": NOW.timestamp()})
+    pts = iter(range(20, 1000, 10))
+
+    async def invoke(request):
+        if isinstance(request, GetStateRequest):
+            return _state(500)
+        return types.updates.DifferenceSlice(
+            new_messages=[],
+            new_encrypted_messages=[],
+            other_updates=[],
+            chats=[],
+            users=[],
+            intermediate_state=_state(next(pts)),
+        )
+
+    client = AsyncMock(side_effect=invoke)
+
+    totals = await _sync_common_box(client, store)
+
+    # 20 slices advanced pts to 210; the server is at 500
+    assert store.get_meta("update_state")["pts"] == 210
+    assert totals["backlog"] == 290
+
+
+def test_status_skips_sessions_without_store(monkeypatch, tmp_path, store):
+    monkeypatch.setattr(sync, "_session_cache", {"a" * 16: None, "b" * 16: None})
+    monkeypatch.setattr(message_store, "_stores", {"a" * 16: store})
+    monkeypatch.setattr(
+        message_store, "get_store_path", lambda key: tmp_path / f"{key}.messages.db"
+    )
+
+    report = sync.get_sync_status()
+
+    assert list(report) == ["aaaaaaaa..."]
+    assert not (tmp_path / f"{'b' * 16}.messages.db").exists()
+
+
+@pytest.mark.asyncio
+async def test_warm_pass_skips_sessions_without_store(monkeypatch, tmp_path):
+    client = AsyncMock()
+    client.is_connected = lambda: True
+    monkeypatch.setattr(sync, "_session_cache", {"c" * 16: (client, 0.0)})
+    monkeypatch.setattr(message_store, "_stores", {})
+    monkeypatch.setattr(
+        message_store, "get_store_path", lambda key: tmp_path / f"{key}.messages.db"
+    )
+
+    await sync.sync_warm_sessions()
+
+    client.assert_not_awaited()
+    assert not (tmp_path / f"{'c' * 16}.messages.db").exists()
+
+
+class _History:
+    """iter_messages over message ids 1..newest, newest first like Telegram."""
+
+    def __init__(self, newest):
+        self.newest = newest
+        self.calls = []
+
+    async def iter_messages(self, entity, limit, min_id=0, max_id=0):
+        self.calls.append((min_id, max_id, limit))
+        top = max_id - 1 if max_id else self.newest
+        for message_id in range(top, min_id, -1)[:limit]:
+            yield SimpleNamespace(id=message_id, text=f"message {message_id}")
+
+
+@pytest.fixture
+def sync_client(monkeypatch, store):
+    history = _History(newest=250)
+    client = AsyncMock()
+    client.iter_messages = history.iter_messages
+    entity = types.Chat(
+        id=9, title="Chat", photo=None, participants_count=2, date=NOW, version=1
+    )
+
+    async def fake_build(client, message, entity, link, forward_origins=None):
+        return _result(9, message.id, "private")
+
+    monkeypatch.setattr(sync, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(sync, "get_entity_by_id", AsyncMock(return_value=entity))
+    monkeypatch.setattr(sync, "get_message_store", lambda: store)
+    monkeypatch.setattr(sync, "build_message_result", fake_build)
+    monkeypatch.setattr(sync, "prefetch_forward_origins", AsyncMock(return_value={}))
+    return history
+
+
+@pytest.mark.asyncio
+async def test_sync_chat_backfills_without_gaps(sync_client, store):
+    # Passively indexed newest message must not hide older history
+    store.index_messages([_result(9, 250, "private")])
+
+    first = await sync.sync_chat_impl("9", limit=100)
+    assert (first["newest_message_id"], first["oldest_synced_id"]) == (250, 151)
+
+    # More than `limit` new messages arrive: the newest ones and the hole below
+    # them are fetched before backfilling continues
+    sync_client.newest = 400
+    second = await sync.sync_chat_impl("9", limit=100)
+    assert store.get_synced_ranges(9) == [(301, 400), (151, 250)]
+    assert second["gaps"] == 1
+
+    third = await sync.sync_chat_impl("9", limit=100)
+    # Nothing new, the hole takes 50 and the rest of the budget backfills
+    assert sync_client.calls[-3:] == [(400, 0, 100), (250, 301, 100), (0, 151, 50)]
+    assert store.get_synced_ranges(9) == [(101, 400)]
+    assert third["history_complete"] is False
+
+    final = await sync.sync_chat_impl("9", limit=200)
+    assert final["history_complete"] is True
+    assert final["stored_messages"] == 400
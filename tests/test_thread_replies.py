@@ -0,0 +1,184 @@
+"""
+Tests for get_thread_replies: paged comment threads with thread links.
+"""
+
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.errors import MsgIdInvalidError
+from telethon.tl.functions.messages import (
+    GetDiscussionMessageRequest,
+    GetRepliesRequest,
+)
+from telethon.tl.types import (
+    Channel,
+    Message,
+    MessageReplyHeader,
+    PeerChannel,
+    PeerUser,
+    User,
+)
+
+from src.tools import threads
+
+CHANNEL = Channel(
+    id=1, title="News", photo=None, date=None, broadcast=True, username="news"
+)
+GROUP = Channel(
+    id=2, title="News Chat", photo=None, date=None, megagroup=True, username="newschat"
+)
+FORUM = Channel(
+    id=2,
+    title="News Chat",
+    photo=None,
+    date=None,
+    megagroup=True,
+    forum=True,
+    username="newschat",
+)
+ALICE = User(id=7, first_name="Alice")
+
+ROOT_ID = 500
+REPLY_IDS = range(501, 651)
+
+
+def _message(message_id, reply_to=ROOT_ID):
+    return Message(
+        id=message_id,
+        peer_id=PeerChannel(2),
+        date=datetime(2024, 1, 1, tzinfo=UTC),
+        message=f"comment {message_id}",
+        from_id=PeerUser(7),
+        reply_to=MessageReplyHeader(reply_to_msg_id=reply_to, reply_to_top_id=ROOT_ID),
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = MagicMock()
+
+    async def invoke(request):
+        if isinstance(request, GetDiscussionMessageRequest):
+            root = Message(
+                id=ROOT_ID,
+                peer_id=PeerChannel(2),
+                date=datetime(2024, 1, 1, tzinfo=UTC),
+                message="post",
+            )
+            return MagicMock(messages=[root], users=[], chats=[CHANNEL, GROUP])
+        assert isinstance(request, GetRepliesRequest)
+        # The -add_offset replies from offset_id on, newest first like Telegram
+        ids = [i for i in REPLY_IDS if i >= request.offset_id][: -request.add_offset]
+        return MagicMock(
+            messages=[
+                _message(i, reply_to=501 if i == 503 else ROOT_ID)
+                for i in reversed(ids)
+            ],
+            users=[ALICE],
+            chats=[GROUP],
+            count=len(REPLY_IDS),
+        )
+
+    client.side_effect = invoke
+    monkeypatch.setattr(threads, "get_connected_client", AsyncMock(return_value=client))
+    monkeypatch.setattr(threads, "get_entity_by_id", AsyncMock(return_value=CHANNEL))
+    monkeypatch.setattr(threads, "transcribe_voice_messages", AsyncMock())
+    monkeypatch.setattr(threads, "index_results", MagicMock())
+    return client
+
+
+def _reply_requests(client):
+    return [
+        call.args[0]
+        for call in client.call_args_list
+        if isinstance(call.args[0], GetRepliesRequest)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_post_comments_are_paged_oldest_first(client):
+    response = await threads.get_thread_replies_impl("@news", 1, limit=120)
+
+    requests = _reply_requests(client)
+    # One reply past the limit shows whether the thread goes on
+    assert [(r.offset_id, r.limit) for r in requests] == [(1, 100), (601, 21)]
+    assert all(r.peer is GROUP and r.msg_id == ROOT_ID for r in requests)
+
+    messages = response["messages"]
+    assert [m["id"] for m in messages] == list(range(501, 621))
+    assert response["chat"]["id"] == 2
+    assert response["root"]["id"] == ROOT_ID
+    assert response["total_count"] == 150
+    assert response["has_more"] is True
+    assert response["next_after_id"] == 620
+    # Comments link under the channel post; commenters come with the page
+    assert messages[0]["link"] == "https://t.me/news/1?comment=501"
+    assert messages[0]["sender"]["title"] == "Alice"
+
+
+@pytest.mark.asyncio
+async def test_continuing_with_after_id_reaches_the_end(client):
+    response = await threads.get_thread_replies_impl(
+        "@news", 1, limit=100, after_id=620
+    )
+
+    assert [m["id"] for m in response["messages"]] == list(range(621, 651))
+    assert response["has_more"] is False
+    assert len(_reply_requests(client)) == 1
+
+
+@pytest.mark.parametrize(("limit", "has_more"), [(29, True), (30, False)])
+@pytest.mark.asyncio
+async def test_has_more_ignores_replies_before_after_id(client, limit, has_more):
+    # total_count (150) also counts the 120 replies up to after_id
+    response = await threads.get_thread_replies_impl(
+        "@news", 1, limit=limit, after_id=620
+    )
+
+    assert len(response["messages"]) == limit
+    assert response["has_more"] is has_more
+
+
+@pytest.mark.asyncio
+async def test_tree_nests_replies(client):
+    response = await threads.get_thread_replies_impl(
+        "@news", 1, limit=5, tree=True, fields=["id", "text"]
+    )
+
+    tree = response["tree"]
+    assert [node["id"] for node in tree] == [501, 502, 504, 505]
+    assert [reply["id"] for reply in tree[0]["replies"]] == [503]
+    # reply_to_msg_id was only built for the tree
+    assert "reply_to_msg_id" not in tree[0]["replies"][0]
+
+
+@pytest.mark.asyncio
+async def test_forum_topic_uses_message_id_as_root(client):
+    original = client.side_effect
+
+    async def invoke(request):
+        if isinstance(request, GetDiscussionMessageRequest):
+            raise MsgIdInvalidError(request)
+        return await original(request)
+
+    client.side_effect = invoke
+    threads.get_entity_by_id.return_value = FORUM
+
+    response = await threads.get_thread_replies_impl("@newschat", ROOT_ID, limit=3)
+
+    assert response["root"] is None
+    assert response["root_id"] == ROOT_ID
+    assert [m["id"] for m in response["messages"]] == [501, 502, 503]
+    assert response["messages"][0]["link"] == "https://t.me/newschat/500/501"
+
+
+def test_reply_links_follow_the_thread_kind():
+    post = MagicMock()
+    comments = threads.thread_reply_links(CHANNEL, GROUP, 1, ROOT_ID, post)
+    topic = threads.thread_reply_links(FORUM, FORUM, ROOT_ID, ROOT_ID, None)
+    group_thread = threads.thread_reply_links(GROUP, GROUP, ROOT_ID, ROOT_ID, post)
+
+    assert comments(501) == "https://t.me/news/1?comment=501"
+    assert topic(501) == "https://t.me/newschat/500/501"
+    assert group_thread(501) == "https://t.me/newschat/501?thread=500"
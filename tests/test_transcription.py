@@ -0,0 +1,230 @@
+"""
+Tests for update-driven, cached and capped voice transcription.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telethon.errors import FloodWaitError
+from telethon.tl.types import PeerUser, UpdateTranscribedAudio, User
+
+from src.tools import messages as message_tools
+from src.utils import message_format, transcription
+from src.utils.message_store import MessageStore
+from src.utils.transcription import SessionTranscriptions, TranscriptionQuota
+
+
+def _update(text="hello", pending=False, transcription_id=9, msg_id=1):
+    return UpdateTranscribedAudio(
+        peer=PeerUser(5),
+        msg_id=msg_id,
+        transcription_id=transcription_id,
+        text=text,
+        pending=pending,
+    )
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = MessageStore(tmp_path / "test.messages.db")
+    monkeypatch.setattr(transcription, "get_message_store", lambda key=None: store)
+    monkeypatch.setattr(
+        transcription,
+        "get_config",
+        lambda: SimpleNamespace(
+            local_store_enabled=True, max_concurrent_transcriptions=2
+        ),
+    )
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = AsyncMock(
+        return_value=SimpleNamespace(pending=True, transcription_id=9, text="")
+    )
+    client.add_event_handler = MagicMock()
+    client.remove_event_handler = MagicMock()
+    client.get_me = AsyncMock(return_value=SimpleNamespace(premium=True))
+    monkeypatch.setattr(
+        transcription, "get_request_session_key", lambda: "transcription-test"
+    )
+    monkeypatch.setattr(
+        message_format, "get_connected_client", AsyncMock(return_value=client)
+    )
+    monkeypatch.setattr(
+        message_tools, "get_connected_client", AsyncMock(return_value=client)
+    )
+    transcription._session_transcriptions.clear()
+    return client
+
+
+def _chat():
+    return User(id=5)
+
+
+def _voice(message_id):
+    return {"id": message_id, "media": {"type": "voice"}}
+
+
+@pytest.mark.asyncio
+async def test_wait_resolves_on_final_update():
+    state = SessionTranscriptions(MagicMock(), "s", max_concurrent=1)
+    task = asyncio.create_task(state.wait(9, 5, 1, timeout=5))
+    await asyncio.sleep(0)
+
+    await state.on_update(_update("hel", pending=True))
+    assert not task.done()
+    await state.on_update(_update("hello"))
+
+    assert await task == "hello"
+
+
+@pytest.mark.asyncio
+async def test_update_before_wait_and_timeout():
+    state = SessionTranscriptions(MagicMock(), "s", max_concurrent=1)
+    await state.on_update(_update("early"))
+    assert await state.wait(9, 5, 1, timeout=0.01) == "early"
+    assert await state.wait(10, 5, 2, timeout=0.01) is None
+    assert state._futures == {}
+
+
+@pytest.mark.asyncio
+async def test_pending_transcription_costs_one_request(client):
+    task = asyncio.create_task(
+        message_format._transcribe_single_voice_message(client, _chat(), 1)
+    )
+    await asyncio.sleep(0.01)
+    handler = client.add_event_handler.call_args.args[0]
+    await handler(_update("done"))
+
+    assert await task == "done"
+    assert client.await_count == 1
+
+    # Finished texts are served without another request
+    messages = [_voice(1)]
+    await message_format.transcribe_voice_messages(messages, _chat())
+    assert messages[0]["transcription"] == "done"
+    assert client.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_no_wait_marks_pending(client):
+    messages = [_voice(1)]
+
+    await message_format.transcribe_voice_messages(messages, _chat(), wait=False)
+
+    assert messages[0]["transcription_pending"] is True
+    assert messages[0]["transcription_id"] == 9
+    assert "transcription" not in messages[0]
+
+
+@pytest.mark.asyncio
+async def test_pending_handle_is_polled(client, store):
+    await message_format.transcribe_voice_messages([_voice(1)], _chat(), wait=False)
+
+    pending = await message_tools.get_transcription_impl(9)
+    assert pending["status"] == "pending"
+    assert (pending["chat_id"], pending["message_id"]) == (5, 1)
+
+    poll = asyncio.create_task(message_tools.get_transcription_impl(9, wait_seconds=5))
+    await asyncio.sleep(0.01)
+    await transcription._session_transcriptions["transcription-test"].on_update(
+        _update("done")
+    )
+
+    done = await poll
+    assert done["status"] == "done" and done["transcription"] == "done"
+    # Polling never asks Telegram again
+    assert client.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_handle_is_an_error(client):
+    result = await message_tools.get_transcription_impl(404)
+
+    assert result["ok"] is False
+    assert "404" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_unfinished_wait_marks_pending(client, monkeypatch):
+    monkeypatch.setattr(SessionTranscriptions, "wait", AsyncMock(return_value=None))
+    messages = [_voice(1)]
+
+    await message_format.transcribe_voice_messages(messages, _chat())
+
+    assert messages[0]["transcription_pending"] is True
+    assert messages[0]["transcription_id"] == 9
+
+
+@pytest.mark.asyncio
+async def test_cache_persists_in_store(client, store):
+    store.save_transcriptions(5, {1: "from disk", 2: ""})
+    client.get_me.reset_mock()
+    messages = [_voice(1), _voice(2)]
+
+    await message_format.transcribe_voice_messages(messages, _chat())
+
+    assert messages[0]["transcription"] == "from disk"
+    # Empty text is a finished transcription with no speech: not requested again
+    assert "transcription" not in messages[1]
+    client.assert_not_awaited()
+    client.get_me.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_finished_transcriptions_are_saved(client, store):
+    client.return_value = SimpleNamespace(pending=False, transcription_id=1, text="hi")
+
+    await message_format.transcribe_voice_messages([_voice(3)], _chat())
+
+    assert store.get_transcriptions(5, [3]) == {3: "hi"}
+
+
+@pytest.mark.asyncio
+async def test_requests_are_capped(client, store):
+    running = 0
+    peak = 0
+
+    async def transcribe(request):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return SimpleNamespace(pending=False, transcription_id=1, text="t")
+
+    client.side_effect = transcribe
+    messages = [_voice(i) for i in range(10, 20)]
+
+    await message_format.transcribe_voice_messages(messages, _chat())
+
+    assert peak == 2
+    assert all(m["transcription"] == "t" for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_flood_wait_blocks_further_requests(client, store):
+    client.side_effect = FloodWaitError(request=None, capture=60)
+
+    await message_format.transcribe_voice_messages([_voice(30)], _chat())
+    client.reset_mock()
+    await message_format.transcribe_voice_messages([_voice(31)], _chat())
+
+    client.assert_not_awaited()
+
+
+def test_quota_tracks_trial_allowance():
+    quota = TranscriptionQuota()
+    quota.record(SimpleNamespace(trial_remains_num=2, trial_remains_until_date=None))
+    assert quota.available() and quota.trial_remains == 2
+
+    until = SimpleNamespace(timestamp=lambda: time.time() + 3600)
+    quota.record(SimpleNamespace(trial_remains_num=0, trial_remains_until_date=until))
+    assert not quota.available()
+    assert quota.requests == 2